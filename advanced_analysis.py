@@ -13,6 +13,8 @@ from collections import defaultdict
 # 从新模块导入功能
 from font_config import get_font_properties # Keep for now, though its direct use (plt.rcParams) is gone
 from graph_builder import build_graph
+from cycle_analysis import load_or_compute_cycles
+from metrics_store import top_items
 
 # 确保输出目录存在
 os.makedirs('outputs/reports', exist_ok=True)
@@ -56,7 +58,7 @@ else:
 
     # 度中心性：连接节点最多的实体
     degree_centrality = nx.degree_centrality(G)
-    top_degree = sorted(degree_centrality.items(), key=lambda x: x[1], reverse=True)[:5]
+    top_degree = top_items(degree_centrality, 5)
     write_and_print(report_file, "\n度中心性前5名（连接最多的实体）:")
     for node, centrality_val in top_degree: # Renamed centrality for clarity
         write_and_print(report_file, f"{G.nodes[node].get('name', node)}: {centrality_val:.4f}")
@@ -66,7 +68,7 @@ else:
     pagerank_centrality_map = {} # Use a different name for the map
     try:
         pagerank_centrality_map = nx.pagerank(G, alpha=0.85)
-        top_pagerank = sorted(pagerank_centrality_map.items(), key=lambda x: x[1], reverse=True)[:5]
+        top_pagerank = top_items(pagerank_centrality_map, 5)
         write_and_print(report_file, "\nPageRank前5名（网络影响力最大）:")
         for node, pr in top_pagerank:
             write_and_print(report_file, f"{G.nodes[node].get('name', node)}: {pr:.4f}")
@@ -95,7 +97,7 @@ else:
         # 对于拥有数万节点的图，k=100 或 k=200 是一个合理的起点。
         write_and_print(report_file, "\n计算中介中心性 (采样 k=100)...")
         betweenness_centrality_map = nx.betweenness_centrality(G, k=100, normalized=True) # 添加 k=100 和 normalized=True
-        top_betweenness = sorted(betweenness_centrality_map.items(), key=lambda x: x[1], reverse=True)[:5]
+        top_betweenness = top_items(betweenness_centrality_map, 5)
         write_and_print(report_file, "中介中心性前5名（最关键的'桥梁'实体）:")
         for node, centrality_val in top_betweenness: # Renamed centrality
             write_and_print(report_file, f"{G.nodes[node].get('name', node)}: {centrality_val:.4f}") 
@@ -107,7 +109,7 @@ else:
     # 特征向量中心性：连接到其他重要节点的实体
     try:
         eigenvector_centrality_map = nx.eigenvector_centrality(G, max_iter=1000) # Use a different name for the map
-        top_eigen = sorted(eigenvector_centrality_map.items(), key=lambda x: x[1], reverse=True)[:5]
+        top_eigen = top_items(eigenvector_centrality_map, 5)
         write_and_print(report_file, "\n特征向量中心性前5名（连接到重要实体的实体）:")
         for node, centrality_val in top_eigen: # Renamed centrality
             write_and_print(report_file, f"{G.nodes[node].get('name', node)}: {centrality_val:.4f}")
@@ -115,7 +117,7 @@ else:
         write_and_print(report_file, f"\n计算特征向量中心性时出错 (有向图): {e_outer}。尝试用无向图计算...")
         try:
             eigenvector_centrality_map = nx.eigenvector_centrality(UG, max_iter=1000) # Use UG
-            top_eigen = sorted(eigenvector_centrality_map.items(), key=lambda x: x[1], reverse=True)[:5]
+            top_eigen = top_items(eigenvector_centrality_map, 5)
             write_and_print(report_file, "特征向量中心性前5名（连接到重要实体的实体）- 基于无向图:")
             for node, centrality_val in top_eigen: # Renamed centrality
                 write_and_print(report_file, f"{G.nodes[node].get('name', node)}: {centrality_val:.4f}")
@@ -156,14 +158,18 @@ else:
     # 3. 寻找循环持股关系（环）
     write_and_print(report_file, "\n\n循环持股关系分析:")
     write_and_print(report_file, "="*50)
-    write_and_print(report_file, "警告：计算所有简单循环（nx.simple_cycles）在大型或密集网络中可能非常耗时且占用大量内存。如果脚本在此处长时间无响应，请考虑注释掉此部分或针对特定子图运行。")
-
     try:
-        cycles = list(nx.simple_cycles(G))
+        # 先求强连通分量，再有界地枚举环（环长、数量、时间均有上限，见 cycle_analysis.py），按累积持股比例排序
+        cycle_result = load_or_compute_cycles(G)
+        cycles = [cycle['nodes'] for cycle in cycle_result.cycles]
         if cycles:
-            write_and_print(report_file, f"发现 {len(cycles)} 个循环持股关系")
+            write_and_print(report_file, f"发现 {len(cycles)} 个循环持股关系（环长不超过 {cycle_result.params['length_bound']}，"
+                                         f"分布在 {cycle_result.cyclic_components} 个强连通分量的 {cycle_result.nodes_in_cycles} 个节点中）")
+            if cycle_result.truncated:
+                reason = "数量上限" if cycle_result.truncated_by == 'max_cycles' else "时间上限"
+                write_and_print(report_file, f"注意：已达到{reason}，提前停止枚举，实际的环可能更多。")
             
-            # 显示前5个循环
+            # 显示累积持股比例最高的前5个循环
             for i, cycle in enumerate(cycles[:5]):
                 write_and_print(report_file, f"\n循环 {i+1}:")
                 path_names = [G.nodes[node].get('name', node) for node in cycle]
@@ -229,7 +235,7 @@ else:
 
     # 按出度（控制的企业数量）排序
     out_degrees = dict(G.out_degree())
-    top_controllers = sorted(out_degrees.items(), key=lambda x: x[1], reverse=True)
+    top_controllers = top_items(out_degrees, 3) # 只需要前3名，不做全量排序
 
     # 使用前面计算的 PageRank (pagerank_centrality_map)
     # 使用前面计算的、带采样的 Betweenness Centrality (betweenness_centrality_map)
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+API 响应的序列化与压缩。
+
+- JSON 编码：安装了 orjson 时 jsonify 改用 orjson（比标准库快数倍，直接输出 UTF-8 字节）；
+  否则使用标准库，但不再把中文转义为 \\uXXXX（ensure_ascii=False，中文公司名的响应体积减少近一半）。
+  NaN/Infinity 输出为 null（标准库原来输出的 NaN 不是合法 JSON）。
+- 压缩：按请求头 Accept-Encoding 协商 br（安装了 brotli 时）或 gzip，只压缩 200 的 JSON/HTML/CSS/JS
+  响应且大于 COMPRESS_MIN_SIZE 的响应体；带 ETag 的响应（见 response_cache.py）压缩结果按
+  (ETag, 编码) 缓存，同一响应不会重复压缩。压缩后 ETag 改为弱 ETag，If-None-Match 按弱比较仍返回 304。
+- 列式输出（format=table）的构建见 node_detail.neighbor_table 和 app.py。
+
+用法:
+    init_app(app)   # 注册 JSON 编码器和压缩
+"""
+import gzip
+import json
+import math
+import threading
+from collections import OrderedDict
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5 # 默认的 11 压缩率最高但很慢，5 左右兼顾速度和体积
+COMPRESSIBLE_MIMETYPES = frozenset({
+    'application/json', 'application/x-ndjson', 'text/html', 'text/css', 'text/plain',
+    'application/javascript', 'text/javascript',
+})
+COMPRESSED_CACHE_BYTES = 32 * 1024 * 1024
+
+def _replace_nan(obj):
+    """把 NaN/Infinity 替换为 None（标准库编码时使用）。"""
+    if isinstance(obj, float):
+        return None if math.isnan(obj) or math.isinf(obj) else obj
+    if isinstance(obj, dict):
+        return {key: _replace_nan(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_replace_nan(value) for value in obj]
+    return obj
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify 使用的编码器：优先 orjson，不可用或遇到 orjson 不支持的类型时回退到标准库。"""
+
+    ensure_ascii = False
+
+    def _orjson_options(self, indent):
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps_bytes(self, obj, indent=False):
+        """编码为 UTF-8 字节。"""
+        if orjson is not None:
+            try:
+                return orjson.dumps(obj, default=self.default, option=self._orjson_options(indent))
+            except TypeError:
+                pass # 例如超过 64 位的整数，交给标准库
+        try:
+            text = json.dumps(obj, default=self.default, ensure_ascii=False, sort_keys=self.sort_keys,
+                              allow_nan=False, indent=2 if indent else None,
+                              separators=None if indent else (',', ':'))
+        except ValueError:
+            text = json.dumps(_replace_nan(obj), default=self.default, ensure_ascii=False, sort_keys=self.sort_keys,
+                              indent=2 if indent else None, separators=None if indent else (',', ':'))
+        return text.encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            kwargs.setdefault('default', self.default)
+            kwargs.setdefault('ensure_ascii', False)
+            return json.dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self.dumps_bytes(obj, indent) + b"\n", mimetype=self.mimetype)
+
+def negotiate_encoding(accept_encoding):
+    """按 Accept-Encoding（含 q 值）选择 'br' / 'gzip'，都不接受时返回 None；q 值相同时优先 br。"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(','):
+        token, _, params = part.strip().partition(';')
+        token = token.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token] = q
+    supported = (('br',) if brotli is not None else ()) + ('gzip',)
+    best, best_q = None, 0.0
+    for encoding in supported:
+        q = weights.get(encoding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+class _CompressedCache:
+    """(ETag, 编码) -> 压缩后的响应体，按总字节数 LRU 淘汰。"""
+
+    def __init__(self, max_bytes=COMPRESSED_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes // 4:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = body
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+_compressed_cache = _CompressedCache()
+
+def compress_response(response):
+    """after_request：按客户端支持的编码压缩响应体。"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''))
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+    etag, _ = response.get_etag()
+    key = (etag, encoding) if etag else None
+    compressed = _compressed_cache.get(key) if key else None
+    if compressed is None:
+        compressed = compress(body, encoding)
+        if key:
+            _compressed_cache.put(key, compressed)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        response.set_etag(etag, weak=True) # 内容编码不同，强 ETag 不再适用
+    return response
+
+def init_app(app):
+    """为 Flask 应用注册快速 JSON 编码器和响应压缩。"""
+    app.json = FastJSONProvider(app)
+    app.after_request(compress_response)
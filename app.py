@@ -1,9 +1,27 @@
-from flask import Flask, jsonify, request, render_template, send_from_directory
-import networkx as nx
+from flask import Flask, jsonify, request, render_template, send_from_directory, g, Response
+import functools
+import gc
+import hmac
 import json
 import os
-from graph_builder import build_graph
+from graph_holder import GraphHolder, DEFAULT_CSV_PATH
+from csr_graph import load_shared_graph
 from query_node_neighborhood import find_node_by_name
+from cycle_analysis import load_or_compute_cycles
+from search_index import get_name_index
+from fuzzy_search import get_fuzzy_index
+from equity_penetration import (penetration_report, DIRECTION_UP, DIRECTION_DOWN,
+                                 DEFAULT_DEPTH as PENETRATION_DEFAULT_DEPTH, MAX_DEPTH as PENETRATION_MAX_DEPTH,
+                                 DEFAULT_THRESHOLD as PENETRATION_DEFAULT_THRESHOLD,
+                                 DEFAULT_LIMIT as PENETRATION_DEFAULT_LIMIT)
+from control_paths import (control_paths_report, DEFAULT_K as CONTROL_PATHS_DEFAULT_K, MAX_K as CONTROL_PATHS_MAX_K,
+                           DEFAULT_MAX_DEPTH as CONTROL_PATHS_DEFAULT_DEPTH, MAX_DEPTH as CONTROL_PATHS_MAX_DEPTH)
+from node_detail import node_detail, NodeQueryError
+from node_batch import (parse_batch_request, batch_report, iter_ndjson, BatchTooLargeError,
+                        STREAM_THRESHOLD as BATCH_STREAM_THRESHOLD, NDJSON_MIMETYPE)
+from response_cache import ResponseCache
+from api_serialization import init_app as init_serialization
+from suggest_index import get_suggest_index, WEIGHT_METRICS, DEFAULT_WEIGHT
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
 
@@ -13,55 +31,97 @@ app.jinja_env.variable_end_string = ']}'
 app.jinja_env.block_start_string = '{%'
 app.jinja_env.block_end_string = '%}'
 
+# JSON 编码（安装了 orjson 时使用）和 gzip/brotli 压缩，见 api_serialization.py
+init_serialization(app)
+
 # 确保输出目录存在
 os.makedirs('static/images', exist_ok=True)
 os.makedirs('static/data', exist_ok=True)
 
-# 全局图对象和指标缓存
-G = None
-node_metrics = {}
+# 响应缓存：按接口、参数和图版本缓存，图重新加载时整体失效
+response_cache = ResponseCache()
 
-def calculate_node_metrics():
-    """计算并缓存节点各项指标"""
-    global G, node_metrics
-    
-    if G is None:
-        return
-    
-    # 初始化指标字典
-    node_metrics = {
-        "pagerank": {},
-        "degree_centrality": {},
-        "betweenness_centrality": {},
-        "in_degree": {},
-        "out_degree": {}
-    }
-    
-    # 计算PageRank
-    try:
-        pagerank = nx.pagerank(G, alpha=0.85)
-        node_metrics["pagerank"] = pagerank
-    except Exception as e:
-        print(f"计算PageRank时出错: {e}")
-    
-    # 计算度中心性
-    try:
-        degree_centrality = nx.degree_centrality(G)
-        node_metrics["degree_centrality"] = degree_centrality
-    except Exception as e:
-        print(f"计算度中心性时出错: {e}")
-    
-    # 计算中介中心性（可能计算时间较长）
+def _warm_indexes(graph, metrics):
+    """后台重新加载时在切换前构建各索引，切换后的第一批请求不用现建"""
+    pagerank = metrics.array('pagerank') if 'pagerank' in metrics else None
+    get_name_index(graph)
+    get_suggest_index(graph, pagerank, 'pagerank')
+    get_fuzzy_index(graph, pagerank)
+
+def _on_graph_swap(state, old_state):
+    response_cache.clear() # 新图加载后旧的缓存响应全部作废
+    print(f"图已切换到版本 {state.version}：{state.graph.number_of_nodes()} 个节点，{state.graph.number_of_edges()} 条边")
+
+# 多进程只读共享模式（环境变量 GRAPH_SHARED_MEMORY=1，见 csr_graph.py 和 wsgi.py）：
+# 图直接读取内存映射的快照，由 fork 前的父进程加载一次，所有工作进程共用
+SHARED_MEMORY = os.environ.get('GRAPH_SHARED_MEMORY', '').strip().lower() in ('1', 'true', 'yes')
+
+# 当前图及其指标（见 graph_holder.py）：首次请求时加载一次，之后可在后台热替换
+graph_holder = GraphHolder(loader=load_shared_graph if SHARED_MEMORY else None,
+                           warmers=[_warm_indexes], on_swap=_on_graph_swap)
+# 管理接口的令牌（环境变量 GRAPH_ADMIN_TOKEN）；未设置时管理接口不可用
+# （反向代理或 asgi_app.py 转发的请求来源地址都是本机，不能按来源地址判断）
+ADMIN_TOKEN = os.environ.get('GRAPH_ADMIN_TOKEN')
+# 重新加载时 csv_path 只能是该目录（环境变量 GRAPH_DATA_DIR，默认为默认数据文件所在目录）下的文件
+DATA_DIR = os.path.realpath(os.environ.get('GRAPH_DATA_DIR') or os.path.dirname(os.path.abspath(DEFAULT_CSV_PATH)))
+
+# 搜索结果分页
+SEARCH_PAGE_SIZE = 50
+SEARCH_MAX_PAGE_SIZE = 500
+FUZZY_SEARCH_MAX_K = 50
+# 输入联想
+SUGGEST_MAX_K = 20
+SUGGEST_BUDGET_MS = 50
+# 指标排行分页
+RANKINGS_PAGE_SIZE = 20
+RANKINGS_MAX_PAGE_SIZE = 1000
+# 股权穿透最多返回的节点数
+PENETRATION_MAX_LIMIT = 1000
+
+def preload(csv_path=None):
+    """
+    在 fork 工作进程之前调用（wsgi.py）：加载图、指标、各索引和循环持股分析，然后 gc.freeze()，
+    把这些对象移出垃圾回收的扫描范围，工作进程中的回收不会再触碰（从而复制）这些共享页面。
+    """
+    state = graph_holder.load(csv_path)
     try:
-        betweenness_centrality = nx.betweenness_centrality(G, k=50)  # 使用采样以提高性能, 将k从100修改为50
-        node_metrics["betweenness_centrality"] = betweenness_centrality
+        load_or_compute_cycles(state.graph)
     except Exception as e:
-        print(f"计算中介中心性时出错: {e}")
-    
-    # 计算入度和出度
-    for node in G.nodes():
-        node_metrics["in_degree"][node] = G.in_degree(node)
-        node_metrics["out_degree"][node] = G.out_degree(node)
+        print(f"预计算循环持股时出错: {e}")
+    gc.collect()
+    if hasattr(gc, 'freeze'): # Python 3.7+
+        gc.freeze()
+    return state
+
+def _current_graph():
+    """当前请求使用的 (图, 指标)：同一请求内固定为同一个快照，请求中途切换版本也不会前后不一致"""
+    state = getattr(g, 'graph_state', None)
+    if state is None:
+        state = g.graph_state = graph_holder.get()
+    return state.graph, state.metrics
+
+def cached_response(view):
+    """缓存视图的200响应（见 response_cache.py），支持 ETag / If-None-Match"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        G, _ = _current_graph()
+        return response_cache.serve(G.graph.get('version'), lambda: view(*args, **kwargs))
+    return wrapper
+
+def _admin_error():
+    """管理接口的权限检查：未配置令牌或令牌不符时返回错误响应，通过时返回 None"""
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "管理接口未启用（需要设置环境变量 GRAPH_ADMIN_TOKEN）"}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({"error": "没有权限"}), 403
+    return None
+
+def _data_file_path(csv_path):
+    """把请求中的 csv_path 解析为 DATA_DIR 下的文件路径；在该目录之外或文件不存在时返回 None"""
+    path = os.path.realpath(os.path.join(DATA_DIR, csv_path))
+    if os.path.commonpath([path, DATA_DIR]) != DATA_DIR or not os.path.isfile(path):
+        return None
+    return path
 
 @app.route('/')
 def index():
@@ -69,12 +129,10 @@ def index():
     return render_template('index.html')
 
 @app.route('/api/graph/stats')
+@cached_response
 def get_graph_stats():
     """获取图的基本统计信息"""
-    global G, node_metrics
-    if G is None:
-        G = build_graph()
-        calculate_node_metrics()
+    G, node_metrics = _current_graph()
     
     # 计算基本统计数据
     stats = {
@@ -82,10 +140,9 @@ def get_graph_stats():
         "edge_count": G.number_of_edges(),
     }
     
-    # 入度最高的前5个节点
-    in_degrees = sorted(node_metrics["in_degree"].items(), key=lambda x: x[1], reverse=True)[:5]
+    # 入度/出度最高的前5个节点（预先排好的名次数组直接取前5，不再全量排序）
     stats["top_in_degree"] = []
-    for node, degree in in_degrees:
+    for node, degree in node_metrics.ranking("in_degree").top(5):
         node_name = G.nodes[node].get('name', str(node))
         stats["top_in_degree"].append({
             "id": node,
@@ -93,10 +150,8 @@ def get_graph_stats():
             "degree": degree
         })
     
-    # 出度最高的前5个节点
-    out_degrees = sorted(node_metrics["out_degree"].items(), key=lambda x: x[1], reverse=True)[:5]
     stats["top_out_degree"] = []
-    for node, degree in out_degrees:
+    for node, degree in node_metrics.ranking("out_degree").top(5):
         node_name = G.nodes[node].get('name', str(node))
         stats["top_out_degree"].append({
             "id": node,
@@ -107,9 +162,8 @@ def get_graph_stats():
     # 中心性分析
     try:
         # PageRank中心性
-        top_pagerank = sorted(node_metrics["pagerank"].items(), key=lambda x: x[1], reverse=True)[:5]
         stats["top_pagerank"] = []
-        for node, pr in top_pagerank:
+        for node, pr in node_metrics.ranking("pagerank").top(5):
             node_name = G.nodes[node].get('name', str(node))
             stats["top_pagerank"].append({
                 "id": node,
@@ -118,9 +172,8 @@ def get_graph_stats():
             })
         
         # 度中心性
-        top_degree = sorted(node_metrics["degree_centrality"].items(), key=lambda x: x[1], reverse=True)[:5]
         stats["top_degree_centrality"] = []
-        for node, centrality in top_degree:
+        for node, centrality in node_metrics.ranking("degree_centrality").top(5):
             node_name = G.nodes[node].get('name', str(node))
             stats["top_degree_centrality"].append({
                 "id": node,
@@ -130,28 +183,76 @@ def get_graph_stats():
     except Exception as e:
         stats["centrality_error"] = str(e)
     
-    # 计算环
+    # 循环持股：有界枚举（按图版本只算一次），返回累积持股比例最高的5个环
     try:
-        cycles = list(nx.simple_cycles(G))[:5]  # 最多返回5个环
+        analysis = load_or_compute_cycles(G)
         stats["cycles"] = []
-        for cycle in cycles:
+        for cycle in analysis.top(5):
             cycle_info = []
-            for node in cycle:
+            for node in cycle['nodes']:
                 node_name = G.nodes[node].get('name', str(node))
                 cycle_info.append(node_name)
             stats["cycles"].append(cycle_info)
+        stats["cycle_summary"] = {
+            "found": len(analysis.cycles),
+            "cyclic_components": analysis.cyclic_components,
+            "nodes_in_cycles": analysis.nodes_in_cycles,
+            "truncated": analysis.truncated,
+            "truncated_by": analysis.truncated_by,
+            "top_holding_products": [cycle['holding_product'] for cycle in analysis.top(5)]
+        }
     except Exception as e:
         stats["cycles_error"] = str(e)
     
     return jsonify(stats)
 
+@app.route('/api/rankings/<metric>')
+@cached_response
+def get_rankings(metric):
+    """
+    指标排行（pagerank / degree_centrality / betweenness_centrality / in_degree / out_degree）。
+    参数: k 每页条数, offset 起始名次（从0开始）, node 可选，同时返回该节点的名次
+    """
+    G, node_metrics = _current_graph()
+    if metric not in node_metrics:
+        return jsonify({"error": f"未知的指标: {metric}（可选 {', '.join(node_metrics)}）"}), 404
+    k = min(max(request.args.get('k', RANKINGS_PAGE_SIZE, type=int), 1), RANKINGS_MAX_PAGE_SIZE)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    
+    ranking = node_metrics.ranking(metric)
+    items = []
+    for rank, (node, value) in enumerate(ranking.top(k, offset), offset + 1):
+        items.append({
+            "rank": rank,
+            "id": node,
+            "name": G.nodes[node].get('name', str(node)),
+            "value": value
+        })
+    result = {
+        "metric": metric,
+        "total": len(ranking),
+        "offset": offset,
+        "k": k,
+        "items": items,
+        "next_offset": offset + len(items) if offset + len(items) < len(ranking) else None
+    }
+    
+    node_id = request.args.get('node')
+    if node_id:
+        if node_id not in G.nodes:
+            return jsonify({"error": "节点不存在"}), 404
+        rank = node_metrics.rank(metric, node_id)
+        result["node"] = {
+            "id": node_id,
+            "rank": rank,
+            "value": node_metrics[metric][node_id] if rank is not None else None
+        }
+    return jsonify(result)
+
 @app.route('/api/search')
 def search_nodes():
     """搜索节点"""
-    global G
-    if G is None:
-        G = build_graph()
-        calculate_node_metrics()
+    G, _ = _current_graph()
     
     query = request.args.get('q', '')
     if not query:
@@ -169,127 +270,176 @@ def search_nodes():
         }
         return jsonify(result)
     
-    # 查找部分匹配
+    # 查找部分匹配（名称索引，按相关度排序后分页）
+    page = max(request.args.get('page', 1, type=int), 1)
+    page_size = min(max(request.args.get('page_size', SEARCH_PAGE_SIZE, type=int), 1), SEARCH_MAX_PAGE_SIZE)
+    total, matched_ids = get_name_index(G).search(query, limit=page_size, offset=(page - 1) * page_size)
     partial_matches = []
-    for node_id, data in G.nodes(data=True):
-        if query.lower() in data.get('name', '').lower():
-            partial_matches.append({
-                "id": node_id,
-                "name": data.get('name', str(node_id)),
-                "type": data.get('type', ''),
-                "level": data.get('level', '')
-            })
+    for node_id in matched_ids:
+        data = G.nodes[node_id]
+        partial_matches.append({
+            "id": node_id,
+            "name": data.get('name', str(node_id)),
+            "type": data.get('type', ''),
+            "level": data.get('level', '')
+        })
     
-    if partial_matches:
-        return jsonify({"partial_matches": partial_matches})
+    if total:
+        return jsonify({"partial_matches": partial_matches, "total": total, "page": page, "page_size": page_size})
     else:
         return jsonify({"error": "未找到匹配的节点"}), 404
 
+@app.route('/api/search/fuzzy')
+def fuzzy_search_nodes():
+    """模糊搜索：名称、简称、拼音/拼音首字母，容忍错别字，按相似度和PageRank排序"""
+    G, node_metrics = _current_graph()
+    
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "查询参数为空"}), 400
+    k = min(max(request.args.get('k', 10, type=int), 1), FUZZY_SEARCH_MAX_K)
+    
+    pagerank = node_metrics.array('pagerank') if 'pagerank' in node_metrics else None
+    results = []
+    for match in get_fuzzy_index(G, pagerank).search(query, k):
+        data = G.nodes[match['id']]
+        match.update({
+            "name": data.get('name', str(match['id'])),
+            "short_name": data.get('short_name', ''),
+            "type": data.get('type', ''),
+            "level": data.get('level', '')
+        })
+        results.append(match)
+    
+    return jsonify({"query": query, "results": results})
+
+@app.route('/api/suggest')
+def suggest_nodes():
+    """输入联想：按前缀返回权重（PageRank或入度）最高的k个公司名称，供前端边输入边提示"""
+    G, node_metrics = _current_graph()
+    
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"query": query, "suggestions": [], "total": 0, "truncated": False})
+    k = min(max(request.args.get('k', 10, type=int), 1), SUGGEST_MAX_K)
+    weight_name = request.args.get('by', DEFAULT_WEIGHT)
+    if weight_name not in WEIGHT_METRICS:
+        return jsonify({"error": f"不支持的排序指标: {weight_name}（可选 {', '.join(WEIGHT_METRICS)}）"}), 400
+    
+    weights = node_metrics.array(weight_name) if weight_name in node_metrics else None
+    index = get_suggest_index(G, weights, weight_name)
+    result = index.suggest(query, k, graph=G, budget_ms=SUGGEST_BUDGET_MS)
+    for item in result['suggestions']:
+        data = G.nodes[item['id']]
+        item.update({
+            "name": data.get('name', str(item['id'])),
+            "short_name": data.get('short_name', ''),
+            "type": data.get('type', '')
+        })
+    result['query'] = query
+    return jsonify(result)
+
 @app.route('/api/node/<node_id>')
+@cached_response
 def get_node_info(node_id):
-    """获取特定节点的详细信息及其邻居"""
-    global G, node_metrics
-    if G is None:
-        G = build_graph()
-        calculate_node_metrics()
+    """
+    获取特定节点的详细信息及其邻居。
+    可选参数（见 node_detail.py）: limit 每页条数, sort=percent|pagerank|degree, fields 邻居字段投影, cursor 下一页游标,
+    format=table 邻居按列输出
+    """
+    G, node_metrics = _current_graph()
     
     if node_id not in G.nodes:
         return jsonify({"error": "节点不存在"}), 404
     
-    # 节点基本信息
-    node_data = G.nodes[node_id]
-    result = {
-        "id": node_id,
-        "name": node_data.get('name', str(node_id)),
-        "type": node_data.get('type', ''),
-        "level": node_data.get('level', ''),
-        "short_name": node_data.get('short_name', ''),
-        "investors": [],  # 投资方
-        "investees": [],  # 被投资企业
-        "metrics": {}     # 节点指标
-    }
+    try:
+        result = node_detail(
+            G, node_metrics, node_id,
+            limit=request.args.get('limit', type=int),
+            sort=request.args.get('sort') or None,
+            fields=request.args.get('fields'),
+            cursor=request.args.get('cursor'),
+            shape=request.args.get('format') or None,
+        )
+    except NodeQueryError as e:
+        return jsonify({"error": str(e)}), 400
     
-    # 添加节点指标
-    for metric_name in node_metrics:
-        if node_id in node_metrics[metric_name]:
-            if "metrics" not in result:
-                result["metrics"] = {}
-            result["metrics"][metric_name] = node_metrics[metric_name][node_id]
+    return jsonify(result)
+
+@app.route('/api/nodes/batch', methods=['POST'])
+def batch_nodes():
+    """
+    批量查询节点（见 node_batch.py）：请求体 {"ids": [...], "neighbors": false, "top": 5, "sort": "percent"}。
+    format=ndjson（或请求头 Accept: application/x-ndjson）时按 NDJSON 流式输出，format=json 时输出普通 JSON；
+    都没有指定时，超过 BATCH_STREAM_THRESHOLD 个 ID 按 NDJSON 输出。ID 数量超过上限时返回 413。
+    """
+    G, node_metrics = _current_graph()
+    try:
+        ids, neighbors, top, sort = parse_batch_request(request.get_json(silent=True))
+    except BatchTooLargeError as e:
+        return jsonify({"error": str(e)}), 413
+    except NodeQueryError as e:
+        return jsonify({"error": str(e)}), 400
     
-    # 获取投资方（predecessors）
-    for pred_id in G.predecessors(node_id):
-        pred_data = G.nodes[pred_id]
-        edge_data = G.get_edge_data(pred_id, node_id)
-        percent = edge_data.get('percent', None) if edge_data else None
-        percent_str = f"{percent*100:.2f}%" if percent is not None else "未知%"
-        
-        # 添加投资方的指标数据
-        metrics = {}
-        for metric_name in node_metrics:
-            if pred_id in node_metrics[metric_name]:
-                # 直接添加度量值到指标字典
-                metrics[metric_name] = node_metrics[metric_name][pred_id]
-        
-        # 确保对象有pagerank字段，这是前端重点使用的
-        if "pagerank" in node_metrics and pred_id in node_metrics["pagerank"]:
-            pagerank = node_metrics["pagerank"][pred_id]
-        else:
-            pagerank = None
-            
-        result["investors"].append({
-            "id": pred_id,
-            "name": pred_data.get('name', str(pred_id)),
-            "type": pred_data.get('type', ''),
-            "percent": percent_str,
-            "level": pred_data.get('level', ''),
-            "short_name": pred_data.get('short_name', ''),
-            "metrics": metrics,
-            "pagerank": pagerank  # 直接在对象上添加PageRank值
-        })
+    output_format = request.args.get('format')
+    if output_format not in (None, 'json', 'ndjson'):
+        return jsonify({"error": f"不支持的输出格式: {output_format}（可选 json、ndjson）"}), 400
+    if output_format is None:
+        accepts_ndjson = request.accept_mimetypes.best == NDJSON_MIMETYPE
+        output_format = 'ndjson' if accepts_ndjson or len(ids) > BATCH_STREAM_THRESHOLD else 'json'
+    if output_format == 'json':
+        return jsonify(batch_report(G, node_metrics, ids, neighbors, top, sort))
+    # 生成器持有本次请求的图和指标（不依赖请求上下文），流式输出期间图被替换也不受影响
+    body = iter_ndjson(G, node_metrics, ids, app.json.dumps_bytes, neighbors, top, sort)
+    return Response(body, mimetype=NDJSON_MIMETYPE)
+
+def _equity_table(G, node_id, upstream):
+    """
+    股权穿透分析的列式输出：两层投资方（或被投资企业）展开为行，{字段: [值...]}。
+    depth 为层级（1 直接、2 间接），parent 为上一层节点ID，percent 为原始比例（未知为 None）。
+    """
+    table = {"id": [], "name": [], "type": [], "percent": [], "depth": [], "parent": []}
+    adjacency = G.pred if upstream else G.succ
     
-    # 获取被投资企业（successors）
-    for succ_id in G.successors(node_id):
-        succ_data = G.nodes[succ_id]
-        edge_data = G.get_edge_data(node_id, succ_id)
-        percent = edge_data.get('percent', None) if edge_data else None
-        percent_str = f"{percent*100:.2f}%" if percent is not None else "未知%"
-        
-        # 添加被投资企业的指标数据
-        metrics = {}
-        for metric_name in node_metrics:
-            if succ_id in node_metrics[metric_name]:
-                metrics[metric_name] = node_metrics[metric_name][succ_id]
-        
-        # 确保对象有pagerank字段，这是前端重点使用的
-        if "pagerank" in node_metrics and succ_id in node_metrics["pagerank"]:
-            pagerank = node_metrics["pagerank"][succ_id]
-        else:
-            pagerank = None
-            
-        result["investees"].append({
-            "id": succ_id,
-            "name": succ_data.get('name', str(succ_id)),
-            "type": succ_data.get('type', ''),
-            "percent": percent_str,
-            "level": succ_data.get('level', ''),
-            "short_name": succ_data.get('short_name', ''),
-            "metrics": metrics,
-            "pagerank": pagerank  # 直接在对象上添加PageRank值
-        })
+    def add_layer(parent, depth):
+        children = list(adjacency[parent].items())
+        for child, edge_data in children:
+            data = G.nodes[child]
+            table["id"].append(child)
+            table["name"].append(data.get('name', str(child)))
+            table["type"].append(data.get('type', ''))
+            table["percent"].append(edge_data.get('percent'))
+            table["depth"].append(depth)
+            table["parent"].append(parent)
+        return [child for child, _ in children]
     
-    return jsonify(result)
+    for child in add_layer(node_id, 1):
+        add_layer(child, 2)
+    return table
 
 @app.route('/api/equity_analysis/<node_id>')
+@cached_response
 def get_equity_analysis(node_id):
-    """获取节点的股权穿透分析"""
-    global G, node_metrics
-    if G is None:
-        G = build_graph()
-        calculate_node_metrics()
+    """获取节点的股权穿透分析（format=table 时上下游两层按列输出，见 _equity_table）"""
+    G, _ = _current_graph()
     
     if node_id not in G.nodes:
         return jsonify({"error": "节点不存在"}), 404
     
+    output_format = request.args.get('format')
+    if output_format == 'table':
+        node_data = G.nodes[node_id]
+        return jsonify({
+            "id": node_id,
+            "name": node_data.get('name', str(node_id)),
+            "type": node_data.get('type', ''),
+            "format": "table",
+            "upstream": _equity_table(G, node_id, upstream=True),
+            "downstream": _equity_table(G, node_id, upstream=False)
+        })
+    elif output_format:
+        return jsonify({"error": f"不支持的输出格式: {output_format}（可选 table）"}), 400
+    
     # 节点基本信息
     node_data = G.nodes[node_id]
     
@@ -392,11 +542,91 @@ def get_equity_analysis(node_id):
     
     return jsonify(result)
 
+@app.route('/api/penetration/<node_id>')
+@cached_response
+def get_penetration(node_id):
+    """
+    多层股权穿透（见 equity_penetration.py）：沿所有持股路径累乘持股比例，计算间接/最终持股。
+    参数: direction=up|down, depth 最多层数, threshold 剪枝阈值, limit 返回条数, min_ownership 最小穿透比例
+    """
+    G, _ = _current_graph()
+    if node_id not in G.nodes:
+        return jsonify({"error": "节点不存在"}), 404
+    direction = request.args.get('direction', DIRECTION_UP)
+    if direction not in (DIRECTION_UP, DIRECTION_DOWN):
+        return jsonify({"error": f"不支持的穿透方向: {direction}（可选 up、down）"}), 400
+    depth = min(max(request.args.get('depth', PENETRATION_DEFAULT_DEPTH, type=int), 1), PENETRATION_MAX_DEPTH)
+    threshold = request.args.get('threshold', PENETRATION_DEFAULT_THRESHOLD, type=float)
+    if not 0 <= threshold < 1:
+        return jsonify({"error": "threshold 必须在 0 到 1 之间"}), 400
+    limit = min(max(request.args.get('limit', PENETRATION_DEFAULT_LIMIT, type=int), 1), PENETRATION_MAX_LIMIT)
+    min_ownership = request.args.get('min_ownership', 0.0, type=float)
+    
+    report = penetration_report(G, node_id, direction, depth, threshold, limit, min_ownership)
+    return jsonify(report)
+
+@app.route('/api/control_paths')
+@cached_response
+def get_control_paths():
+    """
+    控制链路径查询（见 control_paths.py）：从股东到目标企业持股比例乘积最大的 k 条持股路径。
+    参数: source 股东节点ID, target 目标企业节点ID, k 路径条数, max_depth 路径最多层数
+    """
+    G, _ = _current_graph()
+    source = request.args.get('source', '')
+    target = request.args.get('target', '')
+    if not source or not target:
+        return jsonify({"error": "需要 source 和 target 参数"}), 400
+    for node_id in (source, target):
+        if node_id not in G.nodes:
+            return jsonify({"error": f"节点不存在: {node_id}"}), 404
+    k = min(max(request.args.get('k', CONTROL_PATHS_DEFAULT_K, type=int), 1), CONTROL_PATHS_MAX_K)
+    max_depth = min(max(request.args.get('max_depth', CONTROL_PATHS_DEFAULT_DEPTH, type=int), 1), CONTROL_PATHS_MAX_DEPTH)
+    
+    report = control_paths_report(G, source, target, k, max_depth)
+    return jsonify(report)
+
+@app.route('/api/admin/reload', methods=['POST'])
+def reload_graph():
+    """
+    在后台重新加载图（数据文件更新后调用），构建和预热完成后原子切换，期间请求照常使用旧图。
+    参数（JSON 或表单，均可选）: csv_path 新的数据文件, wait=1 等待加载完成再返回
+    需要请求头 X-Admin-Token（环境变量 GRAPH_ADMIN_TOKEN）；未设置令牌时管理接口不可用。
+    csv_path 相对于 DATA_DIR（环境变量 GRAPH_DATA_DIR），不能指向该目录之外的文件。
+    多进程共享模式（GRAPH_SHARED_MEMORY=1）下返回 409。
+    """
+    error = _admin_error()
+    if error is not None:
+        return error
+    if SHARED_MEMORY:
+        # 多进程部署中只有处理该请求的工作进程会切换，各进程会返回不同版本的数据（和不同的 ETag）
+        return jsonify({"error": "多进程共享模式下不支持在线重新加载，请平滑重启 gunicorn（见 README）"}), 409
+    params = request.get_json(silent=True) or request.form
+    csv_path = params.get('csv_path') or None
+    if csv_path is not None:
+        resolved = _data_file_path(str(csv_path))
+        if resolved is None:
+            return jsonify({"error": f"数据文件不存在或不在数据目录中: {csv_path}"}), 400
+        csv_path = resolved
+    wait = str(params.get('wait', request.args.get('wait', ''))).lower() in ('1', 'true', 'yes')
+    
+    started = graph_holder.reload(csv_path, wait=wait)
+    status = graph_holder.status()
+    status["started"] = started
+    return jsonify(status), 200 if wait else 202
+
+@app.route('/api/admin/status')
+def graph_status():
+    """当前图的版本、加载时间，以及后台重新加载的状态"""
+    error = _admin_error()
+    if error is not None:
+        return error
+    return jsonify(graph_holder.status())
+
 if __name__ == '__main__':
     # 初始化加载图
     print("正在预加载图数据...")
-    G = build_graph("三层股权穿透输出数据_1.csv")
-    calculate_node_metrics()
-    print(f"图加载完成，共 {G.number_of_nodes()} 个节点和 {G.number_of_edges()} 条边")
+    state = graph_holder.load("三层股权穿透输出数据_1.csv")
+    print(f"图加载完成，共 {state.graph.number_of_nodes()} 个节点和 {state.graph.number_of_edges()} 条边")
     # 尝试使用8888端口，避免冲突
-    app.run(debug=True, host='0.0.0.0', port=8888) 
\ No newline at end of file
+    app.run(debug=True, host='0.0.0.0', port=8888)
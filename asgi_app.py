@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+API 的 ASGI 版本：接口、参数和 JSON 结构与 app.py 完全相同，请求并发处理。
+
+app.py 的路由是同步的，开发服务器每个请求占一个线程，一个慢请求（例如大图上的 /api/graph/stats
+或上万个邻居的 /api/node/<id>）会和其他请求争抢同一批线程。这里在事件循环上接收请求，把处理函数
+（直接复用 app.py 的 Flask 视图，不重复实现）放到有界的线程池中执行：
+- 两个线程池：轻量接口（首页、静态文件、搜索、输入联想、管理状态）和计算量大的接口分开，
+  慢请求占满计算池时，轻量接口仍然及时响应；
+- 每个池有排队上限，排队已满时直接返回 503（带 Retry-After），不无限堆积；
+- 每个请求有超时（按接口配置），超时返回 504；客户端断开或超时时，尚未开始执行的任务直接取消，
+  已经在执行的任务无法中途打断（Python 线程不能被强制停止），结果被丢弃
+  （响应缓存仍会保存结果，重试时直接命中）；
+- 响应体由工作线程逐段交给事件循环发送（有界队列，客户端读得慢时工作线程等待），
+  流式响应（例如 /api/nodes/batch 的 NDJSON）边生成边发送，不在内存中拼出整个响应体；
+  超时只作用于响应开始之前，开始发送后客户端断开时停止生成；
+- 启动时（lifespan）在后台线程中预加载图，第一个请求不用等待构建。
+
+用法:
+    pip install uvicorn
+    python asgi_app.py --port 8888 --heavy-workers 4
+    uvicorn asgi_app:application --port 8888
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import HTTPException
+
+import app as flask_module
+
+# 轻量接口：在单独的线程池中执行，不会被慢请求挤占
+LIGHT_ENDPOINTS = frozenset({'index', 'static', 'search_nodes', 'suggest_nodes', 'graph_status'})
+DEFAULT_LIGHT_WORKERS = 8
+DEFAULT_HEAVY_WORKERS = max(2, min(8, os.cpu_count() or 2))
+DEFAULT_MAX_QUEUE = 64 # 每个池在执行之外最多排队的请求数
+DEFAULT_LIGHT_TIMEOUT = 5.0 # 秒
+DEFAULT_HEAVY_TIMEOUT = 30.0
+# 个别接口的超时（秒）
+ENDPOINT_TIMEOUTS = {
+    'get_graph_stats': 60.0,
+    'reload_graph': 600.0,
+}
+RESPONSE_QUEUE_SIZE = 8 # 工作线程与事件循环之间最多缓冲的响应体段数
+
+class _Pool:
+    """有界线程池：最多 workers 个请求同时执行，另有 max_queue 个排队，超出时拒绝。"""
+
+    def __init__(self, name, workers, max_queue, timeout):
+        self.name = name
+        self.workers = workers
+        self.capacity = workers + max_queue
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"asgi-{name}")
+        self.in_flight = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.cancelled = 0
+
+    def stats(self):
+        return {"workers": self.workers, "capacity": self.capacity, "in_flight": self.in_flight,
+                "rejected": self.rejected, "timed_out": self.timed_out, "cancelled": self.cancelled}
+
+def _wsgi_environ(scope, body):
+    """把 ASGI 的 HTTP scope 转换为 WSGI environ。"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+            continue
+        key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    # 请求体已完整读入（分块传输的请求没有 Content-Length），按实际长度告诉应用
+    environ['CONTENT_LENGTH'] = str(len(body))
+    environ['wsgi.input_terminated'] = True
+    return environ
+
+class _ClientGone(Exception):
+    """客户端已断开或请求已超时，工作线程停止生成响应体。"""
+
+class _ResponseChannel:
+    """
+    工作线程 -> 事件循环的响应通道：依次放入 ('start', 状态码, 响应头)、('body', 字节)，结束时放入 None。
+    队列有界，事件循环发送得慢时工作线程在 put 中等待；close() 后 put 抛出 _ClientGone。
+    """
+
+    def __init__(self, loop, maxsize=RESPONSE_QUEUE_SIZE):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        self.closed = False
+
+    def put(self, item):
+        """在工作线程中调用。"""
+        if self.closed:
+            raise _ClientGone()
+        future = asyncio.run_coroutine_threadsafe(self.queue.put(item), self.loop)
+        while True:
+            try:
+                future.result(timeout=1.0)
+                return
+            except concurrent.futures.TimeoutError:
+                if self.closed:
+                    future.cancel()
+                    raise _ClientGone()
+
+    def close(self):
+        """在事件循环中调用：不再接收响应体，并清空队列让等待中的工作线程继续。"""
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+def _call_wsgi(wsgi_app, environ, channel):
+    """在线程池中执行 Flask 应用，把响应开始和各段响应体依次交给 channel；出错时放入 ('error', 异常)。"""
+
+    def start_response(status, headers, exc_info=None):
+        channel.put(('start', int(status.split(' ', 1)[0]), headers))
+        return write
+
+    def write(data):
+        if data:
+            channel.put(('body', data))
+
+    try:
+        result = wsgi_app(environ, start_response)
+        try:
+            for chunk in result:
+                write(chunk)
+        finally:
+            close = getattr(result, 'close', None)
+            if close is not None:
+                close()
+        channel.put(None)
+    except _ClientGone:
+        pass
+    except Exception as e: # 交给事件循环抛出，由服务器返回 500 或中断连接
+        try:
+            channel.put(('error', e))
+        except _ClientGone:
+            pass
+
+class AsyncGraphAPI:
+    """
+    ASGI 应用：在有界线程池中执行 app.py 的 Flask 视图。
+
+    参数:
+    wsgi_app: Flask 应用（默认 app.app）。
+    light_workers / heavy_workers (int): 轻量接口、计算接口线程池的大小。
+    max_queue (int): 每个池在执行之外最多排队的请求数。
+    light_timeout / heavy_timeout (float): 默认超时（秒），ENDPOINT_TIMEOUTS 中的接口单独设置。
+    preload (bool): 启动时是否预加载图。
+    """
+
+    def __init__(self, wsgi_app=None, light_workers=DEFAULT_LIGHT_WORKERS, heavy_workers=DEFAULT_HEAVY_WORKERS,
+                 max_queue=DEFAULT_MAX_QUEUE, light_timeout=DEFAULT_LIGHT_TIMEOUT, heavy_timeout=DEFAULT_HEAVY_TIMEOUT,
+                 preload=True):
+        self.wsgi_app = wsgi_app or flask_module.app
+        self.url_map = self.wsgi_app.url_map
+        self.light = _Pool('light', light_workers, max_queue, light_timeout)
+        self.heavy = _Pool('heavy', heavy_workers, max_queue, heavy_timeout)
+        self.preload = preload
+
+    def stats(self):
+        return {"light": self.light.stats(), "heavy": self.heavy.stats()}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                if self.preload:
+                    loop = asyncio.get_running_loop()
+                    try:
+                        await loop.run_in_executor(self.heavy.executor, flask_module.graph_holder.get)
+                    except Exception as e:
+                        await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                        return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for pool in (self.light, self.heavy):
+                    pool.executor.shutdown(wait=False, cancel_futures=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _route(self, scope):
+        """返回 (线程池, 超时秒数)；无法匹配的路径交给 Flask 处理（404/405）。"""
+        try:
+            endpoint, _ = self.url_map.bind('localhost').match(scope['path'], method=scope['method'])
+        except HTTPException:
+            return self.light, self.light.timeout
+        pool = self.light if endpoint in LIGHT_ENDPOINTS else self.heavy
+        return pool, ENDPOINT_TIMEOUTS.get(endpoint, pool.timeout)
+
+    async def _http(self, scope, receive, send):
+        body = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        pool, timeout = self._route(scope)
+        if pool.in_flight >= pool.capacity:
+            pool.rejected += 1
+            await _send_json(send, 503, '{"error": "服务繁忙，请稍后重试"}', [(b'retry-after', b'1')])
+            return
+
+        loop = asyncio.get_running_loop()
+        environ = _wsgi_environ(scope, b''.join(body))
+        channel = _ResponseChannel(loop)
+        pool.in_flight += 1
+        future = pool.executor.submit(_call_wsgi, self.wsgi_app, environ, channel)
+        # 任务真正结束（响应体全部生成、出错或排队时被取消）后才释放名额
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(_release, pool))
+        disconnect = asyncio.ensure_future(_wait_disconnect(receive))
+        try:
+            # 超时只作用于响应开始之前
+            started = asyncio.ensure_future(channel.queue.get())
+            done, _ = await asyncio.wait({started, disconnect}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if started not in done:
+                started.cancel()
+                future.cancel() # 尚未开始执行的任务直接取消；已在执行的在下次输出时停止，结果丢弃
+                if disconnect in done:
+                    pool.cancelled += 1
+                    return
+                pool.timed_out += 1
+                await _send_json(send, 504, f'{{"error": "请求超时（{timeout:g}秒）"}}')
+                return
+            message = started.result()
+            if message is None or message[0] == 'error':
+                raise message[1] if message else RuntimeError("WSGI 应用没有返回响应")
+            _, status, headers = message
+            await send({
+                'type': 'http.response.start',
+                'status': status,
+                'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers],
+            })
+            while True:
+                receiving = asyncio.ensure_future(channel.queue.get())
+                done, _ = await asyncio.wait({receiving, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+                if receiving not in done:
+                    receiving.cancel()
+                    pool.cancelled += 1
+                    return
+                message = receiving.result()
+                if message is None:
+                    break
+                if message[0] == 'error':
+                    raise message[1] # 响应已经开始：中断连接，客户端看到不完整的响应
+                await send({'type': 'http.response.body', 'body': message[1], 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnect.cancel()
+            channel.close()
+
+def _release(pool):
+    pool.in_flight -= 1
+
+async def _wait_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+async def _send_json(send, status, text, extra_headers=()):
+    content = text.encode('utf-8')
+    headers = [(b'content-type', b'application/json'), (b'content-length', str(len(content)).encode('ascii'))]
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers + list(extra_headers)})
+    await send({'type': 'http.response.body', 'body': content})
+
+application = AsyncGraphAPI()
+
+def main():
+    parser = argparse.ArgumentParser(description='以 ASGI 方式运行 API（需要 uvicorn）。')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8888)
+    parser.add_argument('--light-workers', type=int, default=DEFAULT_LIGHT_WORKERS, help='轻量接口线程数（默认 %(default)s）。')
+    parser.add_argument('--heavy-workers', type=int, default=DEFAULT_HEAVY_WORKERS, help='计算接口线程数（默认 %(default)s）。')
+    parser.add_argument('--max-queue', type=int, default=DEFAULT_MAX_QUEUE, help='每个线程池最多排队的请求数（默认 %(default)s）。')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_HEAVY_TIMEOUT, help='计算接口的超时秒数（默认 %(default)s）。')
+    args = parser.parse_args()
+    try:
+        import uvicorn
+    except ImportError:
+        print("ASGI: 需要 uvicorn: pip install uvicorn")
+        return
+    api = AsyncGraphAPI(light_workers=args.light_workers, heavy_workers=args.heavy_workers,
+                        max_queue=args.max_queue, heavy_timeout=args.timeout)
+    uvicorn.run(api, host=args.host, port=args.port, log_level='warning')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+API 负载测试：多个并发客户端同时请求，对比 Flask 开发服务器（app.run(debug=True) 的方式）与
+ASGI 版本（asgi_app.py + uvicorn）下各类接口的 p50 / p99 延迟和吞吐量。
+
+请求分两类：
+- 轻量：输入联想、名称搜索；
+- 计算：多层股权穿透、控制链路径、分页排序的节点详情。参数各不相同，不会命中响应缓存。
+慢请求占满线程时轻量请求的尾延迟差别最明显；用 --copies 放大数据后计算接口更慢，对比更清楚。
+
+用法:
+    pip install uvicorn
+    python benchmark_api.py --clients 32 --duration 20
+    python benchmark_api.py --copies 500 --clients 64 --heavy-ratio 0.3
+    python benchmark_api.py --servers asgi --heavy-workers 2
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+
+from graph_builder import build_graph
+
+SOURCE_CSV = '三层股权穿透输出数据.csv'
+FLASK_COMMAND = ("import app; "
+                 "app.app.run(debug=True, use_reloader=False, threaded=True, host='127.0.0.1', port={port})")
+
+def start_server(kind, port, csv_path, heavy_workers=None):
+    """启动服务子进程（'flask' 或 'asgi'），返回 Popen。"""
+    env = dict(os.environ, GRAPH_CSV_PATH=csv_path, PYTHONUNBUFFERED='1')
+    if kind == 'flask':
+        command = [sys.executable, '-c', FLASK_COMMAND.format(port=port)]
+    else:
+        command = [sys.executable, 'asgi_app.py', '--host', '127.0.0.1', '--port', str(port)]
+        if heavy_workers:
+            command += ['--heavy-workers', str(heavy_workers)]
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def request(port, path, timeout=120):
+    """发送一个 GET 请求，返回 (状态码, 耗时秒)。"""
+    started = time.perf_counter()
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        connection.request('GET', path)
+        response = connection.getresponse()
+        response.read()
+        status = response.status
+    except (OSError, http.client.HTTPException):
+        status = 0
+    finally:
+        connection.close()
+    return status, time.perf_counter() - started
+
+def wait_ready(port, timeout=600):
+    """等待服务可用并完成图的加载（首个请求触发加载）。"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status, _ = request(port, '/api/graph/stats', timeout=timeout)
+        if status == 200:
+            return True
+        time.sleep(0.5)
+    return False
+
+class Workload:
+    """根据图生成随机请求：轻量请求和计算请求各自的路径生成器。"""
+
+    def __init__(self, G, seed=0):
+        self.random = random.Random(seed)
+        self.nodes = list(G)
+        self.names = [G.nodes[n].get('name', '') for n in self.nodes]
+        self.names = [name for name in self.names if len(name) >= 2]
+        self.with_investors = [n for n in self.nodes if G.in_degree(n) > 0]
+        self.counter = 0
+        self.lock = threading.Lock()
+
+    def _unique(self):
+        with self.lock:
+            self.counter += 1
+            return self.counter
+
+    def light(self):
+        name = self.random.choice(self.names)
+        prefix = name[:self.random.randint(1, min(4, len(name)))]
+        if self.random.random() < 0.5:
+            return 'suggest', '/api/suggest?' + urllib.parse.urlencode({'q': prefix, 'k': 10})
+        return 'search', '/api/search?' + urllib.parse.urlencode({'q': prefix})
+
+    def heavy(self):
+        unique = self._unique()
+        choice = self.random.random()
+        node = self.random.choice(self.with_investors or self.nodes)
+        quoted = urllib.parse.quote(node, safe='')
+        if choice < 0.5:
+            # 阈值各不相同，每次都要重新计算
+            query = urllib.parse.urlencode({'depth': 20, 'threshold': f"{1e-7 * (1 + unique % 997):.3e}", 'limit': 200})
+            return 'penetration', f"/api/penetration/{quoted}?{query}"
+        if choice < 0.8:
+            source = self.random.choice(self.nodes)
+            query = urllib.parse.urlencode({'source': source, 'target': node, 'k': 10, 'max_depth': 10 + unique % 7})
+            return 'control_paths', f"/api/control_paths?{query}"
+        query = urllib.parse.urlencode({'sort': 'pagerank', 'limit': 50 + unique % 50})
+        return 'node', f"/api/node/{quoted}?{query}"
+
+def run_load(port, workload, clients, duration, heavy_ratio):
+    """clients 个线程各自循环发送请求 duration 秒，返回 {请求类型: [(状态码, 耗时), ...]}。"""
+    results = {}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(seed):
+        rng = random.Random(seed)
+        local = []
+        while time.perf_counter() < stop_at:
+            kind, path = workload.heavy() if rng.random() < heavy_ratio else workload.light()
+            status, elapsed = request(port, path)
+            local.append((kind, status, elapsed))
+        with lock:
+            for kind, status, elapsed in local:
+                results.setdefault(kind, []).append((status, elapsed))
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def summarize(results, duration):
+    """按请求类型（以及轻量/计算合计）统计 p50 / p99 / 最大延迟（毫秒）和成功率。"""
+    groups = dict(results)
+    groups['LIGHT'] = results.get('suggest', []) + results.get('search', [])
+    groups['HEAVY'] = results.get('penetration', []) + results.get('control_paths', []) + results.get('node', [])
+    summary = {}
+    for kind, samples in groups.items():
+        if not samples:
+            continue
+        latencies = np.array([elapsed for _, elapsed in samples]) * 1000
+        ok = sum(1 for status, _ in samples if status == 200)
+        summary[kind] = {
+            'count': len(samples),
+            'ok': ok,
+            'rps': round(len(samples) / duration, 1),
+            'p50': round(float(np.percentile(latencies, 50)), 1),
+            'p99': round(float(np.percentile(latencies, 99)), 1),
+            'max': round(float(latencies.max()), 1),
+        }
+    return summary
+
+def print_summary(label, summary):
+    print(f"\n[{label}]")
+    print(f"{'类型':<14}{'请求数':>8}{'成功':>8}{'req/s':>9}{'p50(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    for kind in sorted(summary, key=lambda k: (k not in ('LIGHT', 'HEAVY'), k)):
+        row = summary[kind]
+        print(f"{kind:<14}{row['count']:>8}{row['ok']:>8}{row['rps']:>9}{row['p50']:>10}{row['p99']:>10}{row['max']:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description='对比 Flask 开发服务器与 ASGI 版本在并发下的延迟。')
+    parser.add_argument('--csv', default=SOURCE_CSV, help='数据文件（默认样例数据）。')
+    parser.add_argument('--copies', type=int, default=0, help='把样例数据复制放大的份数（见 benchmark_build_graph.py），0 表示不放大。')
+    parser.add_argument('--servers', default='flask,asgi', help='要测试的服务，逗号分隔（flask、asgi）。')
+    parser.add_argument('--clients', type=int, default=32, help='并发客户端数（默认 %(default)s）。')
+    parser.add_argument('--duration', type=float, default=20.0, help='每个服务的压测时长，秒（默认 %(default)s）。')
+    parser.add_argument('--heavy-ratio', type=float, default=0.2, help='计算请求所占比例（默认 %(default)s）。')
+    parser.add_argument('--heavy-workers', type=int, default=None, help='ASGI 计算线程池大小。')
+    parser.add_argument('--port', type=int, default=18888, help='起始端口。')
+    parser.add_argument('--output', default=None, help='把结果保存为 JSON。')
+    args = parser.parse_args()
+
+    csv_path = args.csv
+    if args.copies:
+        from benchmark_build_graph import make_synthetic_csv
+        csv_path = make_synthetic_csv(args.copies, os.path.join('outputs', 'temp', f'api_bench_x{args.copies}.csv'))
+    G = build_graph(csv_path)
+    print(f"数据: {csv_path}（{G.number_of_nodes()} 个节点，{G.number_of_edges()} 条边）；"
+          f"{args.clients} 个并发客户端，计算请求占 {args.heavy_ratio:.0%}，每个服务 {args.duration:g} 秒")
+
+    report = {}
+    for i, kind in enumerate(s.strip() for s in args.servers.split(',') if s.strip()):
+        port = args.port + i
+        process = start_server(kind, port, csv_path, args.heavy_workers)
+        try:
+            if not wait_ready(port):
+                print(f"{kind}: 服务未能启动")
+                continue
+            workload = Workload(G, seed=42)
+            results = run_load(port, workload, args.clients, args.duration, args.heavy_ratio)
+            report[kind] = summarize(results, args.duration)
+            print_summary(kind, report[kind])
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+        print(f"\n结果已保存到 {args.output}")
+
+if __name__ == '__main__':
+    main()
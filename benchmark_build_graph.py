@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+图构建性能基准：把样例CSV复制放大到指定规模后，对比不同构建方式的耗时，并校验生成的图完全一致。
+
+用法:
+    python benchmark_build_graph.py --copies 200
+    python benchmark_build_graph.py --copies 200 --workers 1,2,4,8   # 并行构建：吞吐量随进程数的变化
+    python benchmark_build_graph.py --copies 200 --chunksize 5000     # 流式读取：峰值内存对比
+    python benchmark_build_graph.py --copies 200 --cache              # 构建缓存：冷/热启动耗时
+"""
+import argparse
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import graph_builder
+
+SOURCE_CSV = '三层股权穿透输出数据.csv'
+ENCODINGS_TO_TRY = ['utf-8-sig', 'utf-8', 'gbk', 'gb18030']
+
+_EID_PATTERN = re.compile(r"'eid': '([^']+)'")
+_NAME_PATTERN = re.compile(r"'name': '([^']+)'")
+
+os.makedirs('outputs/temp', exist_ok=True)
+
+def _read_source(csv_path):
+    for encoding in ENCODINGS_TO_TRY:
+        try:
+            return pd.read_csv(csv_path, encoding=encoding, dtype=str)
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f"无法读取CSV文件: {csv_path}")
+
+def make_synthetic_csv(copies, output_path, source_csv=SOURCE_CSV):
+    """把样例数据复制 copies 份（每份的 eid/name 加不同后缀），生成规模放大的测试CSV。"""
+    df = _read_source(source_csv)
+    frames = []
+    for k in range(copies):
+        suffix = f"_{k}"
+        part = df.copy()
+        for col in ('eid', 'parent_id'):
+            part[col] = part[col].where(part[col].isna(), part[col] + suffix)
+        part['name'] = part['name'].where(part['name'].isna(), part['name'] + suffix)
+        part['children'] = part['children'].map(
+            lambda s: s if pd.isna(s) else _NAME_PATTERN.sub(
+                lambda m: f"'name': '{m.group(1)}{suffix}'",
+                _EID_PATTERN.sub(lambda m: f"'eid': '{m.group(1)}{suffix}'", s)))
+        frames.append(part)
+    pd.concat(frames, ignore_index=True).to_csv(output_path, index=False, encoding='utf-8')
+    return output_path
+
+def graphs_identical(g1, g2):
+    """节点、边、属性以及插入顺序都相同才返回 True。"""
+    if list(g1.nodes(data=True)) != list(g2.nodes(data=True)):
+        return False
+    if list(g1.edges(data=True)) != list(g2.edges(data=True)):
+        return False
+    return all(list(g1.predecessors(n)) == list(g2.predecessors(n)) for n in g1.nodes())
+
+def time_build(csv_path, repeat=1, **kwargs):
+    best = None
+    graph = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        graph = graph_builder.build_graph(csv_path, **dict({'use_cache': False}, **kwargs))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, graph
+
+def count_rows(csv_path):
+    with open(csv_path, encoding='utf-8') as f:
+        return sum(1 for _ in f) - 1
+
+def benchmark_workers(csv_path, worker_counts, repeat, reference):
+    """并行构建的吞吐量（行/秒）随进程数的变化，并校验结果与串行构建一致。"""
+    rows = count_rows(csv_path)
+    print(f"\n并行构建 ({rows} 行, 本机 {os.cpu_count()} 个CPU)")
+    print("进程数     耗时(秒)     行/秒    相对串行  与串行一致")
+    baseline = None
+    for workers in worker_counts:
+        elapsed, graph = time_build(csv_path, repeat=repeat, workers=workers)
+        baseline = baseline or elapsed
+        print(f"{workers:6d}  {elapsed:10.3f}  {rows / elapsed:9.0f}  {baseline / elapsed:8.2f}x  {graphs_identical(reference, graph)}")
+
+def _build_and_report(csv_path, kwargs):
+    graph_builder.build_graph(csv_path, use_cache=False, **kwargs)
+    return graph_builder.last_build_report
+
+def benchmark_memory(csv_path, chunksize):
+    """在全新的子进程中分别运行一次性读取和流式读取，对比各自的峰值内存（RSS）。"""
+    print("\n模式                          耗时(秒)   峰值RSS(MB)")
+    context = multiprocessing.get_context('spawn') # 不继承父进程的内存，峰值只反映本次构建
+    for kwargs in ({}, {'chunksize': chunksize}):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            report = executor.submit(_build_and_report, csv_path, kwargs).result()
+        peak = report['peak_rss_mb']
+        peak_str = f"{peak:12.1f}" if peak is not None else "         N/A"
+        print(f"{report['mode']:28s} {report['seconds']:9.3f}  {peak_str}")
+
+def benchmark_cache(csv_path, reference):
+    """构建缓存：冷启动（解析并写缓存）与热启动（从缓存快照加载）的耗时对比。"""
+    cache_dir = 'outputs/temp/build_cache'
+    graph_builder.purge_build_cache(cache_dir=cache_dir)
+    start = time.perf_counter()
+    graph_builder.build_graph(csv_path, cache_dir=cache_dir)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    warm_graph = graph_builder.build_graph(csv_path, cache_dir=cache_dir)
+    warm = time.perf_counter() - start
+    print(f"\n构建缓存: 冷启动 {cold:.3f} 秒, 热启动 {warm:.3f} 秒 ({cold / warm:.1f}x), "
+          f"与重新解析一致: {graphs_identical(reference, warm_graph)}")
+
+def main():
+    parser = argparse.ArgumentParser(description='对比图构建引擎的耗时。')
+    parser.add_argument('--copies', type=int, default=100, help='样例数据复制的份数 (默认100)。')
+    parser.add_argument('--repeat', type=int, default=3, help='每种方式重复次数，取最快一次 (默认3)。')
+    parser.add_argument('--workers', type=str, default='', help='逗号分隔的进程数列表，例如 1,2,4,8；为空则不测试并行构建。')
+    parser.add_argument('--cache', action='store_true', help='测试构建缓存的冷/热启动耗时。')
+    parser.add_argument('--chunksize', type=int, default=0, help='流式读取每块的行数；为0则不测试流式读取。')
+    args = parser.parse_args()
+
+    csv_path = make_synthetic_csv(args.copies, f'outputs/temp/benchmark_{args.copies}x.csv')
+    print(f"测试数据: {csv_path} ({os.path.getsize(csv_path) / 1e6:.1f} MB)")
+
+    t_rows, g_rows = time_build(csv_path, repeat=args.repeat, engine='rows')
+    t_vec, g_vec = time_build(csv_path, repeat=args.repeat, engine='vectorized')
+
+    print("\n引擎         耗时(秒)   节点数     边数")
+    print(f"rows        {t_rows:9.3f}  {g_rows.number_of_nodes():8d} {g_rows.number_of_edges():8d}")
+    print(f"vectorized  {t_vec:9.3f}  {g_vec.number_of_nodes():8d} {g_vec.number_of_edges():8d}")
+    print(f"\n加速比: {t_rows / t_vec:.2f}x")
+    print(f"图是否完全一致: {graphs_identical(g_rows, g_vec)}")
+
+    if args.workers:
+        worker_counts = [int(w) for w in args.workers.split(',') if w.strip()]
+        benchmark_workers(csv_path, worker_counts, args.repeat, g_vec)
+
+    if args.cache:
+        benchmark_cache(csv_path, g_vec)
+
+    if args.chunksize:
+        _, g_stream = time_build(csv_path, chunksize=args.chunksize)
+        print(f"\n流式读取与一次性读取结果一致: {graphs_identical(g_vec, g_stream)}")
+        benchmark_memory(csv_path, args.chunksize)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+children 字段专用解析器。
+
+CSV 中的 children 列是 Python 字面量风格的嵌套列表，例如
+    [{'eid': '...', 'name': '...', 'percent': '95.00%', 'count': 0, 'children': [...]}]
+这里用一个正则分词器加显式栈的状态机一次性解析整棵嵌套树，
+不调用 ast.literal_eval/eval，也没有失败后替换引号再重试的过程。
+
+为了减少 Python 层面的循环次数，分词时把最常见的 'key': 'value', 作为一个记号整体匹配。
+同时兼容 JSON 写法（双引号字符串、null/true/false），字符串中的转义
+（\\'、\\"、\\\\、\\n、\\uXXXX 等）按 Python 字面量规则处理。
+单引号字符串中不在字符串末尾的 \\\\' 也当作单引号，例如 'O\\\\'Brien' 解析为 O'Brien
+（导出数据中常见的写法，原来的 JSON 回退解析接受它）；'a\\\\' 后面紧跟 , : ] } 或空白时仍是以反斜杠结尾的字符串。
+"""
+import re
+
+class ChildrenParseError(ValueError):
+    """children 字段格式错误。"""
+
+class MalformedChildrenError(ValueError):
+    """严格模式下汇总所有 children 字段无法解析的行。
+
+    errors 为 (行号, 节点ID, 错误信息) 列表，行号是CSV文件中的行号（表头为第1行）。
+    """
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        lines = [f"  第{row_number}行 (节点 {node_id}): {message}" for row_number, node_id, message in self.errors[:20]]
+        if len(self.errors) > 20:
+            lines.append(f"  ...以及其他 {len(self.errors) - 20} 行")
+        super().__init__(f"{len(self.errors)} 行的 children 字段无法解析:\n" + "\n".join(lines))
+
+# \\' 后面不是字符串结束后可能出现的字符时，是转义的单引号（见模块说明）
+_SINGLE_QUOTED = r"'[^'\\]*(?:(?:\\\\'(?![\s,:\]}]|$)|\\.)[^'\\]*)*'"
+_DOUBLE_QUOTED = r'"[^"\\]*(?:\\.[^"\\]*)*"'
+_NUMBER = r"-?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?"
+
+# 每个记号对应 findall 结果中的一个元组:
+# (键值对的键, 键值对的值, 键值对后的逗号, 带冒号的键, 字符串, 符号, 数字, 标识符, 非法字符)
+_TOKEN_PATTERN = re.compile(
+    r"\s*(?:"
+    rf"({_SINGLE_QUOTED})\s*:\s*({_SINGLE_QUOTED})\s*(,?)"
+    rf"|({_SINGLE_QUOTED})\s*:"
+    rf"|({_SINGLE_QUOTED}|{_DOUBLE_QUOTED})"
+    r"|([\[\]{},:])"
+    rf"|({_NUMBER})"
+    r"|([A-Za-z_]\w*)"
+    r"|(\S))",
+    re.DOTALL)
+
+_ESCAPES = r"u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8}|x[0-9a-fA-F]{2}|[0-7]{1,3}|."
+_ESCAPE_PATTERN = re.compile(rf"\\({_ESCAPES})", re.DOTALL)
+_SINGLE_ESCAPE_PATTERN = re.compile(rf"\\(\\'|{_ESCAPES})", re.DOTALL) # 单引号字符串：另外识别 \\'
+_SIMPLE_ESCAPES = {
+    '\\': '\\', "'": "'", '"': '"', 'n': '\n', 't': '\t', 'r': '\r',
+    'b': '\b', 'f': '\f', 'a': '\a', 'v': '\v', '/': '/', '\n': '',
+}
+_WORDS = {'None': None, 'null': None, 'True': True, 'true': True, 'False': False, 'false': False}
+
+# 状态机期望的下一个记号
+_EXPECT_VALUE = 0      # 列表元素 / 字典值 / 顶层值
+_EXPECT_SEPARATOR = 1  # ',' 或右括号
+_EXPECT_KEY = 2        # 字典键或 '}'
+_EXPECT_COLON = 3      # 字典键之后的 ':'
+_EXPECT_END = 4        # 顶层值已结束
+
+def _replace_escape(match):
+    seq = match.group(1)
+    if seq == "\\'": # 单引号字符串中的 \\'
+        return "'"
+    if seq[0] in '01234567': # 八进制转义
+        return chr(int(seq, 8))
+    if len(seq) > 1: # \uXXXX、\UXXXXXXXX 或 \xXX
+        return chr(int(seq[1:], 16))
+    return _SIMPLE_ESCAPES.get(seq, '\\' + seq) # 未知转义保留反斜杠，与 Python 一致
+
+def _unquote(token):
+    body = token[1:-1]
+    if '\\' in body:
+        pattern = _SINGLE_ESCAPE_PATTERN if token[0] == "'" else _ESCAPE_PATTERN
+        return pattern.sub(_replace_escape, body)
+    return body
+
+def parse_children(text):
+    """
+    解析一个 children 字段字符串，返回子节点列表（嵌套的 children 也一并解析为列表）。
+
+    格式错误时抛出 ChildrenParseError。
+    """
+    stack = []          # 外层容器及其待填的键: (容器, 键)
+    container = None    # 当前所在的列表或字典；None 表示顶层
+    key = None          # 当前字典中等待取值的键
+    result = None
+    state = _EXPECT_VALUE
+
+    for pair_key, pair_value, pair_comma, colon_key, string, punct, number, word, bad in _TOKEN_PATTERN.findall(text):
+        if pair_key:
+            # 'key': 'value' 整体作为一个记号
+            if state != _EXPECT_KEY:
+                raise ChildrenParseError(f"意外的键值对 {pair_key}")
+            container[_unquote(pair_key)] = _unquote(pair_value)
+            state = _EXPECT_KEY if pair_comma else _EXPECT_SEPARATOR
+            continue
+        if colon_key:
+            if state != _EXPECT_KEY:
+                raise ChildrenParseError(f"意外的键 {colon_key}")
+            key = _unquote(colon_key)
+            state = _EXPECT_VALUE
+            continue
+
+        if punct:
+            if punct == ',':
+                if state != _EXPECT_SEPARATOR:
+                    raise ChildrenParseError("意外的 ','")
+                state = _EXPECT_VALUE if type(container) is list else _EXPECT_KEY
+                continue
+            if punct == ':':
+                if state != _EXPECT_COLON:
+                    raise ChildrenParseError("意外的 ':'")
+                state = _EXPECT_VALUE
+                continue
+            if punct == ']' or punct == '}':
+                # 允许空容器和末尾多余的逗号
+                if type(container) is list:
+                    if punct != ']' or state not in (_EXPECT_SEPARATOR, _EXPECT_VALUE):
+                        raise ChildrenParseError(f"意外的 {punct!r}")
+                elif type(container) is dict:
+                    if punct != '}' or state not in (_EXPECT_SEPARATOR, _EXPECT_KEY):
+                        raise ChildrenParseError(f"意外的 {punct!r}")
+                else:
+                    raise ChildrenParseError(f"意外的 {punct!r}")
+                value = container
+                container, key = stack.pop()
+                state = _EXPECT_VALUE # 回到外层：刚闭合的容器就是外层等待的那个值
+            elif state == _EXPECT_VALUE:
+                # 左括号：进入新的容器，值在右括号出现时才算完成
+                stack.append((container, key))
+                container = [] if punct == '[' else {}
+                state = _EXPECT_VALUE if punct == '[' else _EXPECT_KEY
+                continue
+            elif state == _EXPECT_KEY:
+                raise ChildrenParseError("字典键必须是字符串或数字")
+            else:
+                raise ChildrenParseError(f"意外的 {punct!r}")
+        elif string:
+            value = _unquote(string)
+            if state == _EXPECT_KEY:
+                key = value
+                state = _EXPECT_COLON
+                continue
+        elif number:
+            value = float(number) if ('.' in number or 'e' in number or 'E' in number) else int(number)
+            if state == _EXPECT_KEY:
+                key = value
+                state = _EXPECT_COLON
+                continue
+        elif word:
+            if word not in _WORDS:
+                raise ChildrenParseError(f"无法识别的标识符 {word!r}")
+            value = _WORDS[word]
+        else:
+            raise ChildrenParseError(f"无法识别的字符 {bad!r}")
+
+        # 一个完整的值：放入当前容器（右括号结束的容器此时也走这里）
+        if state != _EXPECT_VALUE:
+            raise ChildrenParseError(f"缺少分隔符，意外的值 {value!r}"[:80])
+        if container is None:
+            result = value
+            state = _EXPECT_END
+        elif type(container) is list:
+            container.append(value)
+            state = _EXPECT_SEPARATOR
+        else:
+            container[key] = value
+            state = _EXPECT_SEPARATOR
+
+    if state != _EXPECT_END or stack:
+        raise ChildrenParseError("内容不完整（括号未闭合或为空）")
+    if not isinstance(result, list):
+        raise ChildrenParseError(f"children 字段应为列表，实际为 {type(result).__name__}")
+    return result
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+紧凑的节点/边属性存储。
+
+普通 DiGraph 中每个节点、每条边都带一个独立的属性字典，而 'E'、'P'、'children_field'、
+各类 sh_type 等取值在百万级的节点和边上反复出现。CompactDiGraph 把属性按列保存：
+分类字段每个属性一列 array('i') 编码，编码指向该列的驻留表（相同的值只存一份），
+name 这类取值几乎不重复的列自动改为按行引用值对象的明文列；
+节点和边上保留的只是一个带 __slots__ 的小视图对象，
+G.nodes[n]['name']、G[u][v]['percent']、G.nodes(data=True) 等写法照常可用。
+
+删除节点或边不会回收其所在的行（行号不复用），对只读为主的分析图影响可以忽略。
+"""
+import copy
+from array import array
+from collections.abc import MutableMapping
+
+import networkx as nx
+
+_MISSING = -1   # 该行没有这个属性
+_OVERFLOW = -2  # 值不可哈希（例如列表），单独保存在 overflow 中
+_ABSENT = object()  # 明文列中表示该行没有这个属性
+
+# 驻留表超过这么多个取值、且取值个数超过行数的一半时，认为该列不是分类字段（例如 name），
+# 改为每行直接引用值对象的明文列，省掉驻留表的开销
+PLAIN_COLUMN_MIN_VALUES = 4096
+
+class AttributeStore:
+    """
+    按列保存一组属性字典。分类字段（取值重复多的列）保存为 array('i') 编码加一张驻留表；
+    取值几乎各不相同的列自动改为明文列（list，每行直接引用值对象）。
+    """
+
+    __slots__ = ('order', 'columns', 'values', 'codes', 'plain', 'overflow', 'rows')
+
+    def __init__(self):
+        self.order = []     # 属性名，按第一次出现的顺序
+        self.columns = {}   # 属性名 -> array('i') 编码，下标为行号
+        self.values = {}    # 属性名 -> 驻留的取值列表，下标为编码
+        self.codes = {}     # 属性名 -> {驻留键: 编码}
+        self.plain = {}     # 属性名 -> 明文列 list，下标为行号
+        self.overflow = {}  # (行号, 属性名) -> 不可哈希的值
+        self.rows = 0
+
+    def new_row(self):
+        row = self.rows
+        self.rows += 1
+        for column in self.columns.values():
+            column.append(_MISSING)
+        for column in self.plain.values():
+            column.append(_ABSENT)
+        return row
+
+    def view(self):
+        return AttrView(self)
+
+    def _encode(self, key, value):
+        # True == 1 == 1.0 的哈希相同，非字符串的值连同类型一起作为驻留键，读回时类型不变
+        intern_key = value if type(value) is str else (type(value), value)
+        codes = self.codes[key]
+        try:
+            code = codes.get(intern_key)
+        except TypeError:
+            return _OVERFLOW
+        if code is None:
+            values = self.values[key]
+            code = codes[intern_key] = len(values)
+            values.append(value)
+        return code
+
+    def _to_plain(self, key):
+        column = self.columns.pop(key)
+        values = self.values.pop(key)
+        del self.codes[key]
+        plain = [_ABSENT] * self.rows
+        for row, code in enumerate(column):
+            if code >= 0:
+                plain[row] = values[code]
+            elif code == _OVERFLOW:
+                plain[row] = self.overflow.pop((row, key))
+        self.plain[key] = plain
+
+    def set(self, row, key, value):
+        plain = self.plain.get(key)
+        if plain is not None:
+            plain[row] = value
+            return
+        column = self.columns.get(key)
+        if column is None:
+            self.order.append(key)
+            column = self.columns[key] = array('i', [_MISSING]) * self.rows
+            self.values[key] = []
+            self.codes[key] = {}
+        code = self._encode(key, value)
+        if code == _OVERFLOW:
+            self.overflow[(row, key)] = value
+        elif column[row] == _OVERFLOW:
+            del self.overflow[(row, key)]
+        column[row] = code
+        distinct = len(self.values[key])
+        if distinct > PLAIN_COLUMN_MIN_VALUES and distinct * 2 > self.rows and code == distinct - 1:
+            self._to_plain(key)
+
+    def get(self, row, key):
+        """返回属性值；没有该属性时抛出 KeyError。"""
+        column = self.columns.get(key)
+        if column is None:
+            plain = self.plain.get(key)
+            if plain is None or plain[row] is _ABSENT:
+                raise KeyError(key)
+            return plain[row]
+        code = column[row]
+        if code >= 0:
+            return self.values[key][code]
+        if code == _OVERFLOW:
+            return self.overflow[(row, key)]
+        raise KeyError(key)
+
+    def has(self, row, key):
+        column = self.columns.get(key)
+        if column is not None:
+            return column[row] != _MISSING
+        plain = self.plain.get(key)
+        return plain is not None and plain[row] is not _ABSENT
+
+    def delete(self, row, key):
+        if not self.has(row, key):
+            raise KeyError(key)
+        plain = self.plain.get(key)
+        if plain is not None:
+            plain[row] = _ABSENT
+            return
+        column = self.columns[key]
+        if column[row] == _OVERFLOW:
+            del self.overflow[(row, key)]
+        column[row] = _MISSING
+
+    def keys(self, row):
+        return [key for key in self.order if self.has(row, key)]
+
+    def memory_bytes(self):
+        """编码数组和明文列本身占用的字节数（不含取值对象）。"""
+        coded = sum(column.itemsize * len(column) for column in self.columns.values())
+        return coded + sum(8 * len(column) for column in self.plain.values())
+
+class AttrView(MutableMapping):
+    """一个节点或一条边的属性视图，行为与 dict 相同；第一次写入时才分配行。"""
+
+    __slots__ = ('_store', '_row')
+
+    def __init__(self, store):
+        self._store = store
+        self._row = _MISSING
+
+    def __getitem__(self, key):
+        if self._row < 0:
+            raise KeyError(key)
+        return self._store.get(self._row, key)
+
+    def get(self, key, default=None):
+        if self._row < 0:
+            return default
+        try:
+            return self._store.get(self._row, key)
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return self._row >= 0 and self._store.has(self._row, key)
+
+    def __setitem__(self, key, value):
+        if self._row < 0:
+            self._row = self._store.new_row()
+        self._store.set(self._row, key, value)
+
+    def __delitem__(self, key):
+        if self._row < 0:
+            raise KeyError(key)
+        self._store.delete(self._row, key)
+
+    def __iter__(self):
+        if self._row < 0:
+            return iter(())
+        return iter(self._store.keys(self._row))
+
+    def __len__(self):
+        if self._row < 0:
+            return 0
+        return len(self._store.keys(self._row))
+
+    def update(self, other=(), **kwargs):
+        # dict.update 是最常见的写入路径（add_node/add_edge），直接逐项写入，不经过 ABC 的通用实现
+        items = other.items() if hasattr(other, 'items') else other
+        for key, value in items:
+            self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def copy(self):
+        """与 dict.copy 一致，返回一个普通 dict。"""
+        return {key: self._store.get(self._row, key) for key in self}
+
+    def __repr__(self):
+        return repr(self.copy())
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(self.copy(), memo)
+
+    def __reduce__(self):
+        # 序列化为普通 dict，不连带整张列存储
+        return (dict, (self.copy(),))
+
+class CompactDiGraph(nx.DiGraph):
+    """节点和边属性按列紧凑存储的 DiGraph，接口与 nx.DiGraph 相同。"""
+
+    def __init__(self, incoming_graph_data=None, **attr):
+        self.node_store = AttributeStore()
+        self.edge_store = AttributeStore()
+        self.node_attr_dict_factory = self.node_store.view
+        self.edge_attr_dict_factory = self.edge_store.view
+        super().__init__(incoming_graph_data, **attr)
+
+    def attribute_memory_bytes(self):
+        """节点和边属性编码数组占用的字节数。"""
+        return self.node_store.memory_bytes() + self.edge_store.memory_bytes()
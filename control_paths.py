@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+控制链路径查询："股东 X 如何控制企业 Y"——返回从股东到目标企业持股比例乘积最大的 k 条持股路径。
+
+路径强度 = 路径上各边 percent 的乘积，取 -log(percent) 作为边权后就是最短路问题。做法：
+1. 从目标企业沿反向边（股东方向）做有界的 Dijkstra：得到每个节点到目标的最短跳数，以及忽略路径
+   长度限制时所能达到的最大强度 best_to_target[节点]；到不了目标的节点、剩余层数不够的节点一律不展开；
+2. 从股东出发做 A* 式的最优优先搜索，优先级为 已走路径强度 × best_to_target[当前节点]（不会低估，
+   因为 percent 不超过 1），依次弹出的完整路径就是强度从高到低的简单路径，弹出 k 条即停止。
+
+只访问股东与目标之间的节点，不构建邻域子图。percent 未知或为 0 的边不参与计算，数量记在 unknown_edges 中；
+展开的部分路径数超过 max_expansions 时停止，结果中标记 truncated。
+
+用法:
+    python control_paths.py 股东名称 公司名称 [--k 5] [--max-depth 10]
+"""
+import argparse
+import heapq
+import itertools
+import math
+import time
+
+DEFAULT_K = 5
+MAX_K = 50
+DEFAULT_MAX_DEPTH = 10
+MAX_DEPTH = 20
+DEFAULT_MAX_EXPANSIONS = 200000
+
+def _percent(data):
+    percent = data.get('percent')
+    if isinstance(percent, (int, float)) and percent > 0:
+        return min(percent, 1.0) # 数据中偶有超过100%的比例，按100%计
+    return None
+
+def reverse_bounds(G, target, max_depth):
+    """
+    从 target 沿反向边做 Dijkstra（边权 -log percent），只走 max_depth 层以内。
+
+    返回:
+    (hops, best, unknown_edges): hops[节点] 为到 target 的最少跳数；best[节点] 为到 target 的最大路径强度上界；
+    unknown_edges 为途经的 percent 未知（或为 0）的边数。
+    """
+    hops = {target: 0}
+    frontier = [target]
+    unknown_edges = 0
+    for depth in range(1, max_depth + 1):
+        next_frontier = []
+        for node in frontier:
+            for holder, data in G.pred[node].items():
+                if _percent(data) is None:
+                    unknown_edges += 1
+                    continue
+                if holder not in hops:
+                    hops[holder] = depth
+                    next_frontier.append(holder)
+        frontier = next_frontier
+        if not frontier:
+            break
+    cost = {target: 0.0}
+    heap = [(0.0, 0, target)]
+    counter = itertools.count(1)
+    done = set()
+    while heap:
+        distance, _, node = heapq.heappop(heap)
+        if node in done:
+            continue
+        done.add(node)
+        for holder, data in G.pred[node].items():
+            percent = _percent(data)
+            if percent is None or holder not in hops:
+                continue
+            candidate = distance - math.log(percent)
+            if candidate < cost.get(holder, math.inf):
+                cost[holder] = candidate
+                heapq.heappush(heap, (candidate, next(counter), holder))
+    best = {node: math.exp(-value) for node, value in cost.items()}
+    return hops, best, unknown_edges
+
+def strongest_paths(G, source, target, k=DEFAULT_K, max_depth=DEFAULT_MAX_DEPTH, max_expansions=DEFAULT_MAX_EXPANSIONS):
+    """
+    从 source 到 target 强度最大的 k 条简单持股路径（边数不超过 max_depth）。
+
+    返回:
+    dict: {'paths': [(节点列表, 强度), ...]（强度降序）, 'truncated': 是否因 max_expansions 提前停止,
+           'expanded': 展开的部分路径数, 'unknown_edges': 跳过的 percent 未知的边数}
+    """
+    hops, best, unknown_edges = reverse_bounds(G, target, max_depth)
+    result = {'paths': [], 'truncated': False, 'expanded': 0, 'unknown_edges': unknown_edges}
+    if source == target or source not in best:
+        return result
+    counter = itertools.count()
+    # (-优先级, 序号, 已走强度, 路径)；优先级 = 已走强度 × 剩余部分的强度上界
+    heap = [(-best[source], next(counter), 1.0, (source,))]
+    while heap and len(result['paths']) < k:
+        _, _, strength, path = heapq.heappop(heap)
+        node = path[-1]
+        if node == target:
+            result['paths'].append((list(path), strength))
+            continue
+        result['expanded'] += 1
+        if result['expanded'] > max_expansions:
+            result['truncated'] = True
+            break
+        remaining = max_depth - (len(path) - 1)
+        for investee, data in G.succ[node].items():
+            bound = best.get(investee)
+            if bound is None or hops[investee] >= remaining or investee in path:
+                continue
+            percent = _percent(data)
+            if percent is None:
+                continue
+            next_strength = strength * percent
+            heapq.heappush(heap, (-next_strength * bound, next(counter), next_strength, path + (investee,)))
+    return result
+
+def _node_summary(G, node):
+    data = G.nodes[node]
+    return {"id": node, "name": data.get('name', str(node)), "type": data.get('type', '')}
+
+def control_paths_report(G, source, target, k=DEFAULT_K, max_depth=DEFAULT_MAX_DEPTH):
+    """控制链查询的可序列化报告：每条路径给出途经节点、各边持股比例和路径强度。"""
+    started = time.perf_counter()
+    result = strongest_paths(G, source, target, k, max_depth)
+    paths = []
+    for nodes, strength in result['paths']:
+        paths.append({
+            "nodes": [_node_summary(G, node) for node in nodes],
+            "percents": [G.edges[u, v].get('percent') for u, v in zip(nodes, nodes[1:])],
+            "length": len(nodes) - 1,
+            "strength": strength,
+            "strength_percent": f"{strength*100:.4f}%",
+        })
+    return {
+        "source": _node_summary(G, source),
+        "target": _node_summary(G, target),
+        "k": k,
+        "max_depth": max_depth,
+        "paths": paths,
+        "truncated": result['truncated'],
+        "expanded": result['expanded'],
+        "unknown_edges": result['unknown_edges'],
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='控制链路径查询：股东到目标企业持股比例乘积最大的几条路径。')
+    parser.add_argument('source', help='股东名称（精确名称）。')
+    parser.add_argument('target', help='目标公司名称（精确名称）。')
+    parser.add_argument('--csv', default='三层股权穿透输出数据.csv', help='股权穿透CSV文件路径。')
+    parser.add_argument('--k', type=int, default=DEFAULT_K, help='返回的路径条数（默认 %(default)s）。')
+    parser.add_argument('--max-depth', type=int, default=DEFAULT_MAX_DEPTH, help='路径最多层数（默认 %(default)s）。')
+    args = parser.parse_args()
+    from graph_builder import build_graph
+    from search_index import get_name_index
+    G = build_graph(args.csv)
+    index = get_name_index(G)
+    source, target = index.lookup(args.source), index.lookup(args.target)
+    for name, node in ((args.source, source), (args.target, target)):
+        if node is None:
+            print(f"未找到: {name}")
+            return
+    report = control_paths_report(G, source, target, args.k, args.max_depth)
+    if not report['paths']:
+        print(f"{args.max_depth} 层以内没有从 {report['source']['name']} 到 {report['target']['name']} 的已知比例持股路径。")
+        return
+    print(f"{report['source']['name']} -> {report['target']['name']}: {len(report['paths'])} 条路径，"
+          f"耗时 {report['elapsed_ms']}ms" + ("（已达展开上限）" if report['truncated'] else ""))
+    for i, path in enumerate(report['paths'], 1):
+        names = ' -> '.join(node['name'] for node in path['nodes'])
+        print(f"{i}. {path['strength_percent']}  {names}")
+
+if __name__ == '__main__':
+    main()
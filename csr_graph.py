@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+"""
+只读的 CSR 图：直接在内存映射的列式快照（见 graph_persistence.py）上提供 networkx 的读取接口。
+
+多进程部署时每个工作进程各持有一份 nx.DiGraph 和指标字典，内存随进程数成倍增长；而且 fork 之后
+仅仅读取 Python 对象也会修改引用计数，写时复制让共享的页面逐渐变成各进程私有。CSRGraph 不建任何
+逐节点、逐边的 Python 对象：
+- 邻接关系就是快照中的 indptr / indices（出边）和 in_indptr / in_edges（入边）数组；
+- 节点ID和字符串属性保存为字符串表编号，访问时才解码；
+- 节点ID -> 行号 用按哈希值排好序的 uint64 数组做二分查找（RowIndex），不建字典；
+- 节点/边属性按列读取，G.nodes[n]、G.edges[u, v] 每次返回新的属性字典。
+这些数组要么是文件映射（多个进程共享操作系统的页缓存），要么在 fork 前由父进程生成之后只读，
+所有工作进程共用同一份物理内存。
+
+支持的接口（与 nx.DiGraph 一致，只读）：G.graph、len(G)、iter(G)、node in G、G.nodes[n]、
+G.nodes(data=...)、G.succ / G.pred / G.adj / G[n]、G.successors / predecessors / neighbors、
+G.edges[u, v]、G.edges(data=...)、get_edge_data、has_edge、has_node、in_degree / out_degree / degree、
+number_of_nodes / number_of_edges；邻居顺序与原图相同。需要修改图或完整 networkx 算法时用 to_networkx()。
+
+用法:
+    graph, metrics = load_shared_graph('三层股权穿透输出数据.csv')
+"""
+import functools
+import hashlib
+import json
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+import graph_persistence
+from graph_persistence import _MISSING, _NONE
+
+STRING_CACHE_SIZE = 65536 # 每个进程缓存最近解码的字符串
+
+def _hash_key(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'little')
+
+class _Column:
+    """一个节点或边属性列：按行号取出 Python 值，类型规则与 GraphSnapshot.column_values 相同。"""
+
+    def __init__(self, snapshot, spec, string):
+        self.kind = spec['kind']
+        self.data = snapshot.array(spec['file'])
+        self.present = snapshot.array(f"{spec['file']}.present") if spec['has_mask'] else None
+        self._string = string
+
+    def has(self, row):
+        if self.kind in ('str', 'json'):
+            return self.data[row] != _MISSING
+        return self.present is None or bool(self.present[row])
+
+    def value(self, row):
+        raw = self.data[row]
+        if self.kind in ('str', 'json'):
+            code = int(raw)
+            if code == _NONE:
+                return None
+            text = self._string(code)
+            return text if self.kind == 'str' else json.loads(text)
+        if self.kind == 'i8':
+            return int(raw)
+        if raw != raw: # NaN
+            return None
+        # float32 按最短十进制表示转回 float64，使 0.95 读回后仍是 0.95
+        return float(str(raw)) if self.kind == 'f4' else float(raw)
+
+class RowIndex(Mapping):
+    """节点ID -> 行号。按节点ID的 64 位哈希排好序的数组上二分查找，再核对节点ID本身。"""
+
+    def __init__(self, graph):
+        self._graph = graph
+        hashes = np.fromiter((_hash_key(node) for node in graph.node_ids), dtype=np.uint64, count=len(graph.node_ids))
+        self._rows = np.argsort(hashes, kind='stable').astype(np.int64)
+        self._hashes = hashes[self._rows]
+
+    @property
+    def node_ids(self):
+        """行号 -> 节点ID 的只读序列。"""
+        return self._graph.node_ids
+
+    def get(self, node, default=None):
+        if not isinstance(node, str):
+            return default
+        key = np.uint64(_hash_key(node))
+        i = int(np.searchsorted(self._hashes, key))
+        node_ids = self._graph.node_ids
+        while i < len(self._hashes) and self._hashes[i] == key:
+            row = int(self._rows[i])
+            if node_ids[row] == node:
+                return row
+            i += 1
+        return default
+
+    def __getitem__(self, node):
+        row = self.get(node)
+        if row is None:
+            raise KeyError(node)
+        return row
+
+    def __contains__(self, node):
+        return self.get(node) is not None
+
+    def __iter__(self):
+        return iter(self._graph.node_ids)
+
+    def __len__(self):
+        return len(self._rows)
+
+class _NodeIds(Sequence):
+    """行号 -> 节点ID，访问时解码。"""
+
+    def __init__(self, codes, string):
+        self._codes = codes
+        self._string = string
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self._string(int(code)) for code in self._codes[row]]
+        return self._string(int(self._codes[row]))
+
+    def __len__(self):
+        return len(self._codes)
+
+    def __iter__(self):
+        string = self._string
+        for code in self._codes.tolist():
+            yield string(code)
+
+class _NodeView(Mapping):
+    """G.nodes：节点ID -> 属性字典（每次新建，修改不会写回图）。"""
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __getitem__(self, node):
+        return self._graph._node_attrs(self._graph.row_index[node])
+
+    def __contains__(self, node):
+        return node in self._graph.row_index
+
+    def __iter__(self):
+        return iter(self._graph.node_ids)
+
+    def __len__(self):
+        return self._graph.number_of_nodes()
+
+    def __call__(self, data=False, default=None):
+        return self.data(data, default)
+
+    def data(self, data=True, default=None):
+        graph = self._graph
+        if data is False:
+            return iter(graph.node_ids)
+        if data is True:
+            return ((node, graph._node_attrs(row)) for row, node in enumerate(graph.node_ids))
+        column = graph._node_columns.get(data)
+        if column is None:
+            return ((node, default) for node in graph.node_ids)
+        return ((node, column.value(row) if column.has(row) else default) for row, node in enumerate(graph.node_ids))
+
+class _Neighbors(Mapping):
+    """G.succ[n] / G.pred[n]：邻居ID -> 边属性字典，顺序与原图相同。"""
+
+    def __init__(self, graph, rows, edges):
+        self._graph = graph
+        self._rows = rows    # 邻居的行号
+        self._edges = edges  # 对应的边编号
+
+    def _position(self, neighbor):
+        row = self._graph.row_index.get(neighbor)
+        if row is None:
+            return None
+        hits = np.flatnonzero(self._rows == row)
+        return int(hits[0]) if len(hits) else None
+
+    def __getitem__(self, neighbor):
+        position = self._position(neighbor)
+        if position is None:
+            raise KeyError(neighbor)
+        return self._graph._edge_attrs(int(self._edges[position]))
+
+    def __contains__(self, neighbor):
+        return self._position(neighbor) is not None
+
+    def __iter__(self):
+        node_ids = self._graph.node_ids
+        for row in self._rows.tolist():
+            yield node_ids[row]
+
+    def __len__(self):
+        return len(self._rows)
+
+    def items(self):
+        graph = self._graph
+        node_ids = graph.node_ids
+        return [(node_ids[row], graph._edge_attrs(edge)) for row, edge in zip(self._rows.tolist(), self._edges.tolist())]
+
+class _Adjacency(Mapping):
+    def __init__(self, graph, incoming):
+        self._graph = graph
+        self._incoming = incoming
+
+    def __getitem__(self, node):
+        return self._graph._neighbors(self._graph.row_index[node], self._incoming)
+
+    def __iter__(self):
+        return iter(self._graph.node_ids)
+
+    def __len__(self):
+        return self._graph.number_of_nodes()
+
+class _EdgeView:
+    """G.edges[u, v] 与 G.edges(data=...)。"""
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __getitem__(self, edge):
+        u, v = edge
+        return self._graph.succ[u][v]
+
+    def __contains__(self, edge):
+        u, v = edge
+        return self._graph.has_edge(u, v)
+
+    def __len__(self):
+        return self._graph.number_of_edges()
+
+    def __iter__(self):
+        return self(data=False)
+
+    def __call__(self, nbunch=None, data=False, default=None):
+        graph = self._graph
+        node_ids = graph.node_ids
+        sources, targets = graph._sources.tolist(), graph.indices.tolist()
+        if nbunch is not None:
+            rows = {graph.row_index[n] for n in ([nbunch] if nbunch in graph else nbunch)}
+            edges = [e for e in range(len(sources)) if sources[e] in rows]
+        else:
+            edges = range(len(sources))
+        column = graph._edge_columns.get(data) if not isinstance(data, bool) else None
+        for e in edges:
+            u, v = node_ids[sources[e]], node_ids[targets[e]]
+            if data is False:
+                yield u, v
+            elif data is True:
+                yield u, v, graph._edge_attrs(e)
+            else:
+                yield u, v, (column.value(e) if column is not None and column.has(e) else default)
+
+class _DegreeView:
+    def __init__(self, graph, counts):
+        self._graph = graph
+        self._counts = counts
+
+    def __call__(self, nbunch=None):
+        graph = self._graph
+        if nbunch is None:
+            return zip(graph.node_ids, self._counts.tolist())
+        if nbunch in graph:
+            return int(self._counts[graph.row_index[nbunch]])
+        return ((n, int(self._counts[graph.row_index[n]])) for n in nbunch)
+
+    def __getitem__(self, node):
+        return int(self._counts[self._graph.row_index[node]])
+
+    def __iter__(self):
+        return self()
+
+class CSRGraph:
+    """
+    在 GraphSnapshot 上的只读有向图。
+
+    参数:
+    snapshot (graph_persistence.GraphSnapshot): 打开的快照（建议 mmap=True）。
+    version (str): 图版本号，默认为快照的内容指纹；与 build_graph 的版本号保持一致时可共用指标和缓存。
+    """
+
+    def __init__(self, snapshot, version=None):
+        self.snapshot = snapshot
+        self.graph = dict(snapshot.meta.get('graph_attrs', {}))
+        self.graph['version'] = version or snapshot.version
+        self.indptr = snapshot.indptr
+        self.indices = snapshot.indices
+        self.in_indptr = snapshot.in_indptr
+        self.in_edges = snapshot.in_edges
+        self._blob = snapshot.array('strings')
+        self._offsets = snapshot.array('string_offsets')
+        self._string = functools.lru_cache(maxsize=STRING_CACHE_SIZE)(self._decode)
+        self.node_ids = _NodeIds(snapshot.array('node_ids'), self._string)
+        n = snapshot.num_nodes
+        # 以下数组在 fork 前生成，之后只读
+        self._sources = np.repeat(np.arange(n, dtype=np.int32), np.diff(np.asarray(self.indptr)))
+        self._out_counts = np.diff(np.asarray(self.indptr))
+        self._in_counts = np.diff(np.asarray(self.in_indptr))
+        self._node_columns = {name: _Column(snapshot, spec, self._string)
+                              for name, spec in snapshot.meta['node_columns'].items()}
+        self._edge_columns = {name: _Column(snapshot, spec, self._string)
+                              for name, spec in snapshot.meta['edge_columns'].items()}
+        self.row_index = RowIndex(self)
+        self.nodes = _NodeView(self)
+        self.succ = self.adj = _Adjacency(self, incoming=False)
+        self.pred = _Adjacency(self, incoming=True)
+        self.edges = _EdgeView(self)
+        # networkx 的部分算法（如 strongly_connected_components）直接读取这些内部属性
+        self._adj = self._succ = self.succ
+        self._pred = self.pred
+        self._node = self.nodes
+        self.out_degree = _DegreeView(self, self._out_counts)
+        self.in_degree = _DegreeView(self, self._in_counts)
+        self.degree = _DegreeView(self, self._out_counts + self._in_counts)
+
+    def _decode(self, code):
+        start, end = int(self._offsets[code]), int(self._offsets[code + 1])
+        return self._blob[start:end].tobytes().decode('utf-8')
+
+    def _node_attrs(self, row):
+        return {name: column.value(row) for name, column in self._node_columns.items() if column.has(row)}
+
+    def _edge_attrs(self, edge):
+        return {name: column.value(edge) for name, column in self._edge_columns.items() if column.has(edge)}
+
+    def _neighbors(self, row, incoming):
+        if incoming:
+            edges = np.asarray(self.in_edges[self.in_indptr[row]:self.in_indptr[row + 1]])
+            return _Neighbors(self, self._sources[edges], edges)
+        start, end = int(self.indptr[row]), int(self.indptr[row + 1])
+        return _Neighbors(self, np.asarray(self.indices[start:end]), np.arange(start, end))
+
+    def __len__(self):
+        return self.snapshot.num_nodes
+
+    def __iter__(self):
+        return iter(self.node_ids)
+
+    def __contains__(self, node):
+        return node in self.row_index
+
+    def __getitem__(self, node):
+        return self.succ[node]
+
+    def is_directed(self):
+        return True
+
+    def is_multigraph(self):
+        return False
+
+    def number_of_nodes(self):
+        return self.snapshot.num_nodes
+
+    def number_of_edges(self):
+        return self.snapshot.num_edges
+
+    def has_node(self, node):
+        return node in self.row_index
+
+    def has_edge(self, u, v):
+        row = self.row_index.get(u)
+        return row is not None and v in self._neighbors(row, incoming=False)
+
+    def get_edge_data(self, u, v, default=None):
+        row = self.row_index.get(u)
+        if row is None:
+            return default
+        neighbors = self._neighbors(row, incoming=False)
+        return neighbors[v] if v in neighbors else default
+
+    def successors(self, node):
+        return iter(self.succ[node])
+
+    neighbors = successors
+
+    def predecessors(self, node):
+        return iter(self.pred[node])
+
+    def to_networkx(self):
+        """还原为可修改的 nx.DiGraph（完整复制一份，用于需要 networkx 算法的离线任务）。"""
+        G = self.snapshot.to_networkx()
+        G.graph['version'] = self.graph['version']
+        return G
+
+def load_shared_graph(csv_path='三层股权穿透输出数据.csv'):
+    """
+    以只读共享方式加载：返回 (CSRGraph, MetricsStore)。
+
+    图来自 build_graph 的构建缓存快照（源文件未变化时不解析 CSV，也不构建 nx.DiGraph），版本号与
+    build_graph 相同，因此直接使用已保存的指标；指标不存在时先用 nx.DiGraph 计算并保存一次。
+    """
+    from graph_builder import build_graph, build_graph_snapshot
+    from metrics_store import load_or_compute_metrics, load_metrics, metrics_path
+    path, version = build_graph_snapshot(csv_path)
+    graph = CSRGraph(graph_persistence.open_snapshot(path, mmap=True), version)
+    metrics = load_metrics(graph, metrics_path(version))
+    if metrics is None:
+        load_or_compute_metrics(build_graph(csv_path))
+        metrics = load_metrics(graph, metrics_path(version))
+    return graph, metrics
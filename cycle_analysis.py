@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+循环持股（交叉持股）分析：有界的环枚举，替代 list(nx.simple_cycles(G))。
+
+枚举全部简单环的代价随图的稠密程度指数增长，在稠密子图上会长时间无响应。这里：
+1. 先求强连通分量，只有大小超过 1 的分量（或带自环的节点）才可能有环，其余节点全部跳过；
+2. 在每个分量内做有界深度优先搜索：环长不超过 length_bound，找到 max_cycles 个环或
+   超过 time_budget 秒就停止，结果中记录是否被截断及原因；
+   每个环只从其中节点顺序最靠前的节点出发找一次，不会重复；持股比例高的边先走，
+   截断时保留下来的多是持股比例高的环；
+3. 每个环计算累积持股比例（环上各边 percent 的乘积，有边比例未知时为 None），按此从高到低排序。
+
+结果按图版本（G.graph['version']）保存为 outputs/metrics/<版本>/cycles.json，同一版本只计算一次。
+
+用法:
+    python cycle_analysis.py
+    python cycle_analysis.py 三层股权穿透输出数据.csv --length-bound 6 --max-cycles 500 --time-budget 10
+"""
+import argparse
+import json
+import os
+import time
+
+import networkx as nx
+
+from metrics_store import metrics_path
+
+DEFAULT_LENGTH_BOUND = 8
+DEFAULT_MAX_CYCLES = 1000
+DEFAULT_TIME_BUDGET = 5.0 # 秒
+CYCLES_FORMAT_VERSION = 1
+CYCLES_FILE = 'cycles.json'
+_CHECK_INTERVAL = 1024 # 每走这么多步检查一次时间
+
+class CycleAnalysis:
+    """
+    一次有界环枚举的结果。
+
+    属性:
+    cycles (list): [{'nodes': [节点ID...], 'length': 环长, 'holding_product': 累积持股比例或 None}, ...]，
+                   按累积持股比例降序，比例未知的排在最后。
+    cyclic_components (int): 含环的强连通分量个数。
+    nodes_in_cycles (int): 这些分量中的节点总数。
+    truncated (bool): 是否因为数量或时间上限提前停止。
+    truncated_by (str): 'max_cycles' / 'time_budget' / None。
+    params (dict): length_bound、max_cycles、time_budget。
+    elapsed (float): 枚举耗时（秒）。
+    """
+
+    def __init__(self, cycles, cyclic_components, nodes_in_cycles, truncated_by, params, elapsed):
+        self.cycles = cycles
+        self.cyclic_components = cyclic_components
+        self.nodes_in_cycles = nodes_in_cycles
+        self.truncated_by = truncated_by
+        self.truncated = truncated_by is not None
+        self.params = params
+        self.elapsed = elapsed
+
+    def top(self, k=5):
+        return self.cycles[:k]
+
+    def to_dict(self):
+        return {
+            'cycles': self.cycles,
+            'cyclic_components': self.cyclic_components,
+            'nodes_in_cycles': self.nodes_in_cycles,
+            'truncated_by': self.truncated_by,
+            'params': self.params,
+            'elapsed': self.elapsed,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['cycles'], data['cyclic_components'], data['nodes_in_cycles'],
+                   data['truncated_by'], data['params'], data['elapsed'])
+
+def cyclic_components(G):
+    """返回可能含环的强连通分量（节点数大于1，或单个带自环的节点）列表。"""
+    components = []
+    for component in nx.strongly_connected_components(G):
+        if len(component) > 1:
+            components.append(component)
+        else:
+            node = next(iter(component))
+            if G.has_edge(node, node):
+                components.append(component)
+    return components
+
+def _percent(data):
+    percent = data.get('percent')
+    return percent if isinstance(percent, (int, float)) else None
+
+def _component_cycles(G, nodes, length_bound, deadline, state):
+    """
+    在一个强连通分量内有界地枚举简单环（惰性生成 (节点列表, 累积持股比例)）。
+    nodes 为按图中节点顺序排好的分量节点；超时时设置 state['timed_out'] 并停止。
+    """
+    rank = {node: i for i, node in enumerate(nodes)}
+    # 分量内的邻接表，持股比例高的边排在前面（比例未知的最后）
+    adjacency = {}
+    for node in nodes:
+        edges = [(v, _percent(data)) for v, data in G.succ[node].items() if v in rank]
+        edges.sort(key=lambda item: -1.0 if item[1] is None else item[1], reverse=True)
+        adjacency[node] = edges
+    steps = 0
+    for start in nodes:
+        lowest = rank[start]
+        path = [start]
+        on_path = {start}
+        products = [1.0]
+        stack = [iter(adjacency[start])]
+        while stack:
+            steps += 1
+            if steps % _CHECK_INTERVAL == 0 and time.perf_counter() > deadline:
+                state['timed_out'] = True
+                return
+            edge = next(stack[-1], None)
+            if edge is None:
+                stack.pop()
+                on_path.discard(path.pop())
+                products.pop()
+                continue
+            target, percent = edge
+            product = products[-1] * percent if products[-1] is not None and percent is not None else None
+            if target == start:
+                yield list(path), product
+            elif rank[target] > lowest and target not in on_path and len(path) < length_bound:
+                # 只经过顺序比起点靠后的节点，每个环只从其最靠前的节点出发找到一次
+                path.append(target)
+                on_path.add(target)
+                products.append(product)
+                stack.append(iter(adjacency[target]))
+
+def find_cycles(G, length_bound=DEFAULT_LENGTH_BOUND, max_cycles=DEFAULT_MAX_CYCLES, time_budget=DEFAULT_TIME_BUDGET):
+    """
+    有界地寻找图中的循环持股关系。
+
+    参数:
+    G (nx.DiGraph): 股权图（边方向为 股东 -> 被投资企业）。
+    length_bound (int): 环的最大长度（节点数）。
+    max_cycles (int): 最多找多少个环。
+    time_budget (float): 时间上限（秒）。
+
+    返回:
+    CycleAnalysis
+    """
+    start_time = time.perf_counter()
+    deadline = start_time + time_budget
+    position = {node: i for i, node in enumerate(G)}
+    components = cyclic_components(G)
+    # 小分量先找：同样的时间预算下能覆盖更多分量
+    components.sort(key=len)
+    cycles = []
+    state = {'timed_out': False}
+    truncated_by = None
+    for component in components:
+        nodes = sorted(component, key=position.__getitem__)
+        for nodes_in_cycle, product in _component_cycles(G, nodes, length_bound, deadline, state):
+            cycles.append({'nodes': nodes_in_cycle, 'length': len(nodes_in_cycle), 'holding_product': product})
+            if len(cycles) >= max_cycles:
+                truncated_by = 'max_cycles'
+                break
+        if truncated_by is None and state['timed_out']:
+            truncated_by = 'time_budget'
+        if truncated_by is not None:
+            break
+    cycles.sort(key=lambda c: (c['holding_product'] is None, -(c['holding_product'] or 0.0), c['length']))
+    params = {'length_bound': length_bound, 'max_cycles': max_cycles, 'time_budget': time_budget}
+    return CycleAnalysis(cycles, len(components), sum(len(c) for c in components), truncated_by,
+                         params, round(time.perf_counter() - start_time, 3))
+
+_memory_cache = {}
+
+def load_or_compute_cycles(G, store_dir=None, length_bound=DEFAULT_LENGTH_BOUND, max_cycles=DEFAULT_MAX_CYCLES,
+                           time_budget=DEFAULT_TIME_BUDGET):
+    """
+    返回图 G 的 CycleAnalysis。G.graph['version'] 存在时按版本和参数缓存（内存中，并保存到指标目录），
+    同一版本只枚举一次；图没有版本号时每次重新计算。
+    """
+    params = {'length_bound': length_bound, 'max_cycles': max_cycles, 'time_budget': time_budget}
+    version = G.graph.get('version')
+    if version is None:
+        return find_cycles(G, **params)
+    cache_key = (version, length_bound, max_cycles, time_budget)
+    analysis = _memory_cache.get(cache_key)
+    if analysis is not None:
+        return analysis
+    path = os.path.join(metrics_path(version, store_dir), CYCLES_FILE)
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('format_version') == CYCLES_FORMAT_VERSION and data.get('params') == params:
+            analysis = CycleAnalysis.from_dict(data)
+    except (OSError, ValueError, KeyError):
+        analysis = None
+    if analysis is None:
+        analysis = find_cycles(G, **params)
+        data = analysis.to_dict()
+        data['format_version'] = CYCLES_FORMAT_VERSION
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp-{os.getpid()}"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError) as e:
+            print(f"CycleAnalysis: Could not save cycles to {path}: {e}")
+    _memory_cache.clear() # 只保留当前版本
+    _memory_cache[cache_key] = analysis
+    return analysis
+
+def cycle_edges(G, nodes):
+    """环上的边 [(股东, 被投资企业, percent), ...]，最后一条回到起点。"""
+    return [(u, v, G.edges[u, v].get('percent')) for u, v in zip(nodes, nodes[1:] + nodes[:1])]
+
+def main():
+    parser = argparse.ArgumentParser(description='有界地寻找循环持股关系，并按累积持股比例排序。')
+    parser.add_argument('csv_path', nargs='?', default='三层股权穿透输出数据.csv', help='股权穿透CSV文件路径。')
+    parser.add_argument('--length-bound', type=int, default=DEFAULT_LENGTH_BOUND, help='环的最大长度（默认 %(default)s）。')
+    parser.add_argument('--max-cycles', type=int, default=DEFAULT_MAX_CYCLES, help='最多找多少个环（默认 %(default)s）。')
+    parser.add_argument('--time-budget', type=float, default=DEFAULT_TIME_BUDGET, help='时间上限，秒（默认 %(default)s）。')
+    parser.add_argument('--top', type=int, default=10, help='显示累积持股比例最高的前几个环。')
+    args = parser.parse_args()
+    from graph_builder import build_graph
+    G = build_graph(args.csv_path)
+    analysis = load_or_compute_cycles(G, length_bound=args.length_bound, max_cycles=args.max_cycles,
+                                      time_budget=args.time_budget)
+    print(f"含环的强连通分量 {analysis.cyclic_components} 个，共 {analysis.nodes_in_cycles} 个节点；"
+          f"找到 {len(analysis.cycles)} 个环" + (f"（因 {analysis.truncated_by} 提前停止）" if analysis.truncated else ""))
+    for i, cycle in enumerate(analysis.top(args.top), 1):
+        names = [G.nodes[n].get('name', n) for n in cycle['nodes']]
+        product = cycle['holding_product']
+        product_str = f"{product*100:.4f}%" if product is not None else "未知"
+        print(f"{i}. {' -> '.join(names)} -> {names[0]}  累积持股比例: {product_str}")
+
+if __name__ == '__main__':
+    main()
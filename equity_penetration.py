@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+多层股权穿透：计算任意深度的间接持股和最终持股比例。
+
+股东 a 对企业 t 的穿透持股比例 = a 到 t 的所有持股路径上 percent 乘积之和。
+按层推进：第 k 层的"前沿"记录恰好经过 k 条边到达各节点的路径比例之和，
+下一层 = 前沿沿持股边再走一步，乘以该边的 percent；各层累加即为穿透比例。
+这等价于 (I - A)^-1 的 Neumann 级数 I + A + A^2 + ... 按层截断，因此：
+- 有交叉持股（环）时照常收敛：环上比例之积小于 1，每绕一圈比例都在衰减，直到低于阈值被剪掉；
+- 低于 threshold 的路径比例不再向上传播（剪枝），depth 限制最多穿透的层数；
+- 达到层数上限时仍有未传播的比例，结果中标记 truncated 并给出剩余比例之和。
+
+percent 未知的边不参与计算，数量记在 unknown_edges 中。
+同时记录每个节点比例最大的一条路径（best_path），用于解释穿透结果。
+
+用法:
+    python equity_penetration.py 公司名称 [--depth 10] [--threshold 0.0001] [--down]
+"""
+import argparse
+import time
+
+DIRECTION_UP = 'up'      # 向上穿透：谁最终持有该企业
+DIRECTION_DOWN = 'down'  # 向下穿透：该企业最终持有哪些企业
+DEFAULT_DEPTH = 10
+MAX_DEPTH = 50
+DEFAULT_THRESHOLD = 1e-4
+DEFAULT_LIMIT = 100
+
+def _percent(data):
+    percent = data.get('percent')
+    return percent if isinstance(percent, (int, float)) and percent > 0 else None
+
+def penetrate(G, node_id, direction=DIRECTION_UP, depth=DEFAULT_DEPTH, threshold=DEFAULT_THRESHOLD):
+    """
+    计算 node_id 的多层穿透持股。
+
+    参数:
+    G (nx.DiGraph): 股权图（边方向为 股东 -> 被投资企业，percent 为 0~1 的小数）。
+    node_id: 起点节点ID。
+    direction (str): 'up' 计算各上游股东对该节点的穿透持股；'down' 计算该节点对各下游企业的穿透持股。
+    depth (int): 最多穿透的层数。
+    threshold (float): 路径比例低于该值时不再继续传播。
+
+    返回:
+    dict: {
+        'holdings': {节点ID: {'ownership', 'direct', 'min_depth', 'best', 'parent'}},
+        'layers': 实际推进的层数, 'truncated': 是否因层数上限停止, 'residual': 未传播的比例之和,
+        'pruned': 被阈值剪掉的比例之和, 'unknown_edges': percent 未知而跳过的边数,
+    }
+    """
+    neighbors = G.pred if direction == DIRECTION_UP else G.succ
+    holdings = {}
+    frontier = {node_id: 1.0}
+    best = {node_id: 1.0}
+    pruned = 0.0
+    unknown_edges = set()
+    layers = 0
+    while frontier and layers < depth:
+        layers += 1
+        next_frontier = {}
+        for node, mass in frontier.items():
+            for other, data in neighbors[node].items():
+                percent = _percent(data)
+                if percent is None:
+                    if data.get('percent') is None:
+                        unknown_edges.add((node, other))
+                    continue
+                if other == node_id:
+                    continue # 回到起点的路径（交叉持股）不计入任何股东
+                contribution = mass * percent
+                next_frontier[other] = next_frontier.get(other, 0.0) + contribution
+                entry = holdings.get(other)
+                if entry is None:
+                    entry = holdings[other] = {'ownership': 0.0, 'direct': None, 'min_depth': layers,
+                                               'best': 0.0, 'parent': None}
+                    if layers == 1:
+                        entry['direct'] = percent
+                candidate = best.get(node, 0.0) * percent
+                if candidate > entry['best']:
+                    entry['best'] = candidate
+                    entry['parent'] = node
+                    best[other] = candidate
+        frontier = {}
+        for node, mass in next_frontier.items():
+            holdings[node]['ownership'] += mass
+            if mass >= threshold:
+                frontier[node] = mass
+            else:
+                pruned += mass
+    residual = sum(frontier.values())
+    return {
+        'holdings': holdings,
+        'layers': layers,
+        'truncated': bool(frontier),
+        'residual': residual,
+        'pruned': pruned,
+        'unknown_edges': len(unknown_edges),
+    }
+
+def best_path(holdings, node_id, start):
+    """按 parent 指针还原比例最大的一条路径（从 node_id 到穿透起点 start）。"""
+    path = [node_id]
+    seen = {node_id}
+    current = holdings[node_id]['parent']
+    while current is not None and current not in seen:
+        path.append(current)
+        seen.add(current)
+        if current == start:
+            break
+        current = holdings[current]['parent']
+    return path
+
+def penetration_report(G, node_id, direction=DIRECTION_UP, depth=DEFAULT_DEPTH, threshold=DEFAULT_THRESHOLD,
+                       limit=DEFAULT_LIMIT, min_ownership=0.0):
+    """
+    穿透结果的可序列化报告：按穿透比例降序的前 limit 个节点，附名称、层级、直接持股、最大路径等。
+    上游穿透时，没有上游股东的节点（自然人或顶层企业）标记为 ultimate。
+    """
+    started = time.perf_counter()
+    result = penetrate(G, node_id, direction, depth, threshold)
+    holdings = result['holdings']
+    ranked = sorted(holdings.items(), key=lambda item: (-item[1]['ownership'], item[1]['min_depth']))
+    ranked = [(n, h) for n, h in ranked if h['ownership'] >= min_ownership]
+    items = []
+    for holder, entry in ranked[:limit]:
+        data = G.nodes[holder]
+        path = best_path(holdings, holder, node_id)
+        if direction == DIRECTION_DOWN:
+            path.reverse()
+        items.append({
+            "id": holder,
+            "name": data.get('name', str(holder)),
+            "type": data.get('type', ''),
+            "ownership": entry['ownership'],
+            "ownership_percent": f"{entry['ownership']*100:.4f}%",
+            "direct": entry['direct'],
+            "min_depth": entry['min_depth'],
+            "ultimate": direction == DIRECTION_UP and G.in_degree(holder) == 0,
+            "best_path": path,
+            "best_path_ownership": entry['best'],
+        })
+    data = G.nodes[node_id]
+    return {
+        "id": node_id,
+        "name": data.get('name', str(node_id)),
+        "direction": direction,
+        "depth": depth,
+        "threshold": threshold,
+        "total": len(ranked),
+        "items": items,
+        "layers": result['layers'],
+        "truncated": result['truncated'],
+        "residual": result['residual'],
+        "pruned": result['pruned'],
+        "unknown_edges": result['unknown_edges'],
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='多层股权穿透：计算间接/最终持股比例。')
+    parser.add_argument('name', help='公司名称（精确名称）。')
+    parser.add_argument('--csv', default='三层股权穿透输出数据.csv', help='股权穿透CSV文件路径。')
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH, help='最多穿透层数（默认 %(default)s）。')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='剪枝阈值（默认 %(default)s）。')
+    parser.add_argument('--down', action='store_true', help='向下穿透（该企业最终持有哪些企业）。')
+    parser.add_argument('--top', type=int, default=20, help='显示前几名。')
+    args = parser.parse_args()
+    from graph_builder import build_graph
+    from search_index import get_name_index
+    G = build_graph(args.csv)
+    node_id = get_name_index(G).lookup(args.name)
+    if node_id is None:
+        print(f"未找到公司: {args.name}")
+        return
+    report = penetration_report(G, node_id, DIRECTION_DOWN if args.down else DIRECTION_UP,
+                                args.depth, args.threshold, args.top)
+    print(f"{report['name']} {'向下' if args.down else '向上'}穿透: {report['total']} 个节点，{report['layers']} 层，"
+          f"耗时 {report['elapsed_ms']}ms" + ("（已达层数上限）" if report['truncated'] else ""))
+    for i, item in enumerate(report['items'], 1):
+        names = ' -> '.join(G.nodes[n].get('name', str(n)) for n in item['best_path'])
+        flag = ' [最终]' if item['ultimate'] else ''
+        print(f"{i}. {item['name']}{flag}: {item['ownership_percent']}（第{item['min_depth']}层起）  {names}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+公司名称模糊搜索：简称、拼音/拼音首字母和带错别字的名称都能查到。
+
+- 检索键：每个节点的 name 和 short_name；安装了 pypinyin 时再加上两者的全拼和拼音首字母
+  （"深圳华为" -> "shenzhenhuawei"、"szhw"）。没有安装 pypinyin 时只匹配汉字和字母原文。
+- 候选生成：检索键两端加边界符后切成两字 gram，建 CSR 形式的倒排表（gram -> 检索键编号）。
+  查询词只在开头加边界符，这样前缀输入（边打边搜）的每个 gram 都能命中。
+  一处编辑最多破坏两个 gram，所以与查询词距离不超过 d 的检索键至少共有 (gram数 - 2d) 个 gram，
+  按共有 gram 数筛出候选，同分时 PageRank 高的优先，只对少量候选做编辑距离核对。
+- 排序：完全相同 > 前缀 > 包含 > 编辑距离（整词或前缀），乘以字段权重，
+  再按预计算的 PageRank（metrics_store）做对数归一化加成，取前 k 个节点。
+
+索引在首次查询时建立，图版本变化后自动重建（get_fuzzy_index）。
+"""
+import functools
+import heapq
+import weakref
+
+import numpy as np
+
+from search_index import normalize_name
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:
+    lazy_pinyin = None
+
+FIELD_NAME = 0
+FIELD_SHORT_NAME = 1
+FIELD_PINYIN = 2
+FIELD_INITIALS = 3
+FIELD_LABELS = ('name', 'short_name', 'pinyin', 'initials')
+# 字段权重：原名最可信，拼音首字母歧义最大
+FIELD_WEIGHTS = np.array([1.0, 0.95, 0.9, 0.85])
+
+PAGERANK_BOOST = 0.2        # PageRank 最高的节点得分最多乘以 1.2
+VERIFY_LIMIT = 300          # 每次查询最多核对编辑距离的检索键数
+STOP_GRAM_FRACTION = 0.05   # 出现在超过 5% 检索键中的 gram（如"公司"）只在没有其他 gram 时使用
+DEFAULT_TOP_K = 10
+
+_BEGIN = '\x02'
+_END = '\x03'
+
+def max_edits_for(length):
+    """查询词允许的编辑次数：1个字不容错，2~4个字容1处，更长容2处。"""
+    if length <= 1:
+        return 0
+    return 1 if length <= 4 else 2
+
+def _has_cjk(text):
+    return any('一' <= ch <= '鿿' for ch in text)
+
+def _compact(text):
+    """拼音检索键和拼音查询只保留字母数字。"""
+    return ''.join(ch for ch in text if ch.isalnum())
+
+@functools.lru_cache(maxsize=65536)
+def _char_pinyin(ch):
+    return _compact(lazy_pinyin(ch)[0]).lower() if _has_cjk(ch) else _compact(ch)
+
+def pinyin_keys(text):
+    """
+    返回 (全拼, 拼音首字母)；没有 pypinyin 或不含汉字时返回 None。
+    按单字查拼音并缓存（百万级名称时比整句分词快一个数量级），多音字取默认读音。
+    """
+    if lazy_pinyin is None or not _has_cjk(text):
+        return None
+    parts = [part for part in map(_char_pinyin, text) if part]
+    if not parts:
+        return None
+    return ''.join(parts), ''.join(part[0] for part in parts)
+
+def _grams(text, pad_end=True):
+    padded = _BEGIN + text + (_END if pad_end else '')
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+def edit_distances(query, key):
+    """
+    返回 (整词编辑距离, 前缀编辑距离)。前缀编辑距离是 query 与 key 的某个前缀之间的最小编辑距离，
+    用于边打边搜：输入到一半的名称与完整名称相比距离很大，但与其前缀相比很小。
+    """
+    previous = list(range(len(key) + 1))
+    for i, qc in enumerate(query, 1):
+        current = [i]
+        append = current.append
+        for j, kc in enumerate(key, 1):
+            append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (qc != kc)))
+        previous = current
+    return previous[-1], min(previous)
+
+def text_score(query, key, max_edits):
+    """查询词与一个检索键的文本相似度（0~1），不满足容错要求时返回 0。"""
+    if key == query:
+        return 1.0
+    if key.startswith(query):
+        return 0.9 + 0.1 * len(query) / len(key)
+    if query in key:
+        return 0.75 + 0.1 * len(query) / len(key)
+    if max_edits == 0:
+        return 0.0
+    full, prefix = edit_distances(query, key)
+    if prefix > max_edits:
+        return 0.0
+    score = 0.6 * (1 - prefix / len(query))
+    if full <= max_edits:
+        score = max(score, 0.7 * (1 - full / max(len(query), len(key))))
+    return score
+
+class FuzzyIndex:
+    """
+    图中节点 name / short_name 的模糊搜索索引。
+
+    参数:
+    graph (nx.DiGraph): 建索引的图。
+    pagerank (array-like): 按节点顺序排列的 PageRank（如 MetricsStore.array('pagerank')），为 None 时不加成。
+    use_pinyin (bool): 是否建立拼音检索键；默认在安装了 pypinyin 时启用。
+    """
+
+    def __init__(self, graph, pagerank=None, use_pinyin=None):
+        if use_pinyin is None:
+            use_pinyin = lazy_pinyin is not None
+        elif use_pinyin and lazy_pinyin is None:
+            print("FuzzyIndex: pypinyin is not installed, pinyin matching is disabled (pip install pypinyin).")
+            use_pinyin = False
+        self.use_pinyin = use_pinyin
+        self.node_ids = []
+        key_texts = []
+        key_nodes = []
+        key_fields = []
+        for position, (node_id, data) in enumerate(graph.nodes(data=True)):
+            self.node_ids.append(node_id)
+            seen = set()
+            for field, attr in ((FIELD_NAME, 'name'), (FIELD_SHORT_NAME, 'short_name')):
+                value = data.get(attr)
+                if value is None or value == '':
+                    continue
+                text = normalize_name(str(value))
+                keys = [(field, text)]
+                if use_pinyin:
+                    pinyin = pinyin_keys(text)
+                    if pinyin is not None:
+                        keys.append((FIELD_PINYIN, pinyin[0]))
+                        keys.append((FIELD_INITIALS, pinyin[1]))
+                for key_field, key_text in keys:
+                    if key_text and key_text not in seen:
+                        seen.add(key_text)
+                        key_texts.append(key_text)
+                        key_nodes.append(position)
+                        key_fields.append(key_field)
+        self.key_texts = key_texts
+        self.key_nodes = np.array(key_nodes, dtype=np.int32)
+        self.key_fields = np.array(key_fields, dtype=np.int8)
+        self._build_postings()
+        self.set_pagerank(pagerank)
+
+    def _build_postings(self):
+        # 先收集 (gram编号, 检索键编号) 对，再按 gram 排序成 CSR，比每个 gram 一个 Python 列表省内存
+        self.gram_ids = {}
+        gram_column = []
+        key_column = []
+        for key_id, text in enumerate(self.key_texts):
+            for gram in _grams(text):
+                gram_id = self.gram_ids.setdefault(gram, len(self.gram_ids))
+                gram_column.append(gram_id)
+                key_column.append(key_id)
+        gram_column = np.array(gram_column, dtype=np.int32)
+        order = np.argsort(gram_column, kind='stable')
+        self.posting_keys = np.array(key_column, dtype=np.int32)[order]
+        counts = np.bincount(gram_column, minlength=len(self.gram_ids))
+        self.posting_offsets = np.zeros(len(self.gram_ids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.posting_offsets[1:])
+
+    def set_pagerank(self, pagerank):
+        """更新 PageRank 加成（按节点顺序的数组，None 表示不加成）。"""
+        n = len(self.node_ids)
+        boost = np.zeros(n)
+        prior = np.zeros(n, dtype=np.int64)
+        if pagerank is not None and n:
+            values = np.nan_to_num(np.asarray(pagerank, dtype=np.float64), nan=0.0)
+            if len(values) != n:
+                raise ValueError(f"PageRank 数组长度 {len(values)} 与节点数 {n} 不一致")
+            scaled = np.log1p(values * n)
+            top = scaled.max()
+            if top > 0:
+                boost = scaled / top
+            # 候选同分时的先后：PageRank 名次（越重要越大）
+            prior[np.argsort(values, kind='stable')] = np.arange(n)
+        self.boost = 1.0 + PAGERANK_BOOST * boost
+        self.key_prior = prior[self.key_nodes] if n else prior
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def _postings(self, gram_id):
+        return self.posting_keys[self.posting_offsets[gram_id]:self.posting_offsets[gram_id + 1]]
+
+    def _candidate_keys(self, query, max_edits):
+        """按与查询词共有的 gram 数筛选候选检索键，返回最多 VERIFY_LIMIT 个检索键编号。"""
+        gram_ids = [self.gram_ids[g] for g in _grams(query, pad_end=False) if g in self.gram_ids]
+        if not gram_ids:
+            return np.empty(0, dtype=np.int32)
+        stop_size = max(int(len(self.key_texts) * STOP_GRAM_FRACTION), VERIFY_LIMIT)
+        selective = [g for g in gram_ids if self.posting_offsets[g + 1] - self.posting_offsets[g] <= stop_size]
+        total_grams = len(_grams(query, pad_end=False))
+        min_shared = max(total_grams - 2 * max_edits, 1)
+        if selective and len(selective) < len(gram_ids):
+            # 去掉高频 gram 后要求的共有数相应减少
+            min_shared = max(min_shared - (len(gram_ids) - len(selective)), 1)
+            gram_ids = selective
+        lists = [self._postings(g) for g in gram_ids]
+        merged = lists[0] if len(lists) == 1 else np.concatenate(lists)
+        if len(lists) == 1:
+            candidates, shared = merged, np.ones(len(merged), dtype=np.int64)
+        elif len(merged) > len(self.key_texts) // 8:
+            counts = np.bincount(merged, minlength=len(self.key_texts))
+            candidates = np.flatnonzero(counts >= min_shared)
+            shared = counts[candidates]
+        else:
+            candidates, shared = np.unique(merged, return_counts=True)
+        keep = shared >= min_shared
+        candidates, shared = candidates[keep], shared[keep]
+        if len(candidates) > VERIFY_LIMIT:
+            rank = shared.astype(np.int64) * (len(self.node_ids) + 1) + self.key_prior[candidates]
+            top = np.argpartition(-rank, VERIFY_LIMIT - 1)[:VERIFY_LIMIT]
+            candidates = candidates[top]
+        return candidates
+
+    def search_positions(self, query, k=DEFAULT_TOP_K):
+        """
+        模糊查询，返回按得分降序的 [(节点编号, 得分, 命中字段编号, 命中的检索键), ...]，最多 k 个节点。
+        """
+        query = normalize_name(query)
+        if not query or k <= 0 or not self.key_texts:
+            return []
+        variants = {query}
+        if self.use_pinyin and not _has_cjk(query):
+            # 拼音检索键不含空格和标点，"shen zhen" 也要能匹配 "shenzhen"
+            variants.add(_compact(query) or query)
+        best = {}
+        key_texts = self.key_texts
+        for variant in variants:
+            max_edits = max_edits_for(len(variant))
+            for key_id in self._candidate_keys(variant, max_edits).tolist():
+                score = text_score(variant, key_texts[key_id], max_edits)
+                if score <= 0:
+                    continue
+                position = int(self.key_nodes[key_id])
+                field = int(self.key_fields[key_id])
+                score *= FIELD_WEIGHTS[field] * self.boost[position]
+                current = best.get(position)
+                if current is None or score > current[0]:
+                    best[position] = (score, field, key_id)
+        top = heapq.nlargest(k, best.items(), key=lambda item: (item[1][0], -item[0]))
+        return [(position, score, field, key_texts[key_id]) for position, (score, field, key_id) in top]
+
+    def search(self, query, k=DEFAULT_TOP_K):
+        """
+        模糊查询，返回最多 k 条结果: [{'id', 'score', 'matched_field', 'matched_text'}, ...]，按得分降序。
+        """
+        return [
+            {
+                'id': self.node_ids[position],
+                'score': round(float(score), 6),
+                'matched_field': FIELD_LABELS[field],
+                'matched_text': text,
+            }
+            for position, score, field, text in self.search_positions(query, k)
+        ]
+
+_indexes = weakref.WeakKeyDictionary()
+
+def get_fuzzy_index(graph, pagerank=None):
+    """
+    返回图的模糊搜索索引，首次调用时建立并缓存；图的版本号或节点数变化后自动重建。
+    pagerank 为按节点顺序的 PageRank 数组（如 MetricsStore.array('pagerank')）。
+    """
+    stamp = (graph.graph.get('version'), graph.number_of_nodes())
+    entry = _indexes.get(graph)
+    if entry is None or entry[0] != stamp:
+        entry = _indexes[graph] = (stamp, FuzzyIndex(graph, pagerank))
+    return entry[1]
@@ -1,8 +1,25 @@
 # -*- coding: utf-8 -*-
 import pandas as pd
 import networkx as nx
-import json
-import ast
+import numpy as np
+import codecs
+import functools
+import hashlib
+import os
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource # 仅类 Unix 系统可用，用于报告峰值内存
+except ImportError:
+    resource = None
+
+from children_parser import parse_children, ChildrenParseError, MalformedChildrenError
+import graph_persistence
+from compact_graph import CompactDiGraph
 
 # 新增辅助函数：规范化百分比数据
 def _normalize_percent(value):
@@ -50,44 +67,120 @@ def _normalize_percent(value):
     # print(f"GraphBuilder Warn: Unhandled percent value type: {value} (type: {type(value)}), treating as None.")
     return None # 其他未处理的类型
 
-# 辅助函数，用于递归解析children字段并添加节点和边
-def _parse_children_recursive(main_row_entity_id, children_data, graph):
+# 向量化版本的 _normalize_percent，规则与逐值版本一致，用于整列处理
+def _normalize_percent_series(values):
+    """
+    对一列百分比字符串做规范化，返回与输入等长的列表，元素为 float 或 None。
+    """
+    values = pd.Series(values, dtype=object)
+    is_str = values.map(lambda v: isinstance(v, str))
+    stripped = values.where(is_str).str.strip()
+    has_percent_symbol = stripped.str.endswith('%').fillna(False).astype(bool)
+    body = stripped.where(~has_percent_symbol, stripped.str[:-1].str.strip())
+    num = np.array(pd.to_numeric(body, errors='coerce'), dtype=float)
+
+    # 非字符串的数值（int/float）按数值规则处理，不支持百分号
+    numeric_mask = values.map(lambda v: isinstance(v, (int, float)) and not isinstance(v, bool)).to_numpy()
+    if numeric_mask.any():
+        num[numeric_mask] = values[numeric_mask].to_numpy(dtype=float)
+
+    pct = has_percent_symbol.to_numpy()
+    with np.errstate(invalid='ignore'):
+        in_unit_range = (num >= 0) & (num <= 1)
+        in_hundred_range = (num > 1) & (num <= 100)
+    result = np.where(pct, num / 100.0, np.where(in_unit_range, num, np.where(in_hundred_range, num / 100.0, np.nan)))
+    return [None if v != v else v for v in result.tolist()] # NaN -> None
+
+# 金额统一换算为人民币元（float64）。汇率为近似值，可按需要修改；修改后构建缓存会自动失效
+CURRENCY_TO_CNY = {
+    '元': 1.0, '人民币': 1.0, '人民币元': 1.0, 'CNY': 1.0, 'RMB': 1.0,
+    '美元': 7.2, 'USD': 7.2,
+    '港元': 0.92, '港币': 0.92, 'HKD': 0.92,
+    '欧元': 7.8, 'EUR': 7.8,
+    '英镑': 9.1, 'GBP': 9.1,
+    '日元': 0.048, 'JPY': 0.048,
+    '韩元': 0.0052, 'KRW': 0.0052,
+    '新台币': 0.22, '台币': 0.22, 'TWD': 0.22,
+    '澳门元': 0.89, '澳门币': 0.89, 'MOP': 0.89,
+    '新加坡元': 5.4, 'SGD': 5.4,
+    '澳元': 4.7, 'AUD': 4.7,
+    '加元': 5.2, 'CAD': 5.2,
+    '瑞士法郎': 8.1, 'CHF': 8.1,
+}
+_AMOUNT_MAGNITUDES = {'': 1.0, '十': 10.0, '百': 100.0, '千': 1e3, '万': 1e4, '十万': 1e5, '百万': 1e6, '千万': 1e7, '亿': 1e8, '万亿': 1e12}
+
+def _amount_pattern():
+    currencies = '|'.join(sorted(map(re.escape, CURRENCY_TO_CNY), key=len, reverse=True))
+    magnitudes = '|'.join(sorted((m for m in _AMOUNT_MAGNITUDES if m), key=len, reverse=True))
+    return re.compile(rf"^\s*([-+]?(?:\d[\d,]*(?:\.\d*)?|\.\d+))\s*({magnitudes})?\s*({currencies})\s*$", re.IGNORECASE)
+
+_AMOUNT_PATTERN = _amount_pattern()
+
+def _currency_rate(currency):
+    rate = CURRENCY_TO_CNY.get(currency)
+    return rate if rate is not None else CURRENCY_TO_CNY.get(currency.upper())
+
+@functools.lru_cache(maxsize=65536)
+def _parse_amount_str(value):
+    match = _AMOUNT_PATTERN.match(value)
+    if match is None:
+        return None
+    number, magnitude, currency = match.groups()
+    rate = _currency_rate(currency)
+    if rate is None:
+        return None
+    return float(number.replace(',', '')) * _AMOUNT_MAGNITUDES[magnitude or ''] * rate
+
+def _parse_amount(value):
+    """
+    把 '10000.000000万元'、'1.5亿元'、'300万美元' 这类金额解析为人民币元（float）。
+    单位为股数（'股'）、没有货币单位或无法识别时返回 None。
+    """
+    if isinstance(value, str):
+        return _parse_amount_str(value)
+    return None
+
+def _parse_amount_series(values):
+    """_parse_amount 的整列版本，返回与输入等长的列表，元素为 float 或 None。"""
+    values = pd.Series(values, dtype=object)
+    parts = values.where(values.map(lambda v: isinstance(v, str))).str.extract(_AMOUNT_PATTERN)
+    if parts.empty:
+        return [None] * len(values)
+    number = pd.to_numeric(parts[0].str.replace(',', '', regex=False), errors='coerce').to_numpy(dtype=float)
+    magnitude = parts[1].fillna('').map(_AMOUNT_MAGNITUDES).to_numpy(dtype=float)
+    rate = parts[2].map(lambda c: _currency_rate(c) if isinstance(c, str) else None).to_numpy(dtype=float)
+    result = number * magnitude * rate
+    return [None if v != v else v for v in result.tolist()] # NaN -> None
+
+def _amount_rates_digest():
+    """金额换算表的指纹，作为构建缓存键的一部分。"""
+    text = repr(sorted(CURRENCY_TO_CNY.items())) + repr(sorted(_AMOUNT_MAGNITUDES.items()))
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+# 辅助函数：把children字段（字符串或列表）解析为子节点列表
+# 无法解析时：默认打印警告并返回 None；strict=True 时抛出 ChildrenParseError
+def _parse_children_data(main_row_entity_id, children_data, strict=False):
     if isinstance(children_data, str):
         try:
-            # 首先尝试使用 ast.literal_eval，它可以更安全地处理包含单引号的 Python 字面量
-            children_list = ast.literal_eval(children_data)
-            if not isinstance(children_list, list): # 确保结果是列表
-                # 如果解析结果不是列表（例如，如果字符串只是一个字典），将其包装在列表中
-                # 或者根据您的数据结构决定如何处理这种情况。这里假设我们总是期望一个子节点列表。
-                print(f"GraphBuilder Warn: ast.literal_eval on children_data for {main_row_entity_id} did not return a list. Data: {children_data[:100]}") # Log a snippet
-                # 根据实际情况，你可能需要将其视为错误并返回，或尝试其他解析。
-                # 为了与后续逻辑兼容，如果不是list，尝试将其包装成list或者进行json解析的回退
-                raise ValueError("ast.literal_eval did not result in a list.")
-        except (ValueError, SyntaxError) as e_ast: # ast.literal_eval 失败
-            # print(f"GraphBuilder Info: ast.literal_eval failed for '{children_data[:100]}...' for main entity '{main_row_entity_id}'. Error: {e_ast}. Falling back to JSON parsing.")
-            try:
-                # 替换策略：
-                # 1. 将 CSV 中的 \\' (代表实际的单引号) 替换为特殊占位符
-                # 2. 将结构性的 ' 替换为 "
-                # 3. 将占位符替换回 JSON 字符串中合法的 '
-                processed_str = children_data.replace("\\\\\'", "__TEMP_SINGLE_QUOTE__") 
-                processed_str = processed_str.replace("'", '"')
-                processed_str = processed_str.replace("__TEMP_SINGLE_QUOTE__", "'") 
-                children_list = json.loads(processed_str)
-            except json.JSONDecodeError as e_json_primary:
-                try:
-                    # 备用：简单替换，如果上面的方法因为复杂引号失败
-                    children_list = json.loads(children_data.replace("'", '"'))
-                except json.JSONDecodeError as e_json_fallback:
-                    print(f"GraphBuilder Warn: Could not parse children JSON string '{children_data}' for main entity '{main_row_entity_id}'. AST error: {e_ast}, Primary JSON error: {e_json_primary}. Fallback JSON error: {e_json_fallback}")
-                    return
-            except Exception as e_general:
-                print(f"GraphBuilder Warn: Unknown error parsing children string '{children_data}' for main entity '{main_row_entity_id}' after AST eval. Error: {e_general}")
-                return
+            # 专用分词解析器一次解析整棵嵌套树，不再依次尝试 ast.literal_eval 和多种 json.loads 替换
+            return parse_children(children_data)
+        except ChildrenParseError as e:
+            if strict:
+                raise
+            print(f"GraphBuilder Warn: Could not parse children string '{children_data}' for main entity '{main_row_entity_id}'. Error: {e}")
+            return None
     elif isinstance(children_data, list):
-        children_list = children_data
+        return children_data
     else:
+        if strict:
+            raise ChildrenParseError(f"children 字段应为字符串或列表，实际为 {type(children_data).__name__}")
         print(f"GraphBuilder Warn: Children data is not a string or list for main entity '{main_row_entity_id}'. Type: {type(children_data)}")
+        return None
+
+# 辅助函数，用于递归解析children字段并添加节点和边
+def _parse_children_recursive(main_row_entity_id, children_data, graph, strict=False):
+    children_list = _parse_children_data(main_row_entity_id, children_data, strict)
+    if children_list is None:
         return
 
     for child_info_from_json in children_list:
@@ -118,6 +211,7 @@ def _parse_children_recursive(main_row_entity_id, children_data, graph):
         # 添加从股东 (shareholder_node_id from JSON) 到被投资公司 (main_row_entity_id) 的边
         edge_attrs = {
             'amount': child_info_from_json.get('amount', ''),
+            'amount_value': _parse_amount(child_info_from_json.get('amount', '')),
             'percent': _normalize_percent(child_info_from_json.get('percent')), # 使用规范化函数
             'sh_type': child_info_from_json.get('sh_type', ''),
             'source_info': 'children_field' # Mark that this edge came from children field
@@ -131,50 +225,289 @@ def _parse_children_recursive(main_row_entity_id, children_data, graph):
         # grand_children_data will be the 'children' field of the current shareholder_node_id (if any)
         grand_children_data = child_info_from_json.get('children')
         if grand_children_data:
-            _parse_children_recursive(shareholder_node_id, grand_children_data, graph)
+            _parse_children_recursive(shareholder_node_id, grand_children_data, graph, strict)
+
+_NODE_ATTR_KEYS = ('name', 'type', 'short_name', 'level')
+class _Unset:
+    """children 属性"尚未出现非空值"的标记；按名字序列化，跨进程传递后仍是同一个对象。"""
+    def __reduce__(self):
+        return '_UNSET'
+
+_UNSET = _Unset()
 
-def build_graph(csv_path='三层股权穿透输出数据.csv'):
+class _GraphTables:
     """
-    从指定的CSV文件读取股权数据并构建一个NetworkX DiGraph。
+    按 build_graph 的更新规则累积节点表和边表，最后一次性批量装入 DiGraph。
+
+    主行记录（第一遍：节点属性与 parent_id 边）和 children 记录（第二遍）分开保存，
+    所以两类记录可以交错到达，结果仍与逐行两遍构建完全一致：
+    - 主行节点属性整体覆盖，后出现的主行生效；只作为 parent_id 出现的节点仅有 name 属性；
+    - children 中的节点属性逐字段更新：新值非空，或原值为空时才覆盖；
+    - 边保留第一次出现时的属性，主行的 parent_id 边优先于 children 中的边。
     """
-    encodings_to_try = ['utf-8-sig', 'utf-8', 'gbk', 'gb18030', 'gb2312', 'big5']
-    df = None
-    read_successful = False
 
-    for encoding in encodings_to_try:
-        try:
-            df = pd.read_csv(csv_path, encoding=encoding, dtype=str) # 读取所有列为字符串以保留原始格式
-            # print(f"GraphBuilder: Successfully read CSV '{csv_path}' with encoding: {encoding}") # Commented out
-            read_successful = True
-            break
-        except UnicodeDecodeError:
-            # print(f"GraphBuilder: Failed to decode CSV '{csv_path}' with encoding: {encoding}") # Commented out
-            pass # Continue to the next encoding
-        except pd.errors.EmptyDataError:
-            print(f"GraphBuilder Warn: CSV file '{csv_path}' is empty or could not be read with encoding {encoding}.")
-            # 如果文件就是空的，不应该继续尝试其他编码或报错，而是返回空图或相应处理
-            G = nx.DiGraph()
-            print(f"GraphBuilder: Returning empty graph due to empty or unreadable CSV: {csv_path}")
-            return G
-        except Exception as e:
-            print(f"GraphBuilder: An unexpected error occurred while reading '{csv_path}' with {encoding}: {e}")
-            # 对于其他pandas读取错误或一般错误，也记录并尝试下一种编码
-    
-    if not read_successful or df is None:
-        print(f"GraphBuilder Error: Could not read CSV file '{csv_path}' with any of the attempted encodings.")
-        # 可以选择抛出异常或者返回一个空图，这里选择后者以便调用方可以处理
-        G = nx.DiGraph()
-        print(f"GraphBuilder: Returning empty graph as CSV could not be loaded: {csv_path}")
-        return G
-    
-    # Check if DataFrame is empty after successful read (e.g. header only or all rows filtered out previously)
-    if df.empty:
-        print(f"GraphBuilder Warn: CSV file '{csv_path}' was read successfully but resulted in an empty DataFrame.")
-        G = nx.DiGraph()
-        print(f"GraphBuilder: Returning empty graph due to empty DataFrame from: {csv_path}")
+    def __init__(self):
+        self.main_order = {}   # 第一遍中节点首次出现的顺序（dict 当作有序集合使用）
+        self.main_nodes = {}   # 主行节点ID -> 属性字典
+        self.main_edges = {}   # (child, parent) -> 属性字典
+        self.child_nodes = {}  # 节点ID -> {属性: [最后一次的值, 最后一次的非空值]}
+        self.child_edges = {}  # (shareholder, company) -> 属性字典
+
+    def add_main_node(self, node_id, attrs):
+        self.main_order.setdefault(node_id, None)
+        self.main_nodes[node_id] = attrs
+
+    def add_main_edge(self, child_id, parent_id, attrs):
+        self.main_order.setdefault(parent_id, None)
+        self.main_edges.setdefault((child_id, parent_id), attrs)
+
+    def add_child_node(self, node_id, attrs):
+        overlay = self.child_nodes.get(node_id)
+        if overlay is None:
+            overlay = self.child_nodes[node_id] = {}
+        for attr, value in attrs.items():
+            slot = overlay.get(attr)
+            if slot is None:
+                slot = overlay[attr] = [value, _UNSET]
+            else:
+                slot[0] = value
+            if value:
+                slot[1] = value
+
+    def add_child_edge(self, shareholder_id, company_id, attrs):
+        self.child_edges.setdefault((shareholder_id, company_id), attrs)
+
+    def add_children(self, main_row_entity_id, children_data, strict=False):
+        """递归展开一行的children字段，规则与 _parse_children_recursive 相同。"""
+        children_list = _parse_children_data(main_row_entity_id, children_data, strict)
+        if children_list is None:
+            return
+        for child_info_from_json in children_list:
+            shareholder_name = child_info_from_json.get('name')
+            shareholder_eid = child_info_from_json.get('eid')
+            if not pd.notna(shareholder_name) or shareholder_name == '':
+                continue
+            shareholder_node_id = shareholder_eid if pd.notna(shareholder_eid) and shareholder_eid != '' else shareholder_name
+
+            self.add_child_node(shareholder_node_id, {
+                'name': shareholder_name,
+                'type': child_info_from_json.get('type', ''),
+                'short_name': child_info_from_json.get('short_name', ''),
+                'level': child_info_from_json.get('level', '')
+            })
+            self.add_child_edge(shareholder_node_id, main_row_entity_id, {
+                'amount': child_info_from_json.get('amount', ''),
+                'amount_value': _parse_amount(child_info_from_json.get('amount', '')),
+                'percent': _normalize_percent(child_info_from_json.get('percent')),
+                'sh_type': child_info_from_json.get('sh_type', ''),
+                'source_info': 'children_field'
+            })
+            grand_children_data = child_info_from_json.get('children')
+            if grand_children_data:
+                self.add_children(shareholder_node_id, grand_children_data, strict)
+
+    def merge(self, other):
+        """
+        把另一份（对应后续行的）表合并进来，结果等同于按行顺序依次处理两部分数据。
+        用于合并并行分片的结果。
+        """
+        for node_id in other.main_order:
+            self.main_order.setdefault(node_id, None)
+        self.main_nodes.update(other.main_nodes)
+        for edge, attrs in other.main_edges.items():
+            self.main_edges.setdefault(edge, attrs)
+        for node_id, other_overlay in other.child_nodes.items():
+            overlay = self.child_nodes.get(node_id)
+            if overlay is None:
+                self.child_nodes[node_id] = other_overlay
+                continue
+            for attr, (last_value, last_truthy) in other_overlay.items():
+                slot = overlay.get(attr)
+                if slot is None:
+                    overlay[attr] = [last_value, last_truthy]
+                    continue
+                slot[0] = last_value
+                if last_truthy is not _UNSET:
+                    slot[1] = last_truthy
+        for edge, attrs in other.child_edges.items():
+            self.child_edges.setdefault(edge, attrs)
+
+    def iter_nodes(self):
+        """按逐行构建时的插入顺序产出 (节点ID, 属性字典)。"""
+        for node_id in self.main_order:
+            yield node_id, self._resolve_node(node_id)
+        for node_id in self.child_nodes:
+            if node_id not in self.main_order:
+                yield node_id, self._resolve_node(node_id)
+
+    def iter_edges(self):
+        """按逐行构建时的插入顺序产出 (u, v, 属性字典)。"""
+        for (u, v), attrs in self.main_edges.items():
+            yield u, v, attrs
+        for (u, v), attrs in self.child_edges.items():
+            if (u, v) not in self.main_edges:
+                yield u, v, attrs
+
+    def _resolve_node(self, node_id):
+        if node_id in self.main_nodes:
+            attrs = dict(self.main_nodes[node_id])
+        elif node_id in self.main_order:
+            attrs = {'name': str(node_id)} # 仅作为 parent_id 出现过的节点
+        else:
+            attrs = {}
+        overlay = self.child_nodes.get(node_id)
+        if overlay:
+            for attr, (last_value, last_truthy) in overlay.items():
+                if last_truthy is not _UNSET:
+                    attrs[attr] = last_truthy
+                elif not attrs.get(attr):
+                    attrs[attr] = last_value
+        return attrs
+
+    def to_graph(self, release=False, graph_class=nx.DiGraph):
+        """装入 DiGraph。release=True 时每装完一部分就清空对应的表，降低内存峰值（之后表不可再用）。"""
+        G = graph_class()
+        G.add_nodes_from(self.iter_nodes())
+        if release:
+            self.main_nodes.clear()
+            self.child_nodes.clear()
+        G.add_edges_from(self.iter_edges())
+        if release:
+            self.main_order.clear()
+            self.main_edges.clear()
+            self.child_edges.clear()
         return G
 
-    G = nx.DiGraph()
+def _column(df, name):
+    """取出一列；列不存在时返回全空列（对应逐行版本里的 row.get）。"""
+    if name in df.columns:
+        return df[name]
+    return pd.Series(np.nan, index=df.index, dtype=object)
+
+def _fill_main_tables(df, tables):
+    """
+    用整列运算完成第一遍：节点ID解析（eid 优先，否则 name）、主行节点属性和 parent_id 边。
+    """
+    named = df[df['name'].notna()]
+    if named.empty:
+        return
+    eid = named['eid']
+    node_ids = eid.where(eid.notna() & (eid != ''), named['name']).to_numpy(dtype=object)
+
+    parent_ids = _column(named, 'parent_id')
+    has_parent = (parent_ids.notna() & (parent_ids != '')).to_numpy(dtype=bool)
+    parent_ids = parent_ids.to_numpy(dtype=object)
+
+    # 节点首次出现的顺序：逐行依次是 当前节点、parent_id 节点
+    sequence = np.empty(2 * len(node_ids), dtype=object)
+    sequence[0::2] = node_ids
+    sequence[1::2] = parent_ids
+    keep = np.ones(2 * len(node_ids), dtype=bool)
+    keep[1::2] = has_parent
+    for node_id in pd.unique(sequence[keep]):
+        tables.main_order.setdefault(node_id, None)
+
+    node_frame = pd.DataFrame({
+        'name': named['name'].to_numpy(dtype=object),
+        'type': named['type'].fillna('').to_numpy(dtype=object),
+        'short_name': named['short_name'].fillna('').to_numpy(dtype=object),
+        'level': named['level'].fillna('').to_numpy(dtype=object),
+    }, index=pd.Index(node_ids, dtype=object))
+    node_frame = node_frame[~node_frame.index.duplicated(keep='last')]
+    tables.main_nodes.update(
+        (node_id, {'name': name, 'type': type_, 'short_name': short_name, 'level': level})
+        for node_id, name, type_, short_name, level in zip(
+            node_frame.index, node_frame['name'], node_frame['type'], node_frame['short_name'], node_frame['level']))
+
+    if has_parent.any():
+        edge_rows = named[has_parent]
+        edge_frame = pd.DataFrame({
+            'u': node_ids[has_parent],
+            'v': parent_ids[has_parent],
+            'amount': edge_rows['amount'].fillna('').to_numpy(dtype=object),
+            'sh_type': edge_rows['sh_type'].fillna('').to_numpy(dtype=object),
+        })
+        edge_frame = edge_frame.drop_duplicates(['u', 'v'], keep='first')
+        # percent 保持 float/None，不放进 DataFrame 以免 None 被转换成 NaN
+        kept = edge_frame.index.to_numpy()
+        percents = _normalize_percent_series(_column(edge_rows, 'percent').to_numpy(dtype=object)[kept])
+        amount_values = _parse_amount_series(edge_frame['amount'].to_numpy(dtype=object))
+        for u, v, amount, amount_value, percent, sh_type in zip(edge_frame['u'], edge_frame['v'], edge_frame['amount'],
+                                                                amount_values, percents, edge_frame['sh_type']):
+            tables.main_edges.setdefault((u, v), {
+                'amount': amount,
+                'amount_value': amount_value,
+                'percent': percent,
+                'sh_type': sh_type,
+                'source_info': 'parent_id_field'
+            })
+
+def _fill_children_tables(df, tables, strict=False, row_offset=0):
+    """
+    第二遍：展开主行的children字段。
+
+    strict=True 时不打印警告，返回格式错误的行 [(行号, 节点ID, 错误信息), ...]；
+    row_offset 为 df 第一行在整个CSV中的下标（分片/分块处理时使用）。
+    """
+    named_mask = df['name'].notna().to_numpy(dtype=bool)
+    named = df[named_mask]
+    children = _column(named, 'children')
+    mask = (children.notna() & ~children.isin(['[]', ''])).to_numpy(dtype=bool)
+    if not mask.any():
+        return []
+    eid = named['eid']
+    node_ids = eid.where(eid.notna() & (eid != ''), named['name']).to_numpy(dtype=object)
+    row_numbers = np.flatnonzero(named_mask)[mask] + row_offset + 2 # CSV行号：表头为第1行
+    errors = []
+    for row_number, node_id, children_data in zip(row_numbers.tolist(), node_ids[mask], children.to_numpy(dtype=object)[mask]):
+        if not strict:
+            tables.add_children(node_id, children_data)
+            continue
+        try:
+            tables.add_children(node_id, children_data, strict=True)
+        except ChildrenParseError as e:
+            errors.append((row_number, node_id, str(e)))
+    return errors
+
+def _build_graph_vectorized(df, strict=False, graph_class=nx.DiGraph):
+    tables = _GraphTables()
+    _fill_main_tables(df, tables)
+    errors = _fill_children_tables(df, tables, strict)
+    if errors:
+        raise MalformedChildrenError(errors)
+    return tables.to_graph(graph_class=graph_class)
+
+def _build_shard_tables(shard_df, row_offset, strict):
+    """并行构建的工作进程：为一个行分片生成部分节点表和边表。"""
+    tables = _GraphTables()
+    _fill_main_tables(shard_df, tables)
+    errors = _fill_children_tables(shard_df, tables, strict, row_offset)
+    return tables, errors
+
+def _build_graph_parallel(df, workers, strict=False, graph_class=nx.DiGraph):
+    """
+    把数据按行切成若干分片，在进程池中并行解析 children 字段并生成部分节点/边表，
+    再按分片顺序确定性地合并。合并规则与串行构建一致，得到的图完全相同。
+    """
+    shard_count = min(len(df), workers * 4) # 分片数多于进程数，便于负载均衡
+    bounds = np.linspace(0, len(df), shard_count + 1, dtype=int)
+    shards = [(df.iloc[start:end], int(start)) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+    tables = _GraphTables()
+    errors = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_build_shard_tables, shard_df, row_offset, strict) for shard_df, row_offset in shards]
+        for future in futures: # 按分片顺序合并，与完成顺序无关
+            shard_tables, shard_errors = future.result()
+            tables.merge(shard_tables)
+            errors.extend(shard_errors)
+    if errors:
+        raise MalformedChildrenError(errors)
+    return tables.to_graph(graph_class=graph_class)
+
+def _build_graph_rows(df, strict=False, graph_class=nx.DiGraph):
+    """逐行构建（原始实现），保留作为向量化实现的对照基准。"""
+    G = graph_class()
 
     # 第一遍：添加所有在主行中定义了name的节点，并建立基于parent_id的边
     # Rule: Child (current_node_id) -> Parent (parent_id_val)
@@ -199,6 +532,7 @@ def build_graph(csv_path='三层股权穿透输出数据.csv'):
                 # 如果父节点不存在，暂时不创建，期望它有自己的主行数据
                 edge_attrs = {
                     'amount': row['amount'] if pd.notna(row['amount']) else '',
+                    'amount_value': _parse_amount(row['amount']),
                     'percent': _normalize_percent(row.get('percent')), # 使用规范化函数
                     'sh_type': row['sh_type'] if pd.notna(row['sh_type']) else '',
                     'source_info': 'parent_id_field' # Mark that this edge came from parent_id
@@ -212,7 +546,8 @@ def build_graph(csv_path='三层股权穿透输出数据.csv'):
     
     # 第二遍：处理children字段，补充可能的节点和边
     # shareholder_in_children_json -> current_node_id
-    for _, row in df.iterrows():
+    errors = []
+    for position, (_, row) in enumerate(df.iterrows()):
         if pd.notna(row['name']):
             current_node_id = row['eid'] if pd.notna(row['eid']) and row['eid'] != '' else row['name']
             children_json_str = row.get('children')
@@ -220,11 +555,368 @@ def build_graph(csv_path='三层股权穿透输出数据.csv'):
                 # 确保父节点（current_node_id）在图中，如果它只有children而没有parent_id，第一遍可能没覆盖到
                 if not G.has_node(current_node_id):
                      G.add_node(current_node_id, name=row['name'], type=row.get('type', ''), short_name=row.get('short_name', ''), level=row.get('level', ''))
-                _parse_children_recursive(current_node_id, children_json_str, G)
-                
+                try:
+                    _parse_children_recursive(current_node_id, children_json_str, G, strict)
+                except ChildrenParseError as e:
+                    errors.append((position + 2, current_node_id, str(e)))
+    if errors:
+        raise MalformedChildrenError(errors)
+    return G
+
+ENCODINGS_TO_TRY = ['utf-8-sig', 'utf-8', 'gbk', 'gb18030', 'gb2312', 'big5']
+ENCODING_SAMPLE_BYTES = 1 << 20 # 嗅探编码时读取的字节数
+
+# 最近一次 build_graph 的构建报告（模式、编码、行数、耗时、峰值内存等），便于基准脚本读取
+last_build_report = {}
+
+def _sniff_encodings(csv_path, sample_bytes=ENCODING_SAMPLE_BYTES):
+    """
+    只读取文件开头的一段字节来判断编码，返回按可能性排序的编码列表（嗅探到的编码排在最前）。
+    正常情况下第一个编码即可成功，无需像以前那样每换一种编码就把整个文件重读一遍。
+    """
+    try:
+        with open(csv_path, 'rb') as f:
+            sample = f.read(sample_bytes)
+    except OSError:
+        return list(ENCODINGS_TO_TRY)
+    for encoding in ENCODINGS_TO_TRY:
+        try:
+            # final=False：样本末尾可能截断了一个多字节字符，不算解码失败
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+        except UnicodeDecodeError:
+            continue
+        return [encoding] + [e for e in ENCODINGS_TO_TRY if e != encoding]
+    return list(ENCODINGS_TO_TRY)
+
+def _reset_peak_rss():
+    """在 Linux 上重置进程的峰值 RSS 计数，使报告反映本次构建；其他平台上报告的是进程迄今为止的峰值。"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024 # macOS 单位为字节，Linux 为KB
+
+def _build_graph_streaming(csv_path, encodings_to_try, chunksize, strict=False, graph_class=nx.DiGraph):
+    """
+    分块读取CSV，逐块把节点和边累积到节点表/边表中，处理完的数据块随即释放；
+    内存峰值随图的规模增长，而不是"整张原始 DataFrame + 图"。
+    返回 (图, 读取的行数, 使用的编码)；无法读取时图为 None。
+    """
+    for encoding in encodings_to_try:
+        tables = _GraphTables()
+        errors = []
+        rows_read = 0
+        try:
+            for chunk in pd.read_csv(csv_path, encoding=encoding, dtype=str, chunksize=chunksize):
+                _fill_main_tables(chunk, tables)
+                errors.extend(_fill_children_tables(chunk, tables, strict, rows_read))
+                rows_read += len(chunk)
+        except UnicodeDecodeError:
+            # 嗅探的样本只覆盖文件开头，后面出现无法解码的内容时换下一种编码重新读取
+            print(f"GraphBuilder Warn: Encoding {encoding} failed part-way through '{csv_path}', retrying with the next encoding.")
+            continue
+        except pd.errors.EmptyDataError:
+            print(f"GraphBuilder Warn: CSV file '{csv_path}' is empty or could not be read with encoding {encoding}.")
+            return graph_class(), 0, encoding
+        except Exception as e:
+            print(f"GraphBuilder: An unexpected error occurred while reading '{csv_path}' with {encoding}: {e}")
+            continue
+        if errors:
+            raise MalformedChildrenError(errors)
+        return tables.to_graph(release=True, graph_class=graph_class), rows_read, encoding
+    return None, 0, None
+
+def _build_graph_from_csv(csv_path, engine='vectorized', strict=False, workers=None, chunksize=None, graph_class=nx.DiGraph):
+    """解析CSV构建图（不经过构建缓存），参数含义同 build_graph。"""
+    _reset_peak_rss()
+    start_time = time.perf_counter()
+    encodings_to_try = _sniff_encodings(csv_path)
+
+    if chunksize:
+        if engine != 'vectorized':
+            raise ValueError("流式读取（chunksize）只支持 'vectorized' 引擎")
+        G, rows_read, encoding = _build_graph_streaming(csv_path, encodings_to_try, chunksize, strict, graph_class)
+        if G is None:
+            print(f"GraphBuilder Error: Could not read CSV file '{csv_path}' with any of the attempted encodings.")
+            G = graph_class()
+            print(f"GraphBuilder: Returning empty graph as CSV could not be loaded: {csv_path}")
+            return G
+        print(f"GraphBuilder: Built graph with {G.number_of_nodes()} nodes and {G.number_of_edges()} edges.")
+        _report_build(G, f'streaming(chunksize={chunksize})', encoding, rows_read, start_time)
+        return G
+
+    df = None
+    read_successful = False
+
+    for encoding in encodings_to_try:
+        try:
+            df = pd.read_csv(csv_path, encoding=encoding, dtype=str) # 读取所有列为字符串以保留原始格式
+            # print(f"GraphBuilder: Successfully read CSV '{csv_path}' with encoding: {encoding}") # Commented out
+            read_successful = True
+            used_encoding = encoding
+            break
+        except UnicodeDecodeError:
+            # print(f"GraphBuilder: Failed to decode CSV '{csv_path}' with encoding: {encoding}") # Commented out
+            pass # Continue to the next encoding
+        except pd.errors.EmptyDataError:
+            print(f"GraphBuilder Warn: CSV file '{csv_path}' is empty or could not be read with encoding {encoding}.")
+            # 如果文件就是空的，不应该继续尝试其他编码或报错，而是返回空图或相应处理
+            G = graph_class()
+            print(f"GraphBuilder: Returning empty graph due to empty or unreadable CSV: {csv_path}")
+            return G
+        except Exception as e:
+            print(f"GraphBuilder: An unexpected error occurred while reading '{csv_path}' with {encoding}: {e}")
+            # 对于其他pandas读取错误或一般错误，也记录并尝试下一种编码
+    
+    if not read_successful or df is None:
+        print(f"GraphBuilder Error: Could not read CSV file '{csv_path}' with any of the attempted encodings.")
+        # 可以选择抛出异常或者返回一个空图，这里选择后者以便调用方可以处理
+        G = graph_class()
+        print(f"GraphBuilder: Returning empty graph as CSV could not be loaded: {csv_path}")
+        return G
+    
+    # Check if DataFrame is empty after successful read (e.g. header only or all rows filtered out previously)
+    if df.empty:
+        print(f"GraphBuilder Warn: CSV file '{csv_path}' was read successfully but resulted in an empty DataFrame.")
+        G = graph_class()
+        print(f"GraphBuilder: Returning empty graph due to empty DataFrame from: {csv_path}")
+        return G
+
+    rows_read = len(df)
+    if engine == 'vectorized' and workers and workers > 1 and len(df) > 1:
+        G = _build_graph_parallel(df, workers, strict, graph_class)
+        mode = f'parallel(workers={workers})'
+    elif engine == 'vectorized':
+        G = _build_graph_vectorized(df, strict, graph_class)
+        mode = 'vectorized'
+    elif engine == 'rows':
+        G = _build_graph_rows(df, strict, graph_class)
+        mode = 'rows'
+    else:
+        raise ValueError(f"未知的构建引擎: {engine}（可选 'vectorized' 或 'rows'）")
+    del df
+
     print(f"GraphBuilder: Built graph with {G.number_of_nodes()} nodes and {G.number_of_edges()} edges.")
+    _report_build(G, mode, used_encoding, rows_read, start_time)
+    return G
+
+def _report_build(G, mode, encoding, rows_read, start_time):
+    global last_build_report
+    last_build_report = {
+        'mode': mode,
+        'encoding': encoding,
+        'rows': rows_read,
+        'nodes': G.number_of_nodes(),
+        'edges': G.number_of_edges(),
+        'seconds': time.perf_counter() - start_time,
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+    peak = last_build_report['peak_rss_mb']
+    peak_str = f"{peak:.1f} MB" if peak is not None else "N/A"
+    print(f"GraphBuilder: Build report - mode={mode}, encoding={encoding}, rows={rows_read}, "
+          f"time={last_build_report['seconds']:.2f}s, peak RSS={peak_str}")
+
+# ---------------------------------------------------------------------------
+# 构建缓存
+# ---------------------------------------------------------------------------
+
+# 构建规则（节点/边的取值方式）发生变化时递增，旧缓存随之失效
+BUILDER_VERSION = 2
+BUILD_CACHE_DIR = os.environ.get('GRAPH_BUILD_CACHE_DIR', os.path.join('outputs', 'cache'))
+# 设置环境变量 GRAPH_BUILD_CACHE=0 可全局关闭构建缓存
+_CACHE_DISABLED_VALUES = ('0', 'false', 'no', 'off')
+
+def _builder_fingerprint():
+    """构建规则的指纹：BUILDER_VERSION 加上金额换算表，任一变化都会使旧缓存失效。"""
+    return f"{BUILDER_VERSION}-{_amount_rates_digest()}"
+
+def _file_digest(csv_path, block_size=1 << 20):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(csv_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _cache_entry_path(csv_path, cache_dir=None):
+    """每个源文件（按绝对路径）对应一个缓存快照。"""
+    path_digest = hashlib.blake2b(os.path.abspath(csv_path).encode('utf-8'), digest_size=8).hexdigest()
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(cache_dir or BUILD_CACHE_DIR, f"{stem}-{path_digest}.gsnap")
+
+def _cache_key(csv_path, stat, strict):
+    content_hash = _file_digest(csv_path)
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'content_hash': content_hash,
+        'builder_version': _builder_fingerprint(),
+        'strict': bool(strict),
+    }
+
+def _graph_version(key):
+    """图的版本号只取决于源数据内容和构建规则，冷启动和命中缓存时相同。"""
+    text = f"{key['content_hash']}:{key['builder_version']}"
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+def _stat_version(csv_path, stat):
+    """
+    不使用构建缓存时的版本号：由文件路径、大小、修改时间和构建规则决定，不读取文件内容。
+    与按内容计算的版本号不同，文件内容不变但修改时间变化时版本号也会变化（指标随之重新计算一次）。
+    """
+    text = f"stat:{os.path.abspath(csv_path)}:{stat.st_size}:{stat.st_mtime_ns}:{_builder_fingerprint()}"
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+def _check_build_cache(entry, csv_path, stat, strict):
+    """
+    核对缓存快照。文件大小或构建规则不同直接判定未命中；大小和修改时间都相同时视为未变化，
+    不再计算哈希（与 git 的 stat 缓存相同的做法）；修改时间变化时核对内容哈希，
+    内容未变（例如重新下载的同一份文件）仍然命中。
+    返回 (打开的快照或 None, 缓存键或 None, 缓存中记录的构建信息)。
+    """
+    if not graph_persistence.is_snapshot(entry):
+        return None, None, None
+    snapshot = graph_persistence.open_snapshot(entry)
+    cached = snapshot.meta.get('extra', {}).get('build_cache', {})
+    if (cached.get('size') != stat.st_size or cached.get('builder_version') != _builder_fingerprint()
+            or cached.get('strict') != bool(strict)):
+        return None, None, None
+    if cached.get('mtime_ns') == stat.st_mtime_ns:
+        key = {k: cached[k] for k in ('size', 'mtime_ns', 'content_hash', 'builder_version', 'strict')}
+    else:
+        key = _cache_key(csv_path, stat, strict)
+        if cached.get('content_hash') != key['content_hash']:
+            return None, key, None
+    return snapshot, key, cached
+
+def _read_build_cache(entry, csv_path, stat, strict, graph_class=nx.DiGraph):
+    """读取缓存快照（命中规则见 _check_build_cache）。返回 (缓存的图或 None, 缓存键或 None, 缓存中记录的构建信息)。"""
+    try:
+        snapshot, key, cached = _check_build_cache(entry, csv_path, stat, strict)
+        if snapshot is None:
+            return None, key, None
+        G = snapshot.to_networkx(graph_class)
+        G.graph['version'] = _graph_version(key)
+        return G, key, cached
+    except Exception as e:
+        print(f"GraphBuilder Warn: Ignoring unreadable build cache '{entry}': {e}")
+        return None, None, None
+
+def _write_build_cache(entry, G, key, report):
+    extra = {'build_cache': dict(key, rows=report.get('rows'), encoding=report.get('encoding'))}
+    try:
+        os.makedirs(os.path.dirname(entry) or '.', exist_ok=True)
+        # 缓存按 float64 保存所有浮点列，命中缓存时得到的图与重新解析完全一致
+        graph_persistence.save_snapshot(G, entry, float32_columns=(), extra_meta=extra)
+    except Exception as e:
+        print(f"GraphBuilder Warn: Could not write build cache '{entry}': {e}")
+
+def purge_build_cache(csv_path=None, cache_dir=None):
+    """
+    删除构建缓存。指定 csv_path 时只删除该源文件的缓存，否则清空整个缓存目录。
+    返回删除的缓存条目数。
+    """
+    cache_dir = cache_dir or BUILD_CACHE_DIR
+    if csv_path is not None:
+        entries = [_cache_entry_path(csv_path, cache_dir)]
+    elif os.path.isdir(cache_dir):
+        entries = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith('.gsnap')]
+    else:
+        entries = []
+    removed = 0
+    for entry in entries:
+        if os.path.isdir(entry):
+            shutil.rmtree(entry, ignore_errors=True)
+            removed += 1
+    return removed
+
+def _cache_enabled(use_cache):
+    if use_cache is not None:
+        return use_cache
+    return os.environ.get('GRAPH_BUILD_CACHE', '1').strip().lower() not in _CACHE_DISABLED_VALUES
+
+def build_graph(csv_path='三层股权穿透输出数据.csv', engine='vectorized', strict=False, workers=None, chunksize=None,
+                use_cache=None, cache_dir=None, compact=False):
+    """
+    从指定的CSV文件读取股权数据并构建一个NetworkX DiGraph。
+
+    参数:
+    csv_path (str): 股权穿透CSV文件路径。
+    engine (str): 构建引擎。'vectorized'（默认）用整列运算生成节点表和边表后批量装入图；
+                  'rows' 为原始的逐行两遍实现。两者生成的图完全相同。
+    strict (bool): 为 True 时，children 字段格式错误的行不再打印警告后跳过，
+                   而是汇总后抛出 MalformedChildrenError（其 errors 属性包含各行的行号和错误信息）。
+    workers (int): 大于1时使用进程池按行分片并行构建（仅 'vectorized' 引擎）；
+                   节点、边及其属性与串行构建完全一致。
+    chunksize (int): 设置后以流式方式每次读取 chunksize 行，逐块累积节点和边，不保留整张原始
+                     DataFrame（仅 'vectorized' 引擎，串行处理，忽略 workers）。结果与一次性读取相同。
+    use_cache (bool): 是否使用构建缓存。默认启用（环境变量 GRAPH_BUILD_CACHE=0 可关闭）：
+                      缓存键为源文件大小、修改时间、内容哈希和 BUILDER_VERSION，命中时直接从
+                      快照加载，跳过解析。False 时总是重新解析且不写缓存。
+    cache_dir (str): 缓存目录，默认 outputs/cache（环境变量 GRAPH_BUILD_CACHE_DIR 可修改）。
+    compact (bool): 为 True 时返回 compact_graph.CompactDiGraph：节点/边属性按列驻留存储，
+                    访问方式不变，内存占用明显更低。
+
+    返回的图在 G.graph['version'] 中带有版本号（由源数据内容和构建规则决定；
+    不使用缓存时由文件路径、大小、修改时间和构建规则决定，不为此计算内容哈希）。
+    每次构建结束时打印构建报告（模式、编码、行数、耗时、峰值内存RSS），并保存在 last_build_report 中。
+    """
+    global last_build_report
+    last_build_report = {}
+    graph_class = CompactDiGraph if compact else nx.DiGraph
+    try:
+        stat = os.stat(csv_path)
+    except OSError:
+        stat = None
+    if stat is None or not _cache_enabled(use_cache):
+        G = _build_graph_from_csv(csv_path, engine, strict, workers, chunksize, graph_class)
+        if stat is not None and G.number_of_nodes():
+            G.graph['version'] = _stat_version(csv_path, stat) # 不为版本号再读一遍整个文件
+        return G
+
+    _reset_peak_rss()
+    start_time = time.perf_counter()
+    entry = _cache_entry_path(csv_path, cache_dir)
+    G, key, cached = _read_build_cache(entry, csv_path, stat, strict, graph_class)
+    if G is not None:
+        if cached['mtime_ns'] != stat.st_mtime_ns:
+            # 内容未变只是修改时间变了：更新缓存中记录的修改时间，下次无需再计算哈希
+            _write_build_cache(entry, G, key, cached)
+        print(f"GraphBuilder: Loaded graph with {G.number_of_nodes()} nodes and {G.number_of_edges()} edges from build cache.")
+        _report_build(G, 'cache', cached.get('encoding'), cached.get('rows'), start_time)
+        return G
+
+    G = _build_graph_from_csv(csv_path, engine, strict, workers, chunksize, graph_class)
+    if G.number_of_nodes() and last_build_report:
+        key = key or _cache_key(csv_path, stat, strict)
+        G.graph['version'] = _graph_version(key)
+        _write_build_cache(entry, G, key, last_build_report)
     return G
 
+def build_graph_snapshot(csv_path='三层股权穿透输出数据.csv', strict=False, cache_dir=None):
+    """
+    返回 (构建缓存快照目录, 图版本号)，供只读共享加载（csr_graph.py）直接内存映射。
+    缓存有效时既不解析CSV也不构建图；否则先按 build_graph 构建一次并写入缓存。版本号与 build_graph 相同。
+    """
+    stat = os.stat(csv_path)
+    entry = _cache_entry_path(csv_path, cache_dir)
+    try:
+        snapshot, key, _ = _check_build_cache(entry, csv_path, stat, strict)
+    except Exception as e:
+        print(f"GraphBuilder Warn: Ignoring unreadable build cache '{entry}': {e}")
+        snapshot = None
+    if snapshot is not None:
+        return entry, _graph_version(key)
+    G = build_graph(csv_path, strict=strict, use_cache=True, cache_dir=cache_dir)
+    if not graph_persistence.is_snapshot(entry):
+        raise ValueError(f"无法为 {csv_path} 生成构建缓存快照（图为空或缓存目录不可写）")
+    return entry, G.graph['version']
+
 if __name__ == '__main__':
     # 测试函数
     print("Testing graph builder...")
@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+"""
+增量更新：把上游每天下发的变更行（delta CSV）应用到已保存的图上，不再从完整CSV重建。
+
+图由股权穿透CSV的各行按构建规则推导：同一节点有多个主行时节点属性取最后一行，同一条边取最先给出它的行，
+children 中的股东和边只用来补充。增量更新在同一份行表上应用 delta，行以
+（节点ID, parent_id, level, sh_type）为键：
+    add / change   替换行键相同的行（位置不变），没有时追加到末尾
+    remove         删除行键相同的行
+之后只重新推导受影响的节点——变更前后的行中出现过的节点（主行节点、parent_id 和 children 中任意一层的股东）：
+取出当前行表中提到这些节点的所有行（保持原顺序）按构建规则重新构建，用结果替换图中这些节点的属性和相连的边；
+不再被任何行提到的节点一并删除。应用后的图与用更新后的行表完整重建的图相同。
+
+apply_delta 同时把更新后的行表写回股权穿透CSV，图和CSV保持一致，下一份 delta 在此基础上应用。
+
+用法:
+    python graph_delta.py delta.csv
+    python graph_delta.py delta.csv --graph outputs/graph_model_updated.gsnap --csv 三层股权穿透输出数据.csv
+"""
+import argparse
+import os
+import re
+
+import pandas as pd
+
+import graph_builder
+import graph_persistence
+from children_parser import ChildrenParseError, MalformedChildrenError
+from graph_holder import DEFAULT_CSV_PATH
+
+OP_ADD = 'add'
+OP_CHANGE = 'change'
+OP_REMOVE = 'remove'
+_OP_ALIASES = {
+    'add': OP_ADD, 'insert': OP_ADD,
+    'change': OP_CHANGE, 'update': OP_CHANGE, 'modify': OP_CHANGE,
+    'remove': OP_REMOVE, 'delete': OP_REMOVE,
+}
+
+def read_delta(delta_csv):
+    """读取 delta CSV（编码自动识别），返回带规范化 op 列的 DataFrame。op 非法时抛出 ValueError。"""
+    df = None
+    for encoding in graph_builder._sniff_encodings(delta_csv):
+        try:
+            df = pd.read_csv(delta_csv, encoding=encoding, dtype=str)
+            break
+        except UnicodeDecodeError:
+            continue
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame(columns=['op', 'eid', 'name', 'parent_id', 'children'])
+    if df is None:
+        raise ValueError(f"无法读取 delta 文件: {delta_csv}")
+    if 'op' not in df.columns:
+        raise ValueError(f"delta 文件缺少 op 列: {delta_csv}")
+    ops = df['op'].fillna('').str.strip().str.lower().map(_OP_ALIASES)
+    invalid = ops.isna()
+    if invalid.any():
+        bad = [f"第{i + 2}行: {df['op'].iloc[i]!r}" for i in invalid.to_numpy().nonzero()[0][:20]]
+        raise ValueError("delta 文件中有无法识别的 op（可选 add/change/remove）:\n  " + "\n  ".join(bad))
+    df['op'] = ops
+    return df
+
+def _value(row, key):
+    value = row.get(key)
+    return value if pd.notna(value) else ''
+
+def _row_node_id(row):
+    if pd.isna(row.get('name')):
+        return None
+    eid = row.get('eid')
+    return eid if pd.notna(eid) and eid != '' else row['name']
+
+def _parent_id(row):
+    parent_id = row.get('parent_id')
+    return parent_id if pd.notna(parent_id) and parent_id != '' else None
+
+def _child_node_id(child):
+    name = child.get('name')
+    if not pd.notna(name) or name == '':
+        return None
+    eid = child.get('eid')
+    return eid if pd.notna(eid) and eid != '' else name
+
+def _parse_rows(df, strict):
+    """先解析所有行的 children，严格模式下有错误就在修改图之前整体失败。"""
+    parsed = []
+    errors = []
+    for position, row in enumerate(df.to_dict('records')):
+        node_id = _row_node_id(row)
+        if node_id is None:
+            continue
+        children = row.get('children')
+        children_list = None
+        if pd.notna(children) and children not in ('[]', ''):
+            try:
+                children_list = graph_builder._parse_children_data(node_id, children, strict)
+            except ChildrenParseError as e:
+                errors.append((position + 2, node_id, str(e)))
+        parsed.append((row, node_id, children_list or []))
+    if errors:
+        raise MalformedChildrenError(errors)
+    return parsed
+
+def read_rows(csv_path):
+    """读取股权穿透CSV（所有列按字符串读取），返回 (行表DataFrame, 编码)。"""
+    for encoding in graph_builder._sniff_encodings(csv_path):
+        try:
+            return pd.read_csv(csv_path, encoding=encoding, dtype=str), encoding
+        except UnicodeDecodeError:
+            continue
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame(columns=['eid', 'name', 'parent_id', 'children']), encoding
+    raise ValueError(f"无法读取CSV文件: {csv_path}")
+
+def _row_key(row, node_id):
+    return (node_id, _parent_id(row) or '', _value(row, 'level'), _value(row, 'sh_type'))
+
+def _row_keys(rows):
+    """行表中每一行的行键；没有 name 的行构建时被忽略，行键为 None。"""
+    names = rows['name']
+    eid = graph_builder._column(rows, 'eid')
+    node_ids = eid.where(eid.notna() & (eid != ''), names)
+    parent_ids = graph_builder._column(rows, 'parent_id').fillna('')
+    levels = graph_builder._column(rows, 'level').fillna('')
+    sh_types = graph_builder._column(rows, 'sh_type').fillna('')
+    return [tuple(key) if named else None
+            for named, *key in zip(names.notna(), node_ids, parent_ids, levels, sh_types)]
+
+def _children_mentions(company_id, children_list, mentioned):
+    for child in children_list:
+        shareholder_id = _child_node_id(child)
+        if shareholder_id is None:
+            continue
+        mentioned.add(shareholder_id)
+        grand_children = child.get('children')
+        if grand_children:
+            nested = graph_builder._parse_children_data(shareholder_id, grand_children)
+            if nested:
+                _children_mentions(shareholder_id, nested, mentioned)
+
+def _row_mentions(row, node_id, children_list=None):
+    """一行提到的所有节点：主行节点、parent_id 以及 children 中任意一层的股东。"""
+    mentioned = {node_id}
+    parent_id = _parent_id(row)
+    if parent_id is not None:
+        mentioned.add(parent_id)
+    if children_list is None:
+        children = row.get('children')
+        if pd.notna(children) and children not in ('[]', ''):
+            children_list = graph_builder._parse_children_data(node_id, children)
+    _children_mentions(node_id, children_list or [], mentioned)
+    return mentioned
+
+def _apply_rows(rows, parsed):
+    """
+    按顺序把变更行应用到行表上，返回 (新行表, 受影响的节点ID集合, 没有匹配到任何行的 remove 行数)。
+    同一行键有多行时，add/change 替换第一行并删除其余各行，remove 全部删除。
+    """
+    columns = list(rows.columns)
+    positions = {}
+    for position, key in enumerate(_row_keys(rows)):
+        if key is not None:
+            positions.setdefault(key, []).append(position)
+    updated = {} # 行位置 -> 新的行（dict）或 None（已删除）；位置 >= len(rows) 的是追加的行
+    next_position = len(rows)
+    affected = set()
+    unmatched = 0
+    for row, node_id, children_list in parsed:
+        key = _row_key(row, node_id)
+        live = positions.get(key, [])
+        for position in live:
+            old_row = updated[position] if position in updated else rows.iloc[position].to_dict()
+            affected |= _row_mentions(old_row, node_id)
+        if row['op'] == OP_REMOVE:
+            unmatched += not live
+            for position in live:
+                updated[position] = None
+            positions[key] = []
+            continue
+        if live:
+            position = live[0]
+            for duplicate in live[1:]:
+                updated[duplicate] = None
+        else:
+            position = next_position
+            next_position += 1
+        updated[position] = {column: row.get(column) for column in columns}
+        positions[key] = [position]
+        affected |= _row_mentions(row, node_id, children_list)
+
+    result = rows.copy()
+    replaced = {position: row for position, row in updated.items() if position < len(rows) and row is not None}
+    if replaced:
+        result.iloc[list(replaced)] = pd.DataFrame(list(replaced.values()), columns=columns).to_numpy(dtype=object)
+    deleted = [position for position, row in updated.items() if position < len(rows) and row is None]
+    result = result.drop(index=result.index[deleted])
+    appended = [row for position, row in sorted(updated.items()) if position >= len(rows) and row is not None]
+    if appended:
+        appended = pd.DataFrame(appended, columns=columns)
+        result = pd.concat([result, appended], ignore_index=True) if len(result) else appended
+    return result.reset_index(drop=True), affected, unmatched
+
+def _rows_mentioning(rows, node_ids):
+    """
+    行表中提到 node_ids 中任一节点的行（布尔掩码）。children 只做文本匹配：不含反斜杠的文本中节点ID原样出现，
+    含反斜杠（可能有转义）的一律计入。多选的行不影响结果，重新推导时只取这些节点的属性和相连的边。
+    """
+    node_ids = list(node_ids)
+    eid = graph_builder._column(rows, 'eid')
+    main_ids = eid.where(eid.notna() & (eid != ''), rows['name'])
+    mask = main_ids.isin(node_ids) | graph_builder._column(rows, 'parent_id').isin(node_ids)
+    children = graph_builder._column(rows, 'children')
+    pending = children.notna() & ~children.isin(['[]', '']) & ~mask
+    if pending.any():
+        texts = children[pending].astype(str)
+        pattern = '|'.join(re.escape(str(node_id)) for node_id in node_ids)
+        mask[pending] = texts.str.contains('\\', regex=False) | texts.str.contains(pattern, regex=True)
+    return mask & rows['name'].notna()
+
+def _incident_edges(G, node_ids):
+    edges = {}
+    for node_id in node_ids:
+        if G.has_node(node_id):
+            edges.update(((u, v), data) for u, v, data in G.in_edges(node_id, data=True))
+            edges.update(((u, v), data) for u, v, data in G.out_edges(node_id, data=True))
+    return edges
+
+def _rederive(G, rows, affected):
+    """
+    用行表中提到 affected 的行按构建规则重新构建，替换图中这些节点的属性和相连的边，
+    不再出现的节点删除。返回属性或相连的边发生变化的节点。
+    """
+    H = graph_builder._build_graph_vectorized(rows[_rows_mentioning(rows, affected)])
+    before = _incident_edges(G, affected)
+    after = _incident_edges(H, affected)
+    touched = set()
+    for edge in before.keys() - after.keys():
+        G.remove_edge(*edge)
+        touched.update(edge)
+    for node_id in affected:
+        if H.has_node(node_id):
+            attrs = H.nodes[node_id]
+            if not G.has_node(node_id):
+                G.add_node(node_id, **attrs)
+            elif G.nodes[node_id] != attrs:
+                G.nodes[node_id].clear()
+                G.nodes[node_id].update(attrs)
+            else:
+                continue
+        elif G.has_node(node_id):
+            G.remove_node(node_id) # 不再被任何行提到
+        else:
+            continue
+        touched.add(node_id)
+    for edge, attrs in after.items():
+        existing = G.get_edge_data(*edge)
+        if existing is None:
+            G.add_edge(*edge, **attrs)
+        elif existing != attrs:
+            existing.clear()
+            existing.update(attrs)
+        else:
+            continue
+        touched.update(edge)
+    return touched
+
+def apply_delta_to_graph(G, delta, rows, strict=False):
+    """
+    在内存中的图上按顺序应用变更行。
+
+    参数:
+    G (nx.DiGraph): 由 rows 构建的图（原地修改）。
+    delta (str or pd.DataFrame): delta CSV 路径，或 read_delta 返回的 DataFrame。
+    rows (pd.DataFrame): 构建 G 所用的行表（read_rows 读取的股权穿透CSV），不会被修改。
+    strict (bool): 为 True 时 children 字段无法解析的变更行汇总后抛出 MalformedChildrenError，图保持不变。
+
+    返回:
+    tuple: (受影响的节点ID集合, 更新后的行表)。受影响的节点为属性或相连的边发生变化的节点，包括被删除的节点。
+    """
+    df = read_delta(delta) if isinstance(delta, str) else delta
+    rows, affected, unmatched = _apply_rows(rows, _parse_rows(df, strict))
+    if unmatched:
+        print(f"GraphDelta Warn: {unmatched} remove rows did not match any row (key: node id, parent_id, level, sh_type).")
+    touched = _rederive(G, rows, affected) if affected else set()
+    G.graph.pop('version', None) # 内容已变化，旧的版本号不再有效
+    return touched, rows
+
+def apply_delta(delta_csv, graph_file=graph_persistence.DEFAULT_GRAPH_FILE, strict=False, output_file=None,
+                csv_path=DEFAULT_CSV_PATH, csv_output=None):
+    """
+    把 delta CSV 应用到已保存的图快照上并写回（先写临时目录再替换，读者不会看到半成品），
+    更新后的行表同样写回CSV。
+
+    参数:
+    delta_csv (str): delta CSV 路径。
+    graph_file (str): 要更新的图文件（快照目录或 GraphML），须由 csv_path 构建。
+    strict (bool): 同 apply_delta_to_graph。
+    output_file (str): 写到另一个路径；默认写回 graph_file。
+    csv_path (str): 构建该图的股权穿透CSV（默认环境变量 GRAPH_CSV_PATH 或 三层股权穿透输出数据.csv）。
+    csv_output (str): 更新后的行表写到另一个路径；默认写回 csv_path（保持原编码）。
+
+    返回:
+    set: 受影响的节点ID集合，供下游按节点失效缓存和指标。
+    """
+    G = graph_persistence.load_graph(graph_file)
+    if G is None:
+        raise FileNotFoundError(f"无法加载图文件: {graph_file}")
+    rows, encoding = read_rows(csv_path)
+    df = read_delta(delta_csv)
+    touched, rows = apply_delta_to_graph(G, df, rows, strict)
+
+    # 行表先写到临时文件，图写回成功后再替换，避免图和CSV只更新了一个
+    csv_output = csv_output or csv_path
+    tmp_csv = f"{csv_output}.tmp-{os.getpid()}"
+    rows.to_csv(tmp_csv, index=False, encoding=encoding)
+    try:
+        output_file = output_file or graph_file
+        if graph_persistence.is_snapshot(output_file) or not graph_persistence._is_graphml_path(output_file):
+            G.graph['version'] = graph_persistence.save_snapshot(G, output_file)
+        else:
+            graph_persistence.export_graphml(G, output_file)
+    except BaseException:
+        os.remove(tmp_csv)
+        raise
+    os.replace(tmp_csv, csv_output)
+    counts = df['op'].value_counts()
+    print(f"GraphDelta: Applied {len(df)} rows (add={counts.get(OP_ADD, 0)}, change={counts.get(OP_CHANGE, 0)}, "
+          f"remove={counts.get(OP_REMOVE, 0)}); {len(touched)} nodes touched. "
+          f"Graph now has {G.number_of_nodes()} nodes and {G.number_of_edges()} edges; {len(rows)} rows in {csv_output}.")
+    return touched
+
+def main():
+    parser = argparse.ArgumentParser(description='把 delta CSV 增量应用到已保存的图上。')
+    parser.add_argument('delta_csv', help='delta CSV 路径（需包含 op 列: add/change/remove）。')
+    parser.add_argument('--graph', default=graph_persistence.DEFAULT_GRAPH_FILE, help='要更新的图文件（默认 %(default)s）。')
+    parser.add_argument('--output', default=None, help='输出路径，默认写回 --graph。')
+    parser.add_argument('--csv', default=DEFAULT_CSV_PATH, help='构建该图的股权穿透CSV，更新后的行表写回该文件（默认 %(default)s）。')
+    parser.add_argument('--csv-output', default=None, help='更新后的行表写到另一个路径，默认写回 --csv。')
+    parser.add_argument('--strict', action='store_true', help='children 字段无法解析时整体失败，不修改图。')
+    args = parser.parse_args()
+    apply_delta(args.delta_csv, args.graph, strict=args.strict, output_file=args.output,
+                csv_path=args.csv, csv_output=args.csv_output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+运行中的服务持有的图：首次加载只做一次，数据更新时在后台构建新版本并原子切换，不需要重启进程。
+
+- GraphState 是一份不可变的快照：图、指标以及加载信息。请求开始时取一次快照并在整个请求中使用，
+  切换发生在请求之间，同一请求看到的图和指标总是同一版本。
+- 首次加载（get()）由锁保护：并发的首批请求只触发一次 build_graph()，其余请求等待同一个结果。
+- 重新加载（reload()）在后台线程中构建图、加载指标并预热索引（名称索引、联想索引等，
+  由 warmers 给出），全部就绪后一次性替换快照；旧快照在仍在处理的请求结束后自然释放。
+  同一时间只有一个后台加载，重复触发返回正在进行的那一次；加载失败时保留旧快照并记录错误。
+  切换期间新旧两份图同时在内存中。
+"""
+import os
+import threading
+import time
+import traceback
+
+from graph_builder import build_graph
+from metrics_store import load_or_compute_metrics
+
+DEFAULT_CSV_PATH = os.environ.get('GRAPH_CSV_PATH', '三层股权穿透输出数据.csv')
+
+def load_networkx_graph(csv_path):
+    """默认的加载方式：构建 nx.DiGraph 并读取（或计算）指标。"""
+    graph = build_graph(csv_path)
+    return graph, load_or_compute_metrics(graph)
+
+class GraphState:
+    """一个版本的图及其指标。属性: graph, metrics, version, csv_path, loaded_at, load_seconds"""
+
+    __slots__ = ('graph', 'metrics', 'version', 'csv_path', 'loaded_at', 'load_seconds')
+
+    def __init__(self, graph, metrics, csv_path, load_seconds):
+        self.graph = graph
+        self.metrics = metrics
+        self.version = graph.graph.get('version')
+        self.csv_path = csv_path
+        self.loaded_at = time.time()
+        self.load_seconds = load_seconds
+
+class GraphHolder:
+    """
+    持有当前的 GraphState，支持单次初始化和后台热替换。
+
+    参数:
+    csv_path (str): 数据文件路径（默认环境变量 GRAPH_CSV_PATH 或 三层股权穿透输出数据.csv）。
+    loader (callable): loader(csv_path) -> (图, 指标)，默认 build_graph + load_or_compute_metrics；
+                       多进程只读共享部署时为 csr_graph.load_shared_graph。
+    warmers (list): 预热函数 warm(graph, metrics)，后台加载时在切换前依次调用（构建索引等）；
+                    单个预热失败只打印警告，不影响切换。
+    on_swap (callable): 切换完成后调用 on_swap(新快照, 旧快照)，例如清空响应缓存。
+    """
+
+    def __init__(self, csv_path=None, loader=None, warmers=(), on_swap=None):
+        self.csv_path = csv_path or DEFAULT_CSV_PATH
+        self.loader = loader or load_networkx_graph
+        self.warmers = list(warmers)
+        self.on_swap = on_swap
+        self._state = None
+        self._init_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._reload_thread = None
+        self.last_error = None
+        self.last_reload = None
+
+    @property
+    def state(self):
+        """当前快照（尚未加载时为 None），不触发加载。"""
+        return self._state
+
+    def get(self):
+        """返回当前快照；尚未加载时加载一次（并发调用只加载一次，其余调用等待）。"""
+        state = self._state
+        if state is not None:
+            return state
+        with self._init_lock:
+            if self._state is None:
+                self._swap(self._build(self.csv_path, warm=False))
+            return self._state
+
+    def load(self, csv_path=None):
+        """在当前线程中构建并切换到 csv_path 的图（默认为当前数据文件）。返回新快照。"""
+        with self._init_lock:
+            state = self._build(csv_path or self.csv_path, warm=True)
+            self._swap(state)
+            return state
+
+    def reload(self, csv_path=None, wait=False):
+        """
+        在后台重新加载（数据文件变化后调用）。已有后台加载在进行时不再重复启动。
+
+        返回:
+        bool: 是否启动了新的后台加载。wait 为 True 时等待加载结束后再返回。
+        """
+        with self._reload_lock:
+            thread = self._reload_thread
+            started = thread is None or not thread.is_alive()
+            if started:
+                thread = threading.Thread(target=self._reload, args=(csv_path or self.csv_path,),
+                                          name='GraphHolderReload', daemon=True)
+                self._reload_thread = thread
+                thread.start()
+        if wait:
+            thread.join()
+        return started
+
+    @property
+    def reloading(self):
+        thread = self._reload_thread
+        return thread is not None and thread.is_alive()
+
+    def status(self):
+        state = self._state
+        return {
+            "loaded": state is not None,
+            "version": state.version if state else None,
+            "csv_path": state.csv_path if state else self.csv_path,
+            "loaded_at": state.loaded_at if state else None,
+            "load_seconds": state.load_seconds if state else None,
+            "nodes": state.graph.number_of_nodes() if state else None,
+            "edges": state.graph.number_of_edges() if state else None,
+            "reloading": self.reloading,
+            "last_reload": self.last_reload,
+            "last_error": self.last_error,
+        }
+
+    def _reload(self, csv_path):
+        started = time.perf_counter()
+        try:
+            old = self._state
+            state = self._build(csv_path, warm=True)
+            if old is not None and old.version is not None and state.version == old.version and old.csv_path == csv_path:
+                outcome = 'unchanged' # 数据没有变化，保留旧快照（缓存和索引都继续有效）
+            else:
+                with self._init_lock:
+                    self._swap(state)
+                outcome = 'swapped'
+            self.last_error = None
+            print(f"GraphHolder: Reload {outcome} (version={state.version}, {time.perf_counter() - started:.2f}s)")
+        except Exception as e:
+            outcome = 'failed'
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"GraphHolder: Reload failed, keeping the current graph: {self.last_error}")
+            traceback.print_exc()
+        self.last_reload = {"outcome": outcome, "csv_path": csv_path, "finished_at": time.time(),
+                            "seconds": round(time.perf_counter() - started, 3)}
+
+    def _build(self, csv_path, warm):
+        started = time.perf_counter()
+        graph, metrics = self.loader(csv_path)
+        if warm:
+            for warmer in self.warmers:
+                try:
+                    warmer(graph, metrics)
+                except Exception as e:
+                    print(f"GraphHolder: Warmer {getattr(warmer, '__name__', warmer)} failed: {e}")
+        return GraphState(graph, metrics, csv_path, round(time.perf_counter() - started, 3))
+
+    def _swap(self, state):
+        old = self._state
+        self._state = state # 单次引用赋值：请求要么拿到旧快照，要么拿到新快照
+        self.csv_path = state.csv_path
+        if self.on_swap is not None:
+            self.on_swap(state, old)
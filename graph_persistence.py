@@ -1,17 +1,67 @@
 import networkx as nx
-import graph_builder # 假设 graph_builder.py 在同一个目录下或者在PYTHONPATH中
+import numpy as np
+import hashlib
+import json
 import os
+import shutil
+from collections import deque
 
-# 定义默认的图文件路径
-DEFAULT_GRAPH_FILE = "outputs/graph_model_updated.graphml"
+# 定义默认的图文件路径（列式快照目录；以 .graphml 结尾的路径仍按 GraphML 保存/读取）
+DEFAULT_GRAPH_FILE = "outputs/graph_model_updated.gsnap"
 
-def save_graph(graph, file_path):
+# 快照格式说明：
+# 快照是一个目录，每个数组单独保存为未压缩的 .npy 文件，读取时可以直接内存映射（mmap）。
+#   meta.json            格式版本、节点/边数、列定义、图属性、内容指纹(version)
+#   strings.npy          驻留字符串表：所有字符串 UTF-8 编码后首尾相接的字节 (uint8)
+#   string_offsets.npy   第 i 个字符串为 strings[offsets[i]:offsets[i+1]] (int64)
+#   node_ids.npy         节点ID在字符串表中的编号 (int32)，顺序即节点插入顺序
+#   indptr.npy/indices.npy          出边 CSR 邻接：节点 i 的后继为 indices[indptr[i]:indptr[i+1]]
+#   in_indptr.npy/in_edges.npy      入边索引（CSC）：节点 i 的入边编号（按前驱顺序）
+#   edge_order.npy       恢复 networkx 中前驱/后继顺序所需的边插入顺序
+#   node_<属性>.npy / edge_<属性>.npy   属性列，按列类型存储:
+#       'str'  字符串编号 (int32)，-1 表示该节点/边没有此属性，-2 表示值为 None
+#       'json' 非字符串的混合值，JSON 编码后驻留到字符串表，编号规则同上
+#       'f4'   float32（默认用于 percent 列），NaN 表示 None
+#       'f8'   float64，NaN 表示 None
+#       'i8'   int64
+#     数值列若有节点/边缺少该属性，另存 <列>.present.npy (uint8) 标记是否存在
+SNAPSHOT_FORMAT = 'equity-graph-snapshot'
+SNAPSHOT_FORMAT_VERSION = 1
+_META_FILE = 'meta.json'
+_MISSING = -1
+_NONE = -2
+
+def _is_graphml_path(file_path):
+    return str(file_path).lower().endswith('.graphml')
+
+def is_snapshot(file_path):
+    """判断路径是否为列式快照目录。"""
+    return os.path.isdir(file_path) and os.path.exists(os.path.join(file_path, _META_FILE))
+
+def save_graph(graph, file_path, format=None):
     """
     将NetworkX图保存到指定的文件路径。
 
     参数:
     graph (nx.DiGraph): 需要保存的NetworkX有向图。
-    file_path (str): 保存图的文件路径 (推荐使用 .graphml 格式)。
+    file_path (str): 保存路径。默认保存为列式二进制快照（一个目录）；以 .graphml 结尾时导出为 GraphML。
+    format (str): 显式指定 'snapshot' 或 'graphml'，为 None 时按扩展名判断。
+    """
+    if format is None:
+        format = 'graphml' if _is_graphml_path(file_path) else 'snapshot'
+    if format == 'graphml':
+        return export_graphml(graph, file_path)
+    if format != 'snapshot':
+        raise ValueError(f"未知的保存格式: {format}（可选 'snapshot' 或 'graphml'）")
+    try:
+        save_snapshot(graph, file_path)
+        print(f"Graph successfully saved to {file_path}")
+    except Exception as e:
+        print(f"Error saving graph to {file_path}: {e}")
+
+def export_graphml(graph, file_path):
+    """
+    将图导出为 GraphML（XML）格式，便于与其他工具交换数据。
     """
     try:
         # 确保输出目录存在
@@ -28,7 +78,7 @@ def save_graph(graph, file_path):
             for key, value in data.items():
                 if value is None:
                     data[key] = ""
-        
+
         # 预处理边属性：将 None 替换为空字符串
         for u, v, data in graph_copy.edges(data=True):
             for key, value in data.items():
@@ -40,16 +90,31 @@ def save_graph(graph, file_path):
     except Exception as e:
         print(f"Error saving graph to {file_path}: {e}")
 
-def load_graph(file_path):
+def load_graph(file_path, mmap=True):
     """
     从指定的文件路径加载NetworkX图。
 
     参数:
-    file_path (str): 图文件的路径 (应该是 .graphml 格式)。
+    file_path (str): 图文件的路径（列式快照目录或 .graphml 文件）。
+    mmap (bool): 读取快照时是否以内存映射方式打开数组。
 
     返回:
     nx.DiGraph: 加载的NetworkX有向图，如果加载失败则返回None。
     """
+    if is_snapshot(file_path):
+        try:
+            graph = open_snapshot(file_path, mmap=mmap).to_networkx()
+            print(f"Graph successfully loaded from {file_path}")
+            return graph
+        except Exception as e:
+            print(f"Error loading graph from {file_path}: {e}")
+            return None
+    return import_graphml(file_path)
+
+def import_graphml(file_path):
+    """
+    读取 GraphML 文件，并把 level/amount_value/percent 转换回数值类型。
+    """
     try:
         graph = nx.read_graphml(file_path)
         print(f"Graph successfully loaded from {file_path}")
@@ -63,18 +128,19 @@ def load_graph(file_path):
                     # print(f"Warning: Could not convert level '{data['level']}' to int for node {node_id}")
                     pass # 保留原样或设为None/默认值
             # 可以为其他属性添加类似的转换逻辑
-        
+
+        # amount 保持原始字符串（如 '10000.000000万元'），数值在 amount_value 中（人民币元）；
+        # 导出时 None 被写成了空字符串，这里还原为 None
+        from graph_builder import _parse_amount
         for u, v, data in graph.edges(data=True):
-            if 'amount' in data and data['amount'] is not None:
-                try:
-                    data['amount'] = float(data['amount'])
-                except ValueError:
-                    pass
-            if 'percent' in data and data['percent'] is not None:
-                try:
-                    data['percent'] = float(data['percent'])
-                except ValueError:
-                    pass
+            for key in ('amount_value', 'percent'):
+                if key in data and data[key] is not None:
+                    try:
+                        data[key] = float(data[key]) if data[key] != '' else None
+                    except ValueError:
+                        pass
+            if 'amount' in data and 'amount_value' not in data:
+                data['amount_value'] = _parse_amount(data['amount']) # 旧版本导出的文件没有 amount_value
         return graph
     except FileNotFoundError:
         print(f"Error: Graph file not found at {file_path}")
@@ -83,8 +149,377 @@ def load_graph(file_path):
         print(f"Error loading graph from {file_path}: {e}")
         return None
 
+# ---------------------------------------------------------------------------
+# 列式快照
+# ---------------------------------------------------------------------------
+
+class _StringTable:
+    """写快照时使用的字符串驻留表：相同字符串只存一份。"""
+
+    def __init__(self):
+        self.codes = {}
+        self.strings = []
+
+    def intern(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.strings)
+            self.strings.append(value)
+        return code
+
+    def to_arrays(self):
+        encoded = [s.encode('utf-8') for s in self.strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        if encoded:
+            np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return blob, offsets
+
+def _column_kind(values, float32=False):
+    """根据一列中出现的值决定存储类型。values 不含缺失的属性。"""
+    has_str = has_float = has_int = has_none = has_other = False
+    for value in values:
+        if value is None:
+            has_none = True
+        elif isinstance(value, str):
+            has_str = True
+        elif isinstance(value, bool):
+            has_other = True
+        elif isinstance(value, (int, np.integer)):
+            has_int = True
+        elif isinstance(value, (float, np.floating)):
+            has_float = True
+        else:
+            has_other = True
+    if has_other or (has_str and (has_float or has_int)):
+        return 'json'
+    if has_str or not (has_float or has_int):
+        return 'str'
+    if has_float:
+        return 'f4' if float32 else 'f8'
+    return 'json' if has_none else 'i8' # 整数列含 None 时不能转成浮点，否则读回后类型会变
+
+def _encode_column(values, present, table, float32=False):
+    """把一列属性值编码为数组。values 与 present 等长，present[i] 为 False 表示缺少该属性。"""
+    kind = _column_kind((v for v, p in zip(values, present) if p), float32)
+    if kind in ('str', 'json'):
+        codes = np.empty(len(values), dtype=np.int32)
+        for i, (value, is_present) in enumerate(zip(values, present)):
+            if not is_present:
+                codes[i] = _MISSING
+            elif value is None:
+                codes[i] = _NONE
+            else:
+                codes[i] = table.intern(value if kind == 'str' else json.dumps(value, ensure_ascii=False))
+        return kind, codes, None
+    dtype = {'f4': np.float32, 'f8': np.float64, 'i8': np.int64}[kind]
+    fill = np.nan if kind != 'i8' else 0
+    data = np.array([(fill if (not p or v is None) else v) for v, p in zip(values, present)], dtype=dtype)
+    mask = None if all(present) else np.array(present, dtype=np.uint8)
+    return kind, data, mask
+
+def _collect_columns(records, count):
+    """把属性字典列表整理为 {属性名: (值列表, 是否存在列表)}，列按首次出现的顺序排列。"""
+    columns = {}
+    for i, attrs in enumerate(records):
+        for key, value in attrs.items():
+            column = columns.get(key)
+            if column is None:
+                column = columns[key] = ([None] * count, [False] * count)
+            column[0][i] = value
+            column[1][i] = True
+    return columns
+
+def _edge_insertion_order(indptr, in_indptr, in_edges):
+    """
+    计算一个边的插入顺序，使按该顺序 add_edges_from 后每个节点的后继顺序与前驱顺序都与原图一致。
+    每条边只受两条约束：同一起点的上一条出边、同一终点的上一条入边，用拓扑排序求解。
+    """
+    edge_count = len(in_edges)
+    prev_count = np.zeros(edge_count, dtype=np.int8)
+    next_out = np.full(edge_count, -1, dtype=np.int64) # 同一起点的下一条出边
+    next_in = np.full(edge_count, -1, dtype=np.int64)  # 同一终点的下一条入边
+
+    out_starts = np.zeros(edge_count, dtype=bool)
+    out_starts[indptr[:-1][np.diff(indptr) > 0]] = True
+    has_next_out = np.flatnonzero(~out_starts[1:]) # 边 e+1 与边 e 同起点
+    next_out[has_next_out] = has_next_out + 1
+    prev_count[has_next_out + 1] += 1
+
+    in_starts = np.zeros(edge_count, dtype=bool)
+    in_starts[in_indptr[:-1][np.diff(in_indptr) > 0]] = True
+    positions = np.flatnonzero(~in_starts[1:])
+    next_in[in_edges[positions]] = in_edges[positions + 1]
+    prev_count[in_edges[positions + 1]] += 1
+
+    order = np.empty(edge_count, dtype=np.int64)
+    queue = deque(np.flatnonzero(prev_count == 0).tolist())
+    prev_count = prev_count.tolist()
+    next_out = next_out.tolist()
+    next_in = next_in.tolist()
+    k = 0
+    while queue:
+        e = queue.popleft()
+        order[k] = e
+        k += 1
+        for nxt in (next_out[e], next_in[e]):
+            if nxt >= 0:
+                prev_count[nxt] -= 1
+                if prev_count[nxt] == 0:
+                    queue.append(nxt)
+    if k != edge_count:
+        # 约束成环或邻接数组不一致：不保存未初始化的行号
+        raise ValueError(f"无法确定边的插入顺序：{edge_count} 条边中只排出了 {k} 条")
+    return order
+
+def _fingerprint(arrays):
+    digest = hashlib.blake2b(digest_size=16)
+    for name in sorted(arrays):
+        digest.update(name.encode('utf-8'))
+        digest.update(np.ascontiguousarray(arrays[name]).tobytes())
+    return digest.hexdigest()
+
+def save_snapshot(graph, path, float32_columns=('percent',), extra_meta=None):
+    """
+    把有向图保存为列式快照目录。直接遍历原图生成数组，不复制图。
+    节点ID必须是字符串。
+
+    float32_columns: 以 float32 存储的浮点属性列（默认 percent）；传入空元组则全部按 float64 精确保存。
+    extra_meta: 写入 meta.json 的附加信息（可 JSON 序列化），打开快照后从 meta['extra'] 读取。
+    返回快照的内容指纹。
+    """
+    if graph.is_multigraph() or not graph.is_directed():
+        raise ValueError("快照格式只支持 nx.DiGraph")
+    table = _StringTable()
+    index = {}
+    node_codes = np.empty(graph.number_of_nodes(), dtype=np.int32)
+    node_records = []
+    for i, (node_id, attrs) in enumerate(graph.nodes(data=True)):
+        if not isinstance(node_id, str):
+            raise ValueError(f"快照格式只支持字符串节点ID，遇到 {node_id!r}；请改用 GraphML 导出")
+        index[node_id] = i
+        node_codes[i] = table.intern(node_id)
+        node_records.append(attrs)
+
+    # 出边 CSR：与 graph.edges() 的遍历顺序一致
+    indptr = np.zeros(len(index) + 1, dtype=np.int64)
+    indices = np.empty(graph.number_of_edges(), dtype=np.int32)
+    edge_records = []
+    e = 0
+    for i, (node_id, successors) in enumerate(graph.adjacency()):
+        for succ, attrs in successors.items():
+            indices[e] = index[succ]
+            edge_records.append(attrs)
+            e += 1
+        indptr[i + 1] = e
+
+    # 入边索引：节点的入边编号按 networkx 中的前驱顺序排列
+    edge_ids = {}
+    in_indptr = np.zeros(len(index) + 1, dtype=np.int64)
+    in_edges = np.empty(len(indices), dtype=np.int64)
+    for u_index in range(len(index)):
+        for e in range(indptr[u_index], indptr[u_index + 1]):
+            edge_ids[(u_index, int(indices[e]))] = e
+    k = 0
+    for i, (node_id, predecessors) in enumerate(graph.pred.items()):
+        for pred in predecessors:
+            in_edges[k] = edge_ids[(index[pred], i)]
+            k += 1
+        in_indptr[i + 1] = k
+    del edge_ids
+
+    arrays = {
+        'node_ids': node_codes,
+        'indptr': indptr,
+        'indices': indices,
+        'in_indptr': in_indptr,
+        'in_edges': in_edges,
+        'edge_order': _edge_insertion_order(indptr, in_indptr, in_edges),
+    }
+    columns = {'node': {}, 'edge': {}}
+    for prefix, records in (('node', node_records), ('edge', edge_records)):
+        for name, (values, present) in _collect_columns(records, len(records)).items():
+            kind, data, mask = _encode_column(values, present, table, name in float32_columns)
+            key = f"{prefix}_{name}"
+            columns[prefix][name] = {'kind': kind, 'file': key, 'has_mask': mask is not None}
+            arrays[key] = data
+            if mask is not None:
+                arrays[f"{key}.present"] = mask
+    arrays['strings'], arrays['string_offsets'] = table.to_arrays()
+
+    graph_attrs = {k: v for k, v in graph.graph.items() if _json_safe(v)}
+    meta = {
+        'format': SNAPSHOT_FORMAT,
+        'format_version': SNAPSHOT_FORMAT_VERSION,
+        'num_nodes': len(index),
+        'num_edges': int(len(indices)),
+        'node_columns': columns['node'],
+        'edge_columns': columns['edge'],
+        'graph_attrs': graph_attrs,
+        'extra': extra_meta or {},
+        'version': _fingerprint(arrays),
+    }
+
+    # 先写入临时目录再整体替换，避免读到写了一半的快照
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    for name, data in arrays.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), data, allow_pickle=False)
+    with open(os.path.join(tmp_path, _META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+    if os.path.exists(path):
+        old_path = f"{path}.old-{os.getpid()}"
+        os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+    else:
+        os.replace(tmp_path, path)
+    return meta['version']
+
+def _json_safe(value):
+    try:
+        json.dumps(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+class GraphSnapshot:
+    """
+    打开的列式快照。数组以内存映射方式读取，多个进程打开同一快照时共享操作系统的页缓存。
+
+    常用属性:
+    meta (dict): 快照元数据；version 为内容指纹，可作为图的版本号。
+    indptr, indices: 出边 CSR；in_indptr, in_edges: 入边索引。
+    """
+
+    def __init__(self, path, mmap=True):
+        self.path = path
+        with open(os.path.join(path, _META_FILE), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get('format') != SNAPSHOT_FORMAT:
+            raise ValueError(f"{path} 不是图快照")
+        if self.meta.get('format_version', 0) > SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"快照格式版本 {self.meta['format_version']} 高于当前支持的版本 {SNAPSHOT_FORMAT_VERSION}")
+        self._mmap_mode = 'r' if mmap else None
+        self._strings = None
+        self.indptr = self.array('indptr')
+        self.indices = self.array('indices')
+        self.in_indptr = self.array('in_indptr')
+        self.in_edges = self.array('in_edges')
+
+    @property
+    def version(self):
+        return self.meta['version']
+
+    @property
+    def num_nodes(self):
+        return self.meta['num_nodes']
+
+    @property
+    def num_edges(self):
+        return self.meta['num_edges']
+
+    def array(self, name):
+        return np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode=self._mmap_mode, allow_pickle=False)
+
+    @property
+    def strings(self):
+        """解码后的字符串表（object 数组），首次访问时生成。"""
+        if self._strings is None:
+            blob = self.array('strings')
+            offsets = self.array('string_offsets').tolist()
+            data = blob.tobytes()
+            strings = np.empty(len(offsets) - 1, dtype=object)
+            strings[:] = [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+            self._strings = strings
+        return self._strings
+
+    def node_ids(self):
+        return self.strings[self.array('node_ids')]
+
+    def column(self, prefix, name):
+        """
+        返回某个属性列的原始类型化数组（mmap），例如 column('edge', 'amount_value') 为 float64，
+        缺失值为 NaN；边的顺序与 indptr/indices 一致，可直接做向量化的聚合和排序。
+        字符串列返回的是字符串表编号。
+        """
+        return self.array(self.meta[f"{prefix}_columns"][name]['file'])
+
+    def column_values(self, prefix, name):
+        """
+        返回某个属性列的 Python 值（object 数组）和是否存在的布尔数组。
+        prefix 为 'node' 或 'edge'。
+        """
+        spec = self.meta[f"{prefix}_columns"][name]
+        data = self.array(spec['file'])
+        kind = spec['kind']
+        if kind in ('str', 'json'):
+            values = np.empty(len(data), dtype=object)
+            valid = data >= 0
+            if kind == 'str':
+                values[valid] = self.strings[data[valid]]
+            else:
+                decoded = {code: json.loads(self.strings[code]) for code in np.unique(data[valid]).tolist()}
+                for i, code in zip(np.flatnonzero(valid).tolist(), data[valid].tolist()):
+                    values[i] = decoded[code]
+            values[~valid] = None
+            return values, data != _MISSING
+        if kind == 'f4':
+            # float32 按最短十进制表示转回 float64，使 0.95 读回后仍是 0.95
+            as_float = np.asarray(data).astype(str).astype(np.float64)
+        else:
+            as_float = np.asarray(data)
+        values = np.array(as_float.tolist(), dtype=object)
+        if kind != 'i8':
+            values[np.isnan(as_float)] = None
+        present = self.array(f"{spec['file']}.present").astype(bool) if spec['has_mask'] else np.ones(len(data), dtype=bool)
+        return values, present
+
+    def _records(self, prefix, count):
+        columns = [(name,) + self.column_values(prefix, name) for name in self.meta[f"{prefix}_columns"]]
+        if not columns:
+            return [{} for _ in range(count)]
+        if all(present.all() for _, _, present in columns):
+            names = [name for name, _, _ in columns]
+            return [dict(zip(names, row)) for row in zip(*(values.tolist() for _, values, _ in columns))]
+        records = [{} for _ in range(count)]
+        for name, values, present in columns:
+            for i in np.flatnonzero(present).tolist():
+                records[i][name] = values[i]
+        return records
+
+    def to_networkx(self, graph_class=nx.DiGraph):
+        """把快照还原为 nx.DiGraph（或 graph_class 指定的子类），节点、边及其属性和前驱/后继顺序都与保存时一致。"""
+        G = graph_class()
+        G.graph.update(self.meta.get('graph_attrs', {}))
+        G.graph['version'] = self.version
+        node_ids = self.node_ids()
+        G.add_nodes_from(zip(node_ids.tolist(), self._records('node', self.num_nodes)))
+
+        indptr = np.asarray(self.indptr)
+        sources = np.repeat(np.arange(self.num_nodes), np.diff(indptr))
+        order = self.array('edge_order')
+        edge_records = self._records('edge', self.num_edges)
+        u = node_ids[sources[order]].tolist()
+        v = node_ids[np.asarray(self.indices)[order]].tolist()
+        G.add_edges_from(zip(u, v, (edge_records[e] for e in order.tolist())))
+        return G
+
+def open_snapshot(path, mmap=True):
+    """打开列式快照，返回 GraphSnapshot（不构建 networkx 图）。"""
+    return GraphSnapshot(path, mmap=mmap)
+
+def load_snapshot(path, mmap=True):
+    """读取列式快照并还原为 nx.DiGraph。"""
+    return open_snapshot(path, mmap=mmap).to_networkx()
+
 if __name__ == '__main__':
     # --- 示例用法 ---
+    import graph_builder
 
     # 1. 构建图 (使用 graph_builder.py)
     print("Attempting to build the graph...")
@@ -104,7 +539,7 @@ if __name__ == '__main__':
 
         if loaded_graph:
             print(f"Graph loaded: {loaded_graph.number_of_nodes()} nodes, {loaded_graph.number_of_edges()} edges.")
-            
+
             # 后续可以在这里对 loaded_graph 进行操作，例如添加新的边
             # print("\nGraph is ready for further modifications.")
 
@@ -113,4 +548,4 @@ if __name__ == '__main__':
     else:
         print("Failed to build the initial graph.")
 
-    print("\nScript finished.") 
\ No newline at end of file
+    print("\nScript finished.")
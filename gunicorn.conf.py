@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+# gunicorn 配置（pip install gunicorn；gunicorn -c gunicorn.conf.py wsgi:application）
+# preload_app: 父进程导入 wsgi.py 时加载图，工作进程 fork 后共享（见 wsgi.py / csr_graph.py）
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:application'
+bind = os.environ.get('GRAPH_BIND', '0.0.0.0:8888')
+workers = int(os.environ.get('GRAPH_WORKERS', multiprocessing.cpu_count()))
+preload_app = True
+timeout = 120
@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""
+节点指标的预计算与存储。
+
+PageRank、度中心性、采样中介中心性和出入度按图版本（G.graph['version']）只计算一次，
+以列式 .npy 文件写入 outputs/metrics/<版本>/，之后各进程以内存映射方式读取：
+多个 Web 工作进程共享同一份物理内存，启动时间也不再随图的规模增长。
+每项指标同时保存按值降序排列的行号（<指标>.order.npy），前 k 名、分页排行和节点名次查询都不再排序。
+
+每列按图的节点顺序排列（同一版本的图节点顺序固定），meta.json 中记录节点数和节点顺序的指纹用于校验。
+
+用法:
+    python metrics_store.py                      # 为默认数据预计算指标
+    python metrics_store.py 三层股权穿透输出数据.csv
+"""
+import argparse
+import hashlib
+import heapq
+import json
+import operator
+import os
+import shutil
+import time
+from collections.abc import Mapping
+
+import networkx as nx
+import numpy as np
+
+METRICS_DIR = os.path.join('outputs', 'metrics')
+METRICS_FORMAT_VERSION = 1
+BETWEENNESS_SAMPLES = 50 # 中介中心性的采样节点数
+# 指标名 -> 存储类型
+METRIC_DTYPES = {
+    'pagerank': np.float64,
+    'degree_centrality': np.float64,
+    'betweenness_centrality': np.float64,
+    'in_degree': np.int64,
+    'out_degree': np.int64,
+}
+_META_FILE = 'meta.json'
+_ORDER_SUFFIX = '.order.npy' # 按指标值降序排列的行号
+
+def _node_order_digest(G):
+    digest = hashlib.blake2b(digest_size=16)
+    for node in G:
+        digest.update(str(node).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def compute_metrics(G):
+    """计算全部指标，返回 {指标名: 按节点顺序排列的数组}；某项计算失败时该列为 NaN。"""
+    n = G.number_of_nodes()
+    arrays = {}
+
+    def fill(name, label, func):
+        try:
+            values = func()
+            arrays[name] = np.fromiter((values.get(node, np.nan) for node in G), dtype=np.float64, count=n)
+        except Exception as e:
+            print(f"计算{label}时出错: {e}")
+            arrays[name] = np.full(n, np.nan)
+
+    fill('pagerank', 'PageRank', lambda: nx.pagerank(G, alpha=0.85))
+    fill('degree_centrality', '度中心性', lambda: nx.degree_centrality(G))
+    # 中介中心性使用采样以提高性能
+    fill('betweenness_centrality', '中介中心性',
+         lambda: nx.betweenness_centrality(G, k=min(BETWEENNESS_SAMPLES, n)) if n else {})
+    arrays['in_degree'] = np.fromiter((d for _, d in G.in_degree()), dtype=np.int64, count=n)
+    arrays['out_degree'] = np.fromiter((d for _, d in G.out_degree()), dtype=np.int64, count=n)
+    return arrays
+
+class MetricColumn(Mapping):
+    """一列指标的只读映射视图：节点ID -> Python 数值（float/int），底层为 numpy 数组。"""
+
+    __slots__ = ('name', 'values', '_index')
+
+    def __init__(self, name, values, index):
+        self.name = name
+        self.values = values
+        self._index = index
+
+    def __getitem__(self, node):
+        value = self.values[self._index[node]].item()
+        if value != value: # NaN：该指标没有计算成功
+            raise KeyError(node)
+        return value
+
+    def __contains__(self, node):
+        i = self._index.get(node)
+        return i is not None and not (self.values.dtype.kind == 'f' and np.isnan(self.values[i]))
+
+    def __iter__(self):
+        if self.values.dtype.kind == 'f':
+            valid = ~np.isnan(np.asarray(self.values))
+            return (node for node, ok in zip(self._index, valid.tolist()) if ok)
+        return iter(self._index)
+
+    def __len__(self):
+        if self.values.dtype.kind == 'f':
+            return int((~np.isnan(np.asarray(self.values))).sum())
+        return len(self._index)
+
+def ranking_order(values):
+    """按指标值降序排列的行号（同值按节点顺序，NaN 排在最后）。"""
+    values = np.asarray(values, dtype=np.float64)
+    keys = np.where(np.isnan(values), np.inf, -values)
+    dtype = np.int32 if len(values) < 2**31 else np.int64
+    return np.argsort(keys, kind='stable').astype(dtype)
+
+def top_items(mapping, k):
+    """字典中值最大的 k 项 [(键, 值), ...]，与 sorted(..., reverse=True)[:k] 结果相同，但不做全量排序。"""
+    return heapq.nlargest(k, mapping.items(), key=operator.itemgetter(1))
+
+class MetricRanking:
+    """
+    一项指标的排名：按值降序排列的行号数组（每个图版本计算一次并保存），
+    前 k 名、任意位置的一页都是数组切片，节点名次通过逆排列 O(1) 查询。
+    """
+
+    __slots__ = ('name', 'values', 'order', 'valid', '_node_ids', '_ranks')
+
+    def __init__(self, name, values, order, node_ids):
+        self.name = name
+        self.values = values
+        self.order = order
+        values = np.asarray(values)
+        self.valid = int((~np.isnan(values)).sum()) if values.dtype.kind == 'f' else len(values)
+        self._node_ids = node_ids
+        self._ranks = None
+
+    def __len__(self):
+        """有值（非 NaN）的节点个数。"""
+        return self.valid
+
+    def top_positions(self, k, offset=0):
+        """第 offset+1 名起的 k 个行号。"""
+        end = min(offset + k, self.valid)
+        return self.order[offset:end] if offset < end else self.order[:0]
+
+    def top(self, k, offset=0):
+        """第 offset+1 名起的 k 项 [(节点ID, 值), ...]。"""
+        return [(self._node_ids[row], self.values[row].item()) for row in self.top_positions(k, offset).tolist()]
+
+    def iter_nodes(self):
+        """按名次依次产生节点ID（惰性，不构造整个列表）。"""
+        node_ids = self._node_ids
+        return (node_ids[row] for row in self.order[:self.valid].tolist())
+
+    def rank_of_row(self, row):
+        if self._ranks is None:
+            ranks = np.empty(len(self.order), dtype=np.int64)
+            ranks[np.asarray(self.order)] = np.arange(len(self.order))
+            self._ranks = ranks
+        rank = int(self._ranks[row])
+        return rank + 1 if rank < self.valid else None
+
+class MetricsStore(Mapping):
+    """
+    一个图版本的全部指标：指标名 -> MetricColumn。
+    可以像原来的 node_metrics 字典一样使用：node_metrics['pagerank'][node_id]。
+    """
+
+    def __init__(self, arrays, index, meta=None, path=None, orders=None):
+        self.meta = meta or {}
+        self.path = path
+        self.index = index # 节点ID -> 行号
+        self._columns = {name: MetricColumn(name, values, index) for name, values in arrays.items()}
+        self._orders = dict(orders or {})
+        self._rankings = {}
+        self._node_ids = None
+
+    def __getitem__(self, name):
+        return self._columns[name]
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self):
+        return len(self._columns)
+
+    def array(self, name):
+        """某项指标的原始数组（按节点顺序），用于向量化计算。"""
+        return self._columns[name].values
+
+    @property
+    def node_ids(self):
+        """行号 -> 节点ID。"""
+        if self._node_ids is None:
+            # csr_graph.RowIndex 自带按行号解码的节点ID序列，不必展开成列表
+            self._node_ids = getattr(self.index, 'node_ids', None) or list(self.index)
+        return self._node_ids
+
+    def ranking(self, name):
+        """某项指标的 MetricRanking；排序结果已保存时直接读取，否则计算一次（并尽量写入指标目录）。"""
+        ranking = self._rankings.get(name)
+        if ranking is None:
+            values = self.array(name)
+            order = self._orders.get(name)
+            if order is None:
+                order = ranking_order(values)
+                if self.path is not None:
+                    _save_array(os.path.join(self.path, f"{name}{_ORDER_SUFFIX}"), order)
+            ranking = self._rankings[name] = MetricRanking(name, values, order, self.node_ids)
+        return ranking
+
+    def rank(self, name, node):
+        """节点在某项指标上的名次（从1开始）；节点不存在或该指标没有值时返回 None。"""
+        row = self.index.get(node)
+        return None if row is None else self.ranking(name).rank_of_row(row)
+
+def _save_array(path, values):
+    """写一个 .npy 文件（先写临时文件再改名）；写入失败只提示，不影响使用。"""
+    tmp_path = f"{path}.tmp-{os.getpid()}.npy"
+    try:
+        np.save(tmp_path, values, allow_pickle=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"MetricsStore: Could not save {path}: {e}")
+
+def metrics_path(version, store_dir=None):
+    return os.path.join(store_dir or METRICS_DIR, str(version))
+
+def write_metrics(G, arrays, path):
+    """把指标写入目录（先写临时目录再改名；其他进程已写好时直接使用已有结果）。"""
+    meta = {
+        'format_version': METRICS_FORMAT_VERSION,
+        'graph_version': G.graph.get('version'),
+        'num_nodes': G.number_of_nodes(),
+        'node_order': _node_order_digest(G),
+        'betweenness_samples': BETWEENNESS_SAMPLES,
+        'metrics': {name: np.dtype(dtype).name for name, dtype in METRIC_DTYPES.items() if name in arrays},
+        'computed_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for name, values in arrays.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), np.asarray(values, dtype=METRIC_DTYPES[name]), allow_pickle=False)
+        np.save(os.path.join(tmp_path, f"{name}{_ORDER_SUFFIX}"), ranking_order(values), allow_pickle=False)
+    with open(os.path.join(tmp_path, _META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+    if os.path.exists(path):
+        shutil.rmtree(path, ignore_errors=True) # 节点顺序不符的旧结果
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # 另一个进程刚好先写完，使用它的结果
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+def _node_index(G):
+    row_index = getattr(G, 'row_index', None) # csr_graph.CSRGraph：共享的只读索引，不建字典
+    return row_index if row_index is not None else {node: i for i, node in enumerate(G)}
+
+def load_metrics(G, path):
+    """以内存映射方式读取已保存的指标；不存在或与图不符时返回 None。"""
+    meta_file = os.path.join(path, _META_FILE)
+    if not os.path.exists(meta_file):
+        return None
+    try:
+        with open(meta_file, encoding='utf-8') as f:
+            meta = json.load(f)
+        if (meta.get('format_version') != METRICS_FORMAT_VERSION or meta.get('num_nodes') != G.number_of_nodes()
+                or meta.get('node_order') != _node_order_digest(G)):
+            return None
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in meta['metrics']}
+        orders = {}
+        for name in arrays:
+            order_file = os.path.join(path, f"{name}{_ORDER_SUFFIX}")
+            if os.path.exists(order_file):
+                orders[name] = np.load(order_file, mmap_mode='r')
+    except (OSError, ValueError, KeyError) as e:
+        print(f"读取指标文件 {path} 时出错: {e}")
+        return None
+    return MetricsStore(arrays, _node_index(G), meta, path, orders)
+
+def load_or_compute_metrics(G, store_dir=None):
+    """
+    返回图 G 的 MetricsStore。G.graph['version'] 存在时优先读取该版本已保存的指标，
+    没有则计算一次并保存；图没有版本号时只在内存中计算。
+    """
+    version = G.graph.get('version')
+    if version is None:
+        return MetricsStore(compute_metrics(G), _node_index(G))
+    path = metrics_path(version, store_dir)
+    store = load_metrics(G, path)
+    if store is not None:
+        return store
+    start = time.perf_counter()
+    arrays = compute_metrics(G)
+    write_metrics(G, arrays, path)
+    print(f"MetricsStore: Computed metrics for graph version {version} in {time.perf_counter() - start:.2f}s, saved to {path}")
+    return load_metrics(G, path) or MetricsStore(arrays, _node_index(G))
+
+def main():
+    parser = argparse.ArgumentParser(description='为图的当前版本预计算节点指标。')
+    parser.add_argument('csv_path', nargs='?', default='三层股权穿透输出数据.csv', help='股权穿透CSV文件路径。')
+    parser.add_argument('--store-dir', default=None, help=f'指标目录（默认 {METRICS_DIR}）。')
+    args = parser.parse_args()
+    from graph_builder import build_graph
+    G = build_graph(args.csv_path)
+    store = load_or_compute_metrics(G, args.store_dir)
+    print(f"指标已就绪: {store.path or '(仅内存)'}，共 {len(store.index)} 个节点")
+
+if __name__ == '__main__':
+    main()
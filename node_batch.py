@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+批量节点查询（POST /api/nodes/batch）：一次请求取上千个节点的基本信息、指标和邻居摘要，
+不必为每个节点单独请求 /api/node/<id>。
+
+- 请求体: {"ids": [节点ID, ...], "neighbors": false, "top": 5, "sort": "percent"}（也可以直接传 ID 列表）。
+  ids 按请求顺序逐块处理，块内重复的 ID 只计算一次；不存在的 ID 单独列出。
+- 每块内的指标一次按行号从指标数组中取出（不逐个节点、逐项指标查字典）；
+  neighbors 为 true 时每个节点再给出投资方/被投资企业的数量和前 top 个（按 sort 降序），
+  排序所需的邻居 PageRank 也是整块一起取。
+- ID 数量上限为 MAX_BATCH_SIZE（环境变量 GRAPH_BATCH_MAX_IDS），超出时拒绝整个请求。
+- 输出: 普通 JSON（{"count", "found", "not_found", "nodes"}）或 NDJSON（每行一个节点，
+  不存在的节点为 {"id", "error"}），NDJSON 按块生成，边算边发送，不在内存中拼出整个响应。
+
+节点的 metrics 与 /api/node/<id> 的 metrics 相同；邻居摘要中的 percent 为原始比例（0~1 小数，未知为 None）。
+"""
+import heapq
+import os
+
+import numpy as np
+
+from node_detail import NodeQueryError, SORT_KEYS, node_metric_values
+
+MAX_BATCH_SIZE = int(os.environ.get('GRAPH_BATCH_MAX_IDS', 10000))
+STREAM_THRESHOLD = 1000 # 超过该数量且没有指定 format 时按 NDJSON 输出
+CHUNK_SIZE = 256
+DEFAULT_TOP = 5
+MAX_TOP = 100
+NDJSON_MIMETYPE = 'application/x-ndjson'
+_FLUSH_BYTES = 64 * 1024
+
+class BatchTooLargeError(NodeQueryError):
+    """ID 数量超过上限。"""
+
+def parse_batch_request(payload, max_ids=None):
+    """
+    解析请求体，返回 (ids, neighbors, top, sort)。参数不合法时抛出 NodeQueryError，
+    ID 数量超过 max_ids（默认 MAX_BATCH_SIZE）时抛出 BatchTooLargeError。
+    """
+    max_ids = MAX_BATCH_SIZE if max_ids is None else max_ids
+    if isinstance(payload, list):
+        payload = {'ids': payload}
+    if not isinstance(payload, dict):
+        raise NodeQueryError('请求体必须是 JSON 对象 {"ids": [...]} 或 ID 列表')
+    ids = payload.get('ids')
+    if not isinstance(ids, list) or not ids:
+        raise NodeQueryError("ids 必须是非空的节点ID列表")
+    if len(ids) > max_ids:
+        raise BatchTooLargeError(f"一次最多查询 {max_ids} 个节点（请求了 {len(ids)} 个）")
+    if not all(isinstance(node_id, str) for node_id in ids):
+        raise NodeQueryError("节点ID必须是字符串")
+    neighbors = payload.get('neighbors', False)
+    if not isinstance(neighbors, bool):
+        raise NodeQueryError("neighbors 必须是 true 或 false")
+    top = payload.get('top', DEFAULT_TOP)
+    if not isinstance(top, int) or isinstance(top, bool) or not 0 <= top <= MAX_TOP:
+        raise NodeQueryError(f"top 必须是 0 到 {MAX_TOP} 之间的整数")
+    sort = payload.get('sort', 'percent')
+    if sort not in SORT_KEYS:
+        raise NodeQueryError(f"不支持的排序方式: {sort}（可选 {', '.join(SORT_KEYS)}）")
+    return ids, neighbors, top, sort
+
+def batch_metric_values(metrics, node_ids):
+    """多个节点的指标 [{指标名: 值}, ...]，与逐个调用 node_detail.node_metric_values 的结果相同。"""
+    if not node_ids:
+        return []
+    if not hasattr(metrics, 'array'):
+        return [node_metric_values(metrics, n) for n in node_ids]
+    rows = np.fromiter((metrics.index[n] for n in node_ids), dtype=np.int64, count=len(node_ids))
+    columns = []
+    for name in metrics:
+        values = np.asarray(metrics.array(name))[rows]
+        valid = ~np.isnan(values) if values.dtype.kind == 'f' else np.ones(len(rows), dtype=bool)
+        columns.append((name, values.tolist(), valid.tolist()))
+    return [{name: values[i] for name, values, valid in columns if valid[i]} for i in range(len(node_ids))]
+
+def _percent_key(percent):
+    return -np.inf if percent is None else percent
+
+def _neighbor_summary(G, adjacency, node_id, top, sort, pagerank):
+    """一个方向的邻居摘要 {"count", "top": [{"id", "name", "percent"}, ...]}；同值保持图中的顺序。"""
+    neighbors = adjacency[node_id]
+    summary = {"count": len(neighbors), "top": []}
+    if not top or not neighbors:
+        return summary
+    if sort == 'percent':
+        key = lambda item: _percent_key(item[1].get('percent'))
+    elif sort == 'pagerank':
+        key = lambda item: pagerank.get(item[0], -np.inf)
+    else:
+        key = lambda item: G.degree(item[0])
+    for neighbor_id, edge_data in heapq.nlargest(top, neighbors.items(), key=key):
+        summary["top"].append({
+            "id": neighbor_id,
+            "name": G.nodes[neighbor_id].get('name', str(neighbor_id)),
+            "percent": edge_data.get('percent'),
+        })
+    return summary
+
+def _chunk_pagerank(G, metrics, node_ids):
+    """块内所有节点的邻居的 PageRank {邻居ID: 值}，一次从指标数组中取出。"""
+    neighbor_ids = list({n for node_id in node_ids for adjacency in (G.pred, G.succ) for n in adjacency[node_id]})
+    if not neighbor_ids or 'pagerank' not in metrics:
+        return {}
+    if not hasattr(metrics, 'array'):
+        column = metrics['pagerank']
+        return {n: column[n] for n in neighbor_ids if n in column}
+    rows = np.fromiter((metrics.index[n] for n in neighbor_ids), dtype=np.int64, count=len(neighbor_ids))
+    values = np.asarray(metrics.array('pagerank'))[rows].astype(np.float64).tolist()
+    return {n: v for n, v in zip(neighbor_ids, values) if v == v}
+
+def _profiles(G, metrics, node_ids, neighbors, top, sort):
+    """块内节点的信息 {节点ID: 信息字典}（node_ids 已去重且都存在）。"""
+    pagerank = _chunk_pagerank(G, metrics, node_ids) if neighbors and top and sort == 'pagerank' else None
+    profiles = {}
+    for node_id, values in zip(node_ids, batch_metric_values(metrics, node_ids)):
+        data = G.nodes[node_id]
+        profile = {
+            "id": node_id,
+            "name": data.get('name', str(node_id)),
+            "type": data.get('type', ''),
+            "level": data.get('level', ''),
+            "short_name": data.get('short_name', ''),
+            "metrics": values,
+        }
+        if neighbors:
+            profile["investors"] = _neighbor_summary(G, G.pred, node_id, top, sort, pagerank)
+            profile["investees"] = _neighbor_summary(G, G.succ, node_id, top, sort, pagerank)
+        profiles[node_id] = profile
+    return profiles
+
+def iter_batch(G, metrics, ids, neighbors=False, top=DEFAULT_TOP, sort='percent', chunk_size=CHUNK_SIZE):
+    """
+    按请求顺序逐个产生 (节点ID, 信息字典或 None)；None 表示节点不存在。
+    每 chunk_size 个 ID 一块计算，块内重复的 ID 只计算一次；只保留当前块的结果，流式输出时内存不随批量增长。
+    """
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        pending = list(dict.fromkeys(n for n in chunk if n in G.nodes))
+        computed = _profiles(G, metrics, pending, neighbors, top, sort) if pending else {}
+        for node_id in chunk:
+            yield node_id, computed.get(node_id)
+
+def batch_report(G, metrics, ids, neighbors=False, top=DEFAULT_TOP, sort='percent'):
+    """普通 JSON 输出：{"count", "found", "not_found", "nodes"}，nodes 按请求顺序（不含不存在的节点）。"""
+    nodes, not_found = [], []
+    for node_id, profile in iter_batch(G, metrics, ids, neighbors, top, sort):
+        if profile is None:
+            not_found.append(node_id)
+        else:
+            nodes.append(profile)
+    return {"count": len(ids), "found": len(nodes), "not_found": not_found, "nodes": nodes}
+
+def iter_ndjson(G, metrics, ids, dumps, neighbors=False, top=DEFAULT_TOP, sort='percent'):
+    """
+    NDJSON 输出：每行一个节点，不存在的节点为 {"id", "error"}。
+    dumps(obj) -> bytes 为编码函数；约每 64KB 产生一段，避免逐行写出。
+    """
+    buffer = []
+    size = 0
+    for node_id, profile in iter_batch(G, metrics, ids, neighbors, top, sort):
+        line = dumps(profile if profile is not None else {"id": node_id, "error": "节点不存在"}) + b"\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= _FLUSH_BYTES:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+/api/node/<node_id> 的响应构建：投资方/被投资企业列表支持游标分页、服务端排序和字段投影。
+
+- 不带 limit / cursor / sort / fields 参数时，返回与原来完全相同的结构（全部邻居、全部字段）。
+- limit: 每页条数（每个方向各一页），响应中 investors_page / investees_page 给出总数和下一页游标。
+- sort: percent / pagerank / degree，均为降序，同值保持图中的邻居顺序；不传时按图中的顺序。
+- fields: 逗号分隔的邻居字段（id 总会返回），例如 fields=name,percent；
+  只有请求了 metrics 时才逐个读取邻居的全部指标。
+- cursor: 上一页返回的游标，只返回游标所属方向的下一页；游标记录了排序方式和图版本，图更新后失效。
+- shape='table'（接口参数 format=table）: 投资方/被投资企业改为按列输出 {字段: [值...]}，
+  不再为每个邻居构建字典；percent 为原始比例（0~1 小数），metrics 为 {指标名: [值...]}，都按列向量化读取。
+
+超大节点（上万个被投资企业）的排序结果按 (图版本, 节点, 方向, 排序) 缓存，翻页不再重复排序。
+"""
+import base64
+import binascii
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+NEIGHBOR_FIELDS = ('id', 'name', 'type', 'percent', 'level', 'short_name', 'metrics', 'pagerank')
+SORT_KEYS = ('percent', 'pagerank', 'degree')
+DIRECTIONS = ('investors', 'investees')
+SHAPES = ('records', 'table')
+MAX_PAGE_SIZE = 1000
+ORDER_CACHE_SIZE = 128
+
+class NodeQueryError(ValueError):
+    """请求参数（fields / sort / limit / cursor）不合法。"""
+
+def parse_fields(value):
+    """解析 fields 参数，返回字段元组（按 NEIGHBOR_FIELDS 的顺序，总是包含 id）；为空时返回 None（全部字段）。"""
+    if not value:
+        return None
+    requested = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = requested.difference(NEIGHBOR_FIELDS)
+    if unknown:
+        raise NodeQueryError(f"未知的字段: {', '.join(sorted(unknown))}（可选 {', '.join(NEIGHBOR_FIELDS)}）")
+    requested.add('id')
+    return tuple(field for field in NEIGHBOR_FIELDS if field in requested)
+
+def encode_cursor(direction, offset, sort, version):
+    payload = json.dumps({'d': direction, 'o': offset, 's': sort, 'v': version}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, version):
+    """解析游标，返回 (方向, 偏移, 排序)；游标损坏或图版本已变化时抛出 NodeQueryError。"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        direction, offset, sort = payload['d'], int(payload['o']), payload['s']
+    except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError):
+        raise NodeQueryError("无效的游标")
+    if direction not in DIRECTIONS or offset < 0 or (sort is not None and sort not in SORT_KEYS):
+        raise NodeQueryError("无效的游标")
+    if payload.get('v') != version:
+        raise NodeQueryError("游标已过期（图数据已更新），请重新查询")
+    return direction, offset, sort
+
+def _neighbors(G, node_id, direction):
+    return G.predecessors(node_id) if direction == 'investors' else G.successors(node_id)
+
+def _edge(G, node_id, neighbor_id, direction):
+    return G.get_edge_data(neighbor_id, node_id) if direction == 'investors' else G.get_edge_data(node_id, neighbor_id)
+
+def _metric_array(metrics, name, neighbors):
+    """按邻居顺序取某项指标的数组；没有该指标时返回 None。"""
+    if name not in metrics or not hasattr(metrics, 'array'):
+        return None
+    rows = np.fromiter((metrics.index[n] for n in neighbors), dtype=np.int64, count=len(neighbors))
+    return np.asarray(metrics.array(name))[rows].astype(np.float64)
+
+def _sort_values(G, metrics, node_id, neighbors, direction, sort):
+    if sort == 'percent':
+        adjacency = G.pred[node_id] if direction == 'investors' else G.succ[node_id]
+        values = (adjacency[n].get('percent') for n in neighbors)
+        return np.fromiter((np.nan if v is None else v for v in values), dtype=np.float64, count=len(neighbors))
+    if sort == 'pagerank':
+        values = _metric_array(metrics, 'pagerank', neighbors)
+        if values is not None:
+            return values
+        column = metrics.get('pagerank', {}) if metrics else {}
+        return np.array([column.get(n, np.nan) for n in neighbors], dtype=np.float64)
+    # degree: 入度 + 出度
+    in_degree = _metric_array(metrics, 'in_degree', neighbors)
+    out_degree = _metric_array(metrics, 'out_degree', neighbors)
+    if in_degree is not None and out_degree is not None:
+        return in_degree + out_degree
+    return np.array([G.degree(n) for n in neighbors], dtype=np.float64)
+
+_order_cache = OrderedDict()
+_order_cache_lock = threading.Lock() # 多个请求线程共用排序缓存
+
+def neighbor_order(G, metrics, node_id, direction, sort):
+    """返回排好序的邻居ID列表。降序，缺失值（NaN）排在最后，同值保持图中的顺序。"""
+    version = G.graph.get('version')
+    cache_key = (version, node_id, direction, sort)
+    if version is not None:
+        with _order_cache_lock:
+            cached = _order_cache.get(cache_key)
+            if cached is not None:
+                _order_cache.move_to_end(cache_key)
+                return cached
+    neighbors = list(_neighbors(G, node_id, direction))
+    if sort is not None and len(neighbors) > 1:
+        values = _sort_values(G, metrics, node_id, neighbors, direction, sort)
+        values = np.where(np.isnan(values), -np.inf, values)
+        order = np.argsort(-values, kind='stable')
+        neighbors = [neighbors[i] for i in order.tolist()]
+    if version is not None:
+        with _order_cache_lock:
+            _order_cache[cache_key] = neighbors
+            _order_cache.move_to_end(cache_key)
+            while len(_order_cache) > ORDER_CACHE_SIZE:
+                _order_cache.popitem(last=False)
+    return neighbors
+
+def node_metric_values(metrics, node_id):
+    """节点的全部指标 {指标名: 值}，没有计算成功的指标不出现。"""
+    return {name: metrics[name][node_id] for name in metrics if node_id in metrics[name]}
+
+def neighbor_record(G, metrics, node_id, neighbor_id, direction, fields=None):
+    """构建一个投资方/被投资企业记录；fields 为 None 时返回全部字段（与原来的结构相同）。"""
+    fields = fields or NEIGHBOR_FIELDS
+    data = G.nodes[neighbor_id]
+    record = {}
+    for field in fields:
+        if field == 'id':
+            record['id'] = neighbor_id
+        elif field == 'name':
+            record['name'] = data.get('name', str(neighbor_id))
+        elif field == 'percent':
+            edge_data = _edge(G, node_id, neighbor_id, direction)
+            percent = edge_data.get('percent', None) if edge_data else None
+            record['percent'] = f"{percent*100:.2f}%" if percent is not None else "未知%"
+        elif field == 'metrics':
+            record['metrics'] = node_metric_values(metrics, neighbor_id)
+        elif field == 'pagerank':
+            # 确保对象有pagerank字段，这是前端重点使用的
+            pagerank = metrics['pagerank'] if 'pagerank' in metrics else {}
+            record['pagerank'] = pagerank[neighbor_id] if neighbor_id in pagerank else None
+        else:
+            record[field] = data.get(field, '')
+    return record
+
+def _metric_column(metrics, name, neighbors):
+    """某项指标按邻居顺序的值列表，没有值时为 None。"""
+    values = _metric_array(metrics, name, neighbors) if neighbors else None
+    if values is None:
+        column = metrics[name] if name in metrics else {}
+        return [column[n] if n in column else None for n in neighbors]
+    if np.asarray(metrics.array(name)).dtype.kind in 'iu':
+        return values.astype(np.int64).tolist()
+    return [None if v != v else v for v in values.tolist()]
+
+def neighbor_table(G, metrics, node_id, neighbors, direction, fields=None):
+    """
+    按列构建一页投资方/被投资企业（format=table）：{字段: [值...]}，各列与 neighbors 顺序一致。
+    percent 为原始比例（未知为 None），pagerank 和 metrics 直接从指标数组按行号取值。
+    """
+    fields = fields or NEIGHBOR_FIELDS
+    table = {}
+    attrs = None
+    if any(field in fields for field in ('name', 'type', 'level', 'short_name')):
+        attrs = [G.nodes[n] for n in neighbors]
+    for field in fields:
+        if field == 'id':
+            table['id'] = list(neighbors)
+        elif field == 'name':
+            table['name'] = [data.get('name', str(n)) for n, data in zip(neighbors, attrs)]
+        elif field == 'percent':
+            adjacency = G.pred[node_id] if direction == 'investors' else G.succ[node_id]
+            percents = {n: data.get('percent') for n, data in adjacency.items()}
+            table['percent'] = [percents.get(n) for n in neighbors]
+        elif field == 'metrics':
+            table['metrics'] = {name: _metric_column(metrics, name, neighbors) for name in metrics}
+        elif field == 'pagerank':
+            table['pagerank'] = _metric_column(metrics, 'pagerank', neighbors) if 'pagerank' in metrics \
+                else [None] * len(neighbors)
+        else:
+            table[field] = [data.get(field, '') for data in attrs]
+    return table
+
+def node_detail(G, metrics, node_id, limit=None, sort=None, fields=None, cursor=None, shape=None):
+    """
+    构建 /api/node/<node_id> 的响应字典。
+
+    参数:
+    G (nx.DiGraph): 图。
+    metrics (Mapping): 节点指标（metrics_store.MetricsStore 或 {指标名: {节点ID: 值}}）。
+    node_id: 节点ID（调用方保证存在）。
+    limit (int): 每页条数；为 None 且没有游标时不分页。
+    sort (str): percent / pagerank / degree；为 None 时按图中的顺序。
+    fields (str): 逗号分隔的邻居字段，为空时返回全部字段。
+    cursor (str): 上一页的游标；给出时只返回游标所属方向的下一页，排序方式以游标为准。
+    shape (str): 'records'（默认，每个邻居一个对象）或 'table'（按列输出）。
+
+    参数不合法时抛出 NodeQueryError。
+    """
+    if sort is not None and sort not in SORT_KEYS:
+        raise NodeQueryError(f"不支持的排序方式: {sort}（可选 {', '.join(SORT_KEYS)}）")
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        raise NodeQueryError(f"limit 必须在 1 到 {MAX_PAGE_SIZE} 之间")
+    if shape is not None and shape not in SHAPES:
+        raise NodeQueryError(f"不支持的输出格式: {shape}（可选 {', '.join(SHAPES)}）")
+    projection = parse_fields(fields)
+    version = G.graph.get('version')
+    directions = DIRECTIONS
+    offset = 0
+    if cursor:
+        direction, offset, sort = decode_cursor(cursor, version)
+        directions = (direction,)
+    paginated = limit is not None or bool(cursor)
+    if paginated and limit is None:
+        limit = MAX_PAGE_SIZE
+
+    node_data = G.nodes[node_id]
+    result = {
+        "id": node_id,
+        "name": node_data.get('name', str(node_id)),
+        "type": node_data.get('type', ''),
+        "level": node_data.get('level', ''),
+        "short_name": node_data.get('short_name', ''),
+        "investors": [],  # 投资方
+        "investees": [],  # 被投资企业
+        "metrics": node_metric_values(metrics, node_id)  # 节点指标
+    }
+    for direction in DIRECTIONS:
+        if direction not in directions:
+            del result[direction] # 游标只翻一个方向
+    for direction in directions:
+        if not paginated and sort is None:
+            neighbors = list(_neighbors(G, node_id, direction))
+        else:
+            neighbors = neighbor_order(G, metrics, node_id, direction, sort)
+        page = neighbors[offset:offset + limit] if paginated else neighbors
+        if shape == 'table':
+            result[direction] = neighbor_table(G, metrics, node_id, page, direction, projection)
+        else:
+            result[direction] = [neighbor_record(G, metrics, node_id, n, direction, projection) for n in page]
+        if paginated:
+            end = offset + len(page)
+            result[f"{direction}_page"] = {
+                "total": len(neighbors),
+                "offset": offset,
+                "limit": limit,
+                "sort": sort,
+                "next_cursor": encode_cursor(direction, end, sort, version) if end < len(neighbors) else None,
+            }
+    return result
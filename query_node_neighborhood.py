@@ -4,6 +4,7 @@ import networkx as nx
 import matplotlib.pyplot as plt
 from graph_builder import build_graph
 from font_config import get_font_properties
+from search_index import get_name_index
 import os # For path operations
 
 # 确保输出目录存在
@@ -12,23 +13,22 @@ os.makedirs('outputs/images', exist_ok=True)
 os.makedirs('outputs/temp', exist_ok=True)
 
 def find_node_by_name(graph, name_query):
-    """在图中根据'name'属性查找节点ID。"""
-    for node_id, data in graph.nodes(data=True):
-        if data.get('name') == name_query:
-            return node_id
+    """在图中根据'name'属性查找节点ID（使用名称索引，见 search_index.py）。"""
+    index = get_name_index(graph)
+    node_id = index.lookup(name_query)
+    if node_id is not None:
+        return node_id
     # Consider partial match if exact match fails
-    partial_matches = []
-    for node_id, data in graph.nodes(data=True):
-        if name_query.lower() in data.get('name', '').lower():
-            partial_matches.append((data.get('name'), node_id))
-    if partial_matches:
-        if len(partial_matches) == 1:
-            print(f"提示: 未找到精确匹配，但找到一个部分匹配: '{partial_matches[0][0]}' (ID: {partial_matches[0][1]}) 将使用此节点。")
-            return partial_matches[0][1]
+    total, partial_matches = index.search(name_query, limit=5)
+    if total:
+        if total == 1:
+            name = graph.nodes[partial_matches[0]].get('name')
+            print(f"提示: 未找到精确匹配，但找到一个部分匹配: '{name}' (ID: {partial_matches[0]}) 将使用此节点。")
+            return partial_matches[0]
         else:
-            print(f"提示: 未找到精确匹配，但找到多个部分匹配。请使用更精确的名称:")
-            for name, nid in partial_matches[:5]: # Show first 5 partial matches
-                print(f"  - '{name}' (ID: {nid})")
+            print(f"提示: 未找到精确匹配，但找到 {total} 个部分匹配。请使用更精确的名称:")
+            for nid in partial_matches: # Show first 5 partial matches
+                print(f"  - '{graph.nodes[nid].get('name')}' (ID: {nid})")
             return None
     return None
 
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Flask 接口的响应缓存：按 (接口, 路径参数, 查询参数, 图版本) 缓存序列化好的响应体，LRU 淘汰。
+
+- 每个响应带 ETag（图版本 + 响应体摘要）和 Cache-Control: no-cache，浏览器再次请求时带上
+  If-None-Match，内容未变就直接返回 304，不再传输响应体。
+- 图重新加载时调用 clear()：整张表一次性替换并递增代号，代号也是缓存键的一部分，
+  正在进行中的旧请求写回的结果不会被新图的请求命中。
+- 只缓存 200 响应；错误响应（400/404）每次照常计算。
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import make_response, request
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024 # 缓存的响应体总大小上限
+
+class ResponseCache:
+    """
+    线程安全的 LRU 响应缓存。
+
+    参数:
+    max_entries (int): 最多缓存的响应个数。
+    max_bytes (int): 缓存的响应体总字节数上限，超过时淘汰最久未使用的响应；单个响应超过上限的一半时不缓存。
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        """图重新加载后调用：丢弃全部缓存。"""
+        with self._lock:
+            self._entries = OrderedDict()
+            self._bytes = 0
+            self.generation += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, version):
+        """当前请求的缓存键。"""
+        view_args = tuple(sorted((request.view_args or {}).items()))
+        query = tuple(sorted(request.args.items(multi=True)))
+        return (self.generation, version, request.endpoint, view_args, query)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        size = len(entry[0])
+        if size > self.max_bytes // 2:
+            return
+        with self._lock:
+            if key[0] != self.generation:
+                return # 计算期间图已重新加载，结果作废
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[0])
+            self._entries[key] = entry
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted[0])
+
+    def serve(self, version, compute):
+        """
+        返回当前请求的响应：命中缓存时直接返回（或 304），否则调用 compute() 生成响应并缓存。
+        compute 返回 Flask 视图函数的返回值（Response 或 (Response, 状态码)）。
+        """
+        key = self.key(version)
+        entry = self.get(key)
+        if entry is None:
+            response = make_response(compute())
+            if response.status_code != 200 or response.direct_passthrough:
+                return response
+            body = response.get_data()
+            etag = f'{version or "g" + str(key[0])}-{hashlib.blake2b(body, digest_size=8).hexdigest()}'
+            entry = (body, response.mimetype, etag)
+            self.put(key, entry)
+        body, mimetype, etag = entry
+        if request.if_none_match.contains_weak(etag): # 压缩后的响应带弱 ETag（见 api_serialization.py）
+            response = make_response('', 304)
+        else:
+            response = make_response(body)
+            response.mimetype = mimetype
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache' # 允许浏览器缓存，但每次都用 ETag 验证
+        return response
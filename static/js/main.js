@@ -9,6 +9,8 @@ const app = new Vue({
             searchQuery: '',
             searchResults: [],
             searchError: null,
+            // 输入联想请求序号：只采用最近一次请求的结果
+            suggestSeq: 0,
             // 当前选中公司
             currentCompany: null,
             // 投资方详情相关
@@ -73,6 +75,34 @@ const app = new Vue({
                 });
         },
         
+        // 输入联想：el-autocomplete 已做防抖，这里丢弃过期的响应
+        fetchSuggestions(queryString, cb) {
+            const query = (queryString || '').trim();
+            const seq = ++this.suggestSeq;
+            if (!query) {
+                cb([]);
+                return;
+            }
+            axios.get('/api/suggest', { params: { q: query, k: 10 } })
+                .then(response => {
+                    if (seq === this.suggestSeq) {
+                        cb(response.data.suggestions || []);
+                    }
+                })
+                .catch(error => {
+                    console.error('获取输入联想失败:', error);
+                    if (seq === this.suggestSeq) {
+                        cb([]);
+                    }
+                });
+        },
+        
+        // 选择输入联想中的公司
+        selectSuggestion(item) {
+            this.searchQuery = item.name;
+            this.selectCompanyById(item.id);
+        },
+        
         // 选择搜索结果中的公司
         selectCompany(row) {
             this.selectCompanyById(row.id);
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+输入联想（自动补全）索引：按前缀返回权重最高的 k 个名称。
+
+- 检索键为节点 name 和 short_name 的规范化形式，按字典序排成有序数组；
+  前缀 p 的全部补全是有序数组中的一段连续区间 [bisect_left(p), bisect_left(p + 最大字符))。
+- 区间内按权重（PageRank 或入度，来自 metrics_store 预计算的指标）取前 k 个：
+  1~2个字的前缀区间很大，建索引时预先算好每个这类前缀的前 PRECOMPUTED_TOP_K 个；
+  更长的前缀区间通常很小，查询时用 argpartition 现取。
+- 查询有硬性时间预算：前缀补全不足 k 个时，在剩余预算内用名称索引补充"包含"匹配，
+  超出预算就返回已有结果并标记 truncated。
+"""
+import bisect
+import time
+import weakref
+
+import numpy as np
+
+from search_index import get_name_index, normalize_name
+
+WEIGHT_METRICS = ('pagerank', 'in_degree')
+DEFAULT_WEIGHT = 'pagerank'
+PRECOMPUTED_PREFIX_LENGTH = 2  # 预先计算前 k 个补全的前缀长度上限
+PRECOMPUTED_TOP_K = 20
+SCAN_LIMIT = 200000            # 查询时直接在区间内选前 k 个的区间长度上限
+DEFAULT_BUDGET_MS = 50
+_MAX_CHAR = '\U0010ffff'
+
+def _top_positions(weights, lo, hi, k):
+    """有序数组区间 [lo, hi) 内按权重降序（同权重按字典序）的前 k 个下标。"""
+    if hi - lo <= k:
+        chunk = np.arange(lo, hi)
+    else:
+        chunk = lo + np.argpartition(-weights[lo:hi], k - 1)[:k]
+    return chunk[np.lexsort((chunk, -weights[chunk]))]
+
+class SuggestIndex:
+    """
+    节点名称的前缀补全索引。
+
+    参数:
+    graph (nx.DiGraph): 建索引的图。
+    weights (array-like): 按节点顺序排列的权重（如 PageRank）；为 None 时按入度。
+    """
+
+    def __init__(self, graph, weights=None):
+        self.node_ids = []
+        entries = []
+        for position, (node_id, data) in enumerate(graph.nodes(data=True)):
+            self.node_ids.append(node_id)
+            keys = set()
+            for attr in ('name', 'short_name'):
+                value = data.get(attr)
+                if value is not None and value != '':
+                    keys.add(normalize_name(str(value)))
+            keys.discard('')
+            entries.extend((key, position) for key in keys)
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.key_nodes = np.fromiter((position for _, position in entries), dtype=np.int32, count=len(entries))
+        if weights is None:
+            weights = np.fromiter((d for _, d in graph.in_degree()), dtype=np.float64, count=len(self.node_ids))
+        node_weights = np.nan_to_num(np.asarray(weights, dtype=np.float64), nan=0.0)
+        if len(node_weights) != len(self.node_ids):
+            raise ValueError(f"权重数组长度 {len(node_weights)} 与节点数 {len(self.node_ids)} 不一致")
+        self.weights = node_weights[self.key_nodes] if len(entries) else np.zeros(0)
+        self._precompute()
+
+    def _precompute(self):
+        # 1~2个字的前缀：相同前缀的检索键在有序数组中相邻，逐段取前 k 个
+        self.top = {}
+        for length in range(1, PRECOMPUTED_PREFIX_LENGTH + 1):
+            start = 0
+            keys = self.keys
+            while start < len(keys):
+                prefix = keys[start][:length]
+                if len(prefix) < length:
+                    start += 1
+                    continue
+                end = bisect.bisect_left(keys, prefix + _MAX_CHAR, start)
+                self.top[prefix] = _top_positions(self.weights, start, end, PRECOMPUTED_TOP_K).astype(np.int32)
+                start = end
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _range(self, prefix):
+        lo = bisect.bisect_left(self.keys, prefix)
+        hi = bisect.bisect_left(self.keys, prefix + _MAX_CHAR, lo)
+        return lo, hi
+
+    def complete_positions(self, prefix, k):
+        """返回 (前缀的补全总数, 权重最高的检索键下标数组)；结果中同一节点可能出现多次。"""
+        lo, hi = self._range(prefix)
+        if hi <= lo:
+            return 0, np.empty(0, dtype=np.int32)
+        top = self.top.get(prefix)
+        if top is not None and k <= PRECOMPUTED_TOP_K:
+            return hi - lo, top
+        if hi - lo > SCAN_LIMIT:
+            # 区间太大又没有预先算好：用前两个字的预算结果过滤，只在个别超长前缀上发生
+            top = self.top.get(prefix[:PRECOMPUTED_PREFIX_LENGTH], np.empty(0, dtype=np.int32))
+            keys = self.keys
+            return hi - lo, np.array([i for i in top.tolist() if keys[i].startswith(prefix)], dtype=np.int32)
+        return hi - lo, _top_positions(self.weights, lo, hi, k)
+
+    def suggest(self, query, k=10, graph=None, budget_ms=DEFAULT_BUDGET_MS):
+        """
+        返回 {'suggestions': [{'id', 'text', 'match'}...], 'total': 前缀补全总数, 'truncated': bool}。
+        match 为 'prefix' 或 'contains'（不足 k 个时用名称索引补充的包含匹配，需要传入 graph）。
+        """
+        deadline = time.perf_counter() + budget_ms / 1000.0
+        prefix = normalize_name(query)
+        result = {'suggestions': [], 'total': 0, 'truncated': False}
+        if not prefix or k <= 0:
+            return result
+        total, positions = self.complete_positions(prefix, k * 2)
+        result['total'] = total
+        seen = set()
+        suggestions = result['suggestions']
+        for i in positions.tolist():
+            position = int(self.key_nodes[i])
+            if position in seen:
+                continue
+            seen.add(position)
+            suggestions.append({'id': self.node_ids[position], 'text': self.keys[i], 'match': 'prefix'})
+            if len(suggestions) >= k:
+                break
+        if len(suggestions) >= k or graph is None:
+            return result
+        if time.perf_counter() >= deadline:
+            result['truncated'] = True
+            return result
+        # 前缀补全不够时用名称中间的匹配补足（名称索引有候选缓存，连续输入时很快）
+        name_index = get_name_index(graph)
+        _, contains = name_index.search_positions(prefix, limit=k + len(suggestions))
+        for position in contains.tolist():
+            if time.perf_counter() >= deadline:
+                result['truncated'] = True
+                break
+            if position in seen:
+                continue
+            seen.add(position)
+            suggestions.append({'id': name_index.node_ids[position], 'text': name_index.normalized[position], 'match': 'contains'})
+            if len(suggestions) >= k:
+                break
+        return result
+
+_indexes = weakref.WeakKeyDictionary()
+
+def get_suggest_index(graph, weights=None, weight_name=DEFAULT_WEIGHT):
+    """
+    返回图的补全索引（按 weight_name 分别缓存），图的版本号或节点数变化后自动重建。
+    weights 为按节点顺序的权重数组，只在需要新建索引时使用。
+    """
+    stamp = (graph.graph.get('version'), graph.number_of_nodes())
+    entry = _indexes.get(graph)
+    if entry is None or entry[0] != stamp:
+        entry = _indexes[graph] = (stamp, {})
+    index = entry[1].get(weight_name)
+    if index is None:
+        index = entry[1][weight_name] = SuggestIndex(graph, weights)
+    return index
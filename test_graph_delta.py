@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+graph_delta 的回归测试：应用 delta 后的图必须与用更新后的行表完整重建的图相同。
+
+运行: python -m pytest -q test_graph_delta.py
+"""
+import os
+
+import pandas as pd
+import pytest
+
+import graph_builder
+import graph_delta
+
+CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '三层股权穿透输出数据.csv')
+
+@pytest.fixture(scope='module')
+def rows():
+    return graph_delta.read_rows(CSV_PATH)[0]
+
+def _build(rows):
+    return graph_builder._build_graph_vectorized(rows)
+
+def _delta(rows, op):
+    delta = rows.copy()
+    delta.insert(0, 'op', op)
+    return delta
+
+def _apply(rows, delta):
+    G = _build(rows)
+    touched, new_rows = graph_delta.apply_delta_to_graph(G, delta, rows)
+    return G, touched, new_rows
+
+def _assert_same_graph(G, expected):
+    assert dict(G.nodes(data=True)) == dict(expected.nodes(data=True))
+    assert {(u, v): data for u, v, data in G.edges(data=True)} == \
+           {(u, v): data for u, v, data in expected.edges(data=True)}
+
+def test_resend_all_rows_as_change_leaves_graph_identical(rows):
+    G, touched, new_rows = _apply(rows, _delta(rows, 'change'))
+    expected = _build(rows)
+    _assert_same_graph(G, expected)
+    assert list(G.edges) == list(expected.edges)
+    assert touched == set()
+    pd.testing.assert_frame_equal(new_rows, rows)
+
+def test_change_keeps_first_parent_edge_and_last_main_row(rows):
+    # 第25、38行是同一股东对同一企业的两行（十大股东/工商股东），第45、46行的节点在后面还有主行
+    changed = rows.iloc[[25, 38, 45, 46]].copy()
+    changed['short_name'] = '变更后简称'
+    G, touched, new_rows = _apply(rows, _delta(changed, 'change'))
+    expected_rows = rows.copy()
+    expected_rows.loc[changed.index, 'short_name'] = '变更后简称'
+    _assert_same_graph(G, _build(expected_rows))
+    pd.testing.assert_frame_equal(new_rows, expected_rows)
+    assert touched
+
+@pytest.mark.parametrize('position', range(0, 117, 3))
+def test_change_dropping_children_matches_rebuild(rows, position):
+    changed = rows.iloc[[position]].copy()
+    changed['children'] = '[]'
+    G, _, new_rows = _apply(rows, _delta(changed, 'change'))
+    expected_rows = rows.copy()
+    expected_rows.loc[position, 'children'] = '[]'
+    _assert_same_graph(G, _build(expected_rows))
+    pd.testing.assert_frame_equal(new_rows, expected_rows)
+
+@pytest.mark.parametrize('position', range(117))
+def test_remove_matches_rebuild(rows, position):
+    G, _, new_rows = _apply(rows, _delta(rows.iloc[[position]], 'remove'))
+    expected_rows = rows.drop(index=position).reset_index(drop=True)
+    _assert_same_graph(G, _build(expected_rows))
+    pd.testing.assert_frame_equal(new_rows, expected_rows)
+
+def test_add_appends_row(rows):
+    parent = rows.iloc[0]
+    added = pd.DataFrame([{
+        'eid': 'q_test_new_shareholder', 'name': '测试新增股东有限公司', 'type': 'E', 'level': '1',
+        'amount': '100万元', 'percent': '5%', 'sh_type': '工商股东', 'parent_id': parent['eid'],
+        'children': "[{'eid': 'q_test_grand', 'name': '测试孙公司', 'percent': '100%', 'amount': '', 'sh_type': '', "
+                    "'children': [{'name': '测试自然人', 'percent': '60%'}]}]",
+    }], columns=rows.columns)
+    G, touched, new_rows = _apply(rows, _delta(added, 'add'))
+    expected_rows = pd.concat([rows, added], ignore_index=True)
+    _assert_same_graph(G, _build(expected_rows))
+    assert {'q_test_new_shareholder', 'q_test_grand', '测试自然人', parent['eid']} <= touched
+
+def test_remove_then_add_moves_row_to_end(rows):
+    row = rows.iloc[[52]]
+    G, _, new_rows = _apply(rows, pd.concat([_delta(row, 'remove'), _delta(row, 'add')], ignore_index=True))
+    expected_rows = pd.concat([rows.drop(index=52), row], ignore_index=True)
+    _assert_same_graph(G, _build(expected_rows))
+    pd.testing.assert_frame_equal(new_rows, expected_rows, check_dtype=False)
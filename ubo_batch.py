@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+全图最终受益人（UBO）批量计算。
+
+CSV 中的 actl_cntr_name / actl_cntr_pct 只有 level 0 的行才有；这里对图中每一家有股东的企业计算最终受益人：
+1. 由边的 percent 构建稀疏邻接矩阵 A（scipy.sparse，A[i, j] = i 对 j 的直接持股比例）；
+2. 综合持股矩阵 O = A + A^2 + A^3 + ...（截断的 Neumann 级数，即 (I - A)^-1 - I）：
+   逐次计算 P_k = P_(k-1) A，每步丢弃小于 threshold 的项保持稀疏，P_k 全部低于阈值或达到 depth 时停止；
+   有交叉持股时级数同样收敛（环上比例之积小于 1）；
+3. 最终受益人为没有上游股东的节点（自然人或顶层企业），只需计算这些行（O 的行子集，从 A 的对应行开始迭代），
+   每家企业取综合持股比例最高的前 top 个，
+   写入列式文件（安装了 pyarrow 时为 parquet，否则为 CSV）；
+4. 与 CSV 中已有的 actl_cntr_* 列对照，输出一致率。
+
+用法:
+    python ubo_batch.py
+    python ubo_batch.py 三层股权穿透输出数据.csv --top 5 --depth 30 --output outputs/ubo/ubo.parquet
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import scipy.sparse as sp
+except ImportError:
+    sp = None
+
+UBO_DIR = os.path.join('outputs', 'ubo')
+DEFAULT_TOP = 5
+DEFAULT_DEPTH = 30
+DEFAULT_THRESHOLD = 1e-6
+PERCENT_TOLERANCE = 0.01 # 与 actl_cntr_pct 对照时允许的比例误差（1个百分点）
+
+def adjacency_matrix(G, nodes=None):
+    """
+    返回 (A, nodes)：A 为 CSR 稀疏矩阵，A[i, j] 为节点 i 对节点 j 的直接持股比例；percent 未知的边不计入。
+    """
+    if sp is None:
+        raise ImportError("UBO 批量计算需要 scipy: pip install scipy")
+    nodes = list(G) if nodes is None else nodes
+    index = {node: i for i, node in enumerate(nodes)}
+    rows, cols, data = [], [], []
+    for u, v, percent in G.edges(data='percent'):
+        if isinstance(percent, (int, float)) and percent > 0 and u != v:
+            rows.append(index[u])
+            cols.append(index[v])
+            data.append(percent)
+    n = len(nodes)
+    A = sp.csr_matrix((np.array(data, dtype=np.float64), (np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64))),
+                      shape=(n, n))
+    return A, nodes
+
+def _prune(M, threshold):
+    M.data[M.data < threshold] = 0.0
+    M.eliminate_zeros()
+    return M
+
+def integrated_ownership(A, depth=DEFAULT_DEPTH, threshold=DEFAULT_THRESHOLD, rows=None):
+    """
+    截断的 Neumann 级数 O = A + A^2 + ... + A^depth，每步丢弃小于 threshold 的项。
+    rows 给出时只计算这些行（例如只计算最终受益人对各企业的持股），计算量和内存随之减少。
+
+    返回:
+    (O, info): O 为 CSR 矩阵（给出 rows 时为 len(rows) 行）；info = {'iterations', 'converged', 'residual_max', 'nnz'}。
+    """
+    A = A.tocsr()
+    O = (A if rows is None else A[rows]).copy()
+    P = O.copy()
+    iterations = 1
+    converged = P.nnz == 0
+    while not converged and iterations < depth:
+        P = _prune(P @ A, threshold)
+        iterations += 1
+        if P.nnz == 0:
+            converged = True
+            break
+        O = O + P
+    residual_max = 0.0 if converged or P.nnz == 0 else float(P.data.max())
+    return O.tocsr(), {'iterations': iterations, 'converged': converged, 'residual_max': residual_max, 'nnz': O.nnz}
+
+def top_owners(O, owner_rows, top=DEFAULT_TOP, min_stake=0.0):
+    """
+    每家企业（列）综合持股比例最高的前 top 个最终受益人。O 的第 i 行对应节点 owner_rows[i]。
+
+    返回:
+    (companies, owners, stakes, ranks) 四个等长数组（节点编号），按企业、名次排列。
+    """
+    O = O.tocoo()
+    rows = np.asarray(owner_rows, dtype=np.int64)[O.row]
+    keep = (O.data > 0) & (O.data >= min_stake) & (rows != O.col)
+    rows, cols, values = rows[keep], O.col[keep], O.data[keep]
+    # 按 (企业, 比例降序, 受益人编号) 排序后，每组取前 top 个
+    order = np.lexsort((rows, -values, cols))
+    rows, cols, values = rows[order], cols[order], values[order]
+    if len(cols) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0), empty
+    starts = np.flatnonzero(np.r_[True, cols[1:] != cols[:-1]])
+    group_start = np.repeat(starts, np.diff(np.r_[starts, len(cols)]))
+    ranks = np.arange(len(cols)) - group_start
+    selected = ranks < top
+    return cols[selected], rows[selected], values[selected], ranks[selected] + 1
+
+def compute_ubo(G, top=DEFAULT_TOP, depth=DEFAULT_DEPTH, threshold=DEFAULT_THRESHOLD, min_stake=0.0):
+    """
+    计算图中每家有股东的企业的前 top 个最终受益人。
+
+    返回:
+    (pd.DataFrame, info): DataFrame 列为 company_id, company_name, rank, ubo_id, ubo_name, ubo_type, stake。
+    """
+    started = time.perf_counter()
+    A, nodes = adjacency_matrix(G)
+    # 最终受益人：没有上游股东的节点；只计算这些行
+    in_degree = np.fromiter((d for _, d in G.in_degree(nodes)), dtype=np.int64, count=len(nodes))
+    owner_rows = np.flatnonzero(in_degree == 0)
+    O, info = integrated_ownership(A, depth, threshold, rows=owner_rows)
+    companies, owners, stakes, ranks = top_owners(O, owner_rows, top, min_stake)
+    names = [G.nodes[node].get('name', str(node)) for node in nodes]
+    types = [G.nodes[node].get('type', '') for node in nodes]
+    take = lambda values, positions: [values[i] for i in positions.tolist()]
+    df = pd.DataFrame({
+        'company_id': take(nodes, companies),
+        'company_name': take(names, companies),
+        'rank': ranks.astype(np.int32),
+        'ubo_id': take(nodes, owners),
+        'ubo_name': take(names, owners),
+        'ubo_type': take(types, owners),
+        'stake': stakes,
+    })
+    info.update({
+        'nodes': len(nodes),
+        'edges': A.nnz,
+        'companies': int(len(np.unique(companies))),
+        'rows': len(df),
+        'elapsed': round(time.perf_counter() - started, 3),
+    })
+    return df, info
+
+def write_ubo(df, output_path, format=None):
+    """写出结果：format 为 'parquet' 或 'csv'，默认按扩展名；写 parquet 缺少 pyarrow/fastparquet 时改写 CSV。返回实际路径。"""
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    if format is None:
+        format = 'csv' if output_path.endswith('.csv') else 'parquet'
+    if format == 'parquet':
+        try:
+            df.to_parquet(output_path, index=False)
+            return output_path
+        except ImportError:
+            output_path = os.path.splitext(output_path)[0] + '.csv'
+            print(f"UBOBatch: No parquet engine installed (pip install pyarrow), writing CSV to {output_path} instead.")
+    df.to_csv(output_path, index=False, encoding='utf-8-sig')
+    return output_path
+
+def _parse_pct(value):
+    if not isinstance(value, str):
+        return None
+    value = value.strip().rstrip('%')
+    try:
+        return float(value) / 100
+    except ValueError:
+        return None
+
+def validate_against_csv(df, csv_path, top=DEFAULT_TOP):
+    """
+    与 CSV 中的 actl_cntr_name / actl_cntr_pct 对照（只有 level 0 的行有这两列）。
+
+    返回:
+    dict: checked（可对照的企业数）、top1_name（第一名受益人与实际控制人同名）、in_top（实际控制人在前 top 名内）、
+          pct_match（同名且比例误差不超过 PERCENT_TOLERANCE）、mismatches（不一致的前20条）。
+    """
+    import graph_builder
+    raw = None
+    for encoding in graph_builder._sniff_encodings(csv_path):
+        try:
+            raw = pd.read_csv(csv_path, encoding=encoding, dtype=str, na_values=['\\N'])
+            break
+        except UnicodeDecodeError:
+            continue
+    if raw is None or 'actl_cntr_name' not in raw.columns:
+        return {'checked': 0}
+    raw = raw[raw['actl_cntr_name'].notna() & (raw['actl_cntr_name'] != '')]
+    raw = raw.assign(node_id=raw['eid'].where(raw['eid'].notna() & (raw['eid'] != ''), raw['name']))
+    raw = raw.drop_duplicates('node_id')
+    by_company = {company: group for company, group in df.groupby('company_id', sort=False)}
+    checked = top1 = in_top = pct_match = 0
+    mismatches = []
+    for row in raw.itertuples(index=False):
+        group = by_company.get(row.node_id)
+        if group is None:
+            mismatches.append({'company_id': row.node_id, 'company_name': row.name,
+                               'expected': row.actl_cntr_name, 'computed': None})
+            checked += 1
+            continue
+        checked += 1
+        expected_pct = _parse_pct(row.actl_cntr_pct)
+        names = group['ubo_name'].tolist()
+        if names[0] == row.actl_cntr_name:
+            top1 += 1
+        if row.actl_cntr_name in names[:top]:
+            in_top += 1
+            stake = group['stake'].iloc[names.index(row.actl_cntr_name)]
+            if expected_pct is not None and abs(stake - expected_pct) <= PERCENT_TOLERANCE:
+                pct_match += 1
+                continue
+        mismatches.append({'company_id': row.node_id, 'company_name': row.name, 'expected': row.actl_cntr_name,
+                           'expected_pct': expected_pct, 'computed': names[0], 'computed_pct': float(group['stake'].iloc[0])})
+    return {'checked': checked, 'top1_name': top1, 'in_top': in_top, 'pct_match': pct_match, 'mismatches': mismatches[:20]}
+
+def main():
+    parser = argparse.ArgumentParser(description='全图最终受益人（UBO）批量计算。')
+    parser.add_argument('csv_path', nargs='?', default='三层股权穿透输出数据.csv', help='股权穿透CSV文件路径。')
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP, help='每家企业保留的受益人个数（默认 %(default)s）。')
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH, help='级数最多项数/穿透层数（默认 %(default)s）。')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='剪枝阈值（默认 %(default)s）。')
+    parser.add_argument('--min-stake', type=float, default=0.0, help='只输出综合持股比例不低于该值的受益人。')
+    parser.add_argument('--output', default=None, help=f'输出文件（.parquet 或 .csv，默认 {UBO_DIR}/ubo_<图版本>.parquet）。')
+    parser.add_argument('--no-validate', action='store_true', help='不与 actl_cntr_* 列对照。')
+    args = parser.parse_args()
+    from graph_builder import build_graph
+    G = build_graph(args.csv_path)
+    df, info = compute_ubo(G, args.top, args.depth, args.threshold, args.min_stake)
+    output = args.output or os.path.join(UBO_DIR, f"ubo_{G.graph.get('version', 'latest')}.parquet")
+    output = write_ubo(df, output)
+    print(f"UBOBatch: {info['companies']} companies, {info['rows']} rows written to {output} "
+          f"({info['nodes']} nodes, {info['edges']} edges, {info['iterations']} iterations, "
+          f"converged={info['converged']}, {info['elapsed']}s)")
+    if not args.no_validate:
+        report = validate_against_csv(df, args.csv_path, args.top)
+        checked = report['checked']
+        if not checked:
+            print("CSV 中没有 actl_cntr_name 列或没有可对照的行。")
+            return
+        print(f"与 actl_cntr_* 对照: {checked} 家企业，第一名同名 {report['top1_name']}，"
+              f"在前{args.top}名内 {report['in_top']}，同名且比例一致 {report['pct_match']}")
+        for item in report['mismatches']:
+            print(f"  - {item}")
+
+if __name__ == '__main__':
+    main()
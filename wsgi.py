@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+"""
+多进程部署入口：在 fork 工作进程之前加载一次图，所有工作进程共享同一份只读数据。
+
+默认开启只读共享模式（GRAPH_SHARED_MEMORY=1）：图从构建缓存快照内存映射读取（csr_graph.CSRGraph），
+指标同样内存映射；名称索引等在父进程中建好后 gc.freeze()。例如:
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+    GRAPH_CSV_PATH=新数据.csv gunicorn -w 8 --preload -b 0.0.0.0:8888 wsgi:application
+
+必须以 preload（在父进程中导入本模块）方式启动，否则每个工作进程会各自加载一次。
+"""
+import os
+
+os.environ.setdefault('GRAPH_SHARED_MEMORY', '1')
+
+import app as app_module
+
+app_module.preload()
+application = app_module.app
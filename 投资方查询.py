@@ -1,6 +1,8 @@
 import sys
 import networkx as nx
 from graph_builder import build_graph
+from search_index import get_name_index
+from metrics_store import load_or_compute_metrics
 
 # 画像指标计算
 
@@ -16,11 +18,13 @@ def get_investor_profile(G, node_id, pr_centrality, deg_centrality, out_deg, in_
 
 def global_common_investor_analysis(G):
     print("\n全局共同投资方分析 (哪些公司有多个股东共同投资):\n" + "="*50)
-    pr_centrality = nx.pagerank(G, alpha=0.85)
-    deg_centrality = nx.degree_centrality(G)
-    out_deg = dict(G.out_degree())
-    in_deg = dict(G.in_degree())
-    sorted_nodes_by_in_degree = sorted(G.nodes(), key=lambda n: G.in_degree(n), reverse=True)
+    # 指标按图版本预计算（metrics_store），按入度从高到低的顺序直接取预先排好的名次，不再全量排序
+    metrics = load_or_compute_metrics(G)
+    pr_centrality = metrics['pagerank']
+    deg_centrality = metrics['degree_centrality']
+    out_deg = metrics['out_degree']
+    in_deg = metrics['in_degree']
+    sorted_nodes_by_in_degree = metrics.ranking('in_degree').iter_nodes()
     companies_reported = 0
     max_companies = 15
     max_shareholders = 10
@@ -64,11 +68,7 @@ if __name__ == '__main__':
     target_name = sys.argv[1]
     G = build_graph()
     # 查找目标公司ID
-    target_id = None
-    for node_id, data in G.nodes(data=True):
-        if data.get('name') == target_name:
-            target_id = node_id
-            break
+    target_id = get_name_index(G).lookup(target_name)
     if not target_id:
         print(f"未找到公司: {target_name}")
         sys.exit(1)